@@ -0,0 +1,84 @@
+import threading
+import time
+from db_interact import DBPool, db_archive_tasks
+from metrics import registry
+
+# Сколько дней после дедлайна задача остается в рабочих таблицах
+ARCHIVE_GRACE_DAYS = 30
+# Сколько задач переносится в архив одной транзакцией
+ARCHIVE_BATCH_SIZE = 500
+# Период запуска переноса в секундах
+ARCHIVE_INTERVAL = 3600
+# Пауза между транзакциями одного запуска, чтобы перенос не вытеснял запросы обработчиков и рассылки
+ARCHIVE_BATCH_PAUSE = 0.5
+
+tasks_archived_total = registry.counter("tasks_archived_total", "Задачи, перенесенные в архив")
+
+
+class TaskArchiver:
+    """
+    Фоновый перенос в архив задач, дедлайн которых давно прошел (см. db_archive_tasks).
+    Раз в interval секунд переносит задачи пачками по batch_size, каждая пачка - отдельная транзакция.
+    Несколько экземпляров бота с одной БД могут работать одновременно: выбранные задачи блокируются до конца транзакции
+    """
+
+    def __init__(
+        self,
+        db_pool: DBPool,
+        grace_days: int = ARCHIVE_GRACE_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        interval: float = ARCHIVE_INTERVAL,
+        batch_pause: float = ARCHIVE_BATCH_PAUSE,
+    ):
+        """
+        :param_name db_pool: пул соединений с БД
+        :param_name grace_days: сколько дней после дедлайна задача остается в рабочих таблицах
+        :param_name batch_size: наибольшее число задач за одну транзакцию
+        :param_name interval: период запуска переноса в секундах
+        :param_name batch_pause: пауза между транзакциями одного запуска в секундах
+        """
+        self.db_pool = db_pool
+        self.grace_days = grace_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.batch_pause = batch_pause
+        self._stop = threading.Event()
+        self.stats = {"runs": 0, "archived": 0}
+
+    def archive(self) -> int:
+        """
+        Перенести в архив все задачи, срок хранения которых истек, пачками по batch_size
+        :returns: число перенесенных задач
+        """
+        n_archived = 0
+        while not self._stop.is_set():
+            with self.db_pool.connection() as db_conn:
+                n_batch = db_archive_tasks(db_conn, self.grace_days, self.batch_size)
+            n_archived += n_batch
+            tasks_archived_total.inc(n_batch)
+            if n_batch < self.batch_size:
+                break
+            self._stop.wait(self.batch_pause)
+        self.stats["runs"] += 1
+        self.stats["archived"] += n_archived
+        return n_archived
+
+    def run(self):
+        """
+        Переносить задачи в архив раз в interval секунд, пока не будет вызван stop()
+        """
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                n_archived = self.archive()
+                if n_archived:
+                    print(f"Перенесено в архив задач: {n_archived} за {time.perf_counter() - started:.1f} с")
+            except Exception as e:
+                print("Ошибка при переносе задач в архив:", str(e))
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        """
+        Остановить перенос (текущая транзакция завершается)
+        """
+        self._stop.set()
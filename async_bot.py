@@ -0,0 +1,310 @@
+import asyncio
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from commands import (
+    settings,
+    user_states,
+    is_admin,
+    get_user_step,
+    format_user_events,
+    format_listall_page,
+    parse_remind_offsets,
+    format_excel_errors,
+    format_task_group_history,
+    save_event,
+    delete_event,
+    STATE_EXPIRED_TEXT,
+    LISTALL_PAGE_SIZE,
+    HISTORY_LIMIT,
+)
+from data_parsing import ExcelRowsError, parse_tasks
+from db_async import *
+from db_async import reminder_listeners as async_reminder_listeners
+from db_interact import reminder_listeners
+from delivery import AsyncDeliveryPipeline
+from notifier import AsyncReminderDispatcher
+from scheduler import reminder_scheduler
+
+# Режим asyncio ([Runtime] mode=asyncio): обработчики команд, обращения к БД и рассылка напоминаний
+# выполняются задачами одного цикла событий, а не потоками. Тексты ответов и разбор ввода общие с commands.py.
+# Организаторские операции, которые изменяют много строк одной транзакцией (загрузка мероприятия, удаление),
+# и разбор Excel-файлов выполняются в отдельных потоках (asyncio.to_thread), чтобы не останавливать цикл событий.
+
+bot = AsyncTeleBot(settings.token)
+# Пул асинхронных соединений с БД, создается в main() внутри цикла событий
+db_async_pool: AsyncDBPool | None = None
+
+
+# ДЕКОРАТОР ADMIN ONLY COMMAND
+def admin_required(func):
+    async def wrapped(message):
+        user_username = message.from_user.username
+        if not user_username:
+            await bot.send_message(
+                message.chat.id,
+                "Ваш профиль не имеет тега (username), который необходим для использования этой функции.",
+            )
+            return
+        if not is_admin(user_username):
+            await bot.send_message(
+                message.chat.id, "Извините, но эта команда только для администраторов."
+            )
+            return
+        return await func(message)
+
+    return wrapped
+
+
+@bot.message_handler(commands=["start"])
+async def handle_start(message):
+    """
+    Обработать начало работы с ботом, отправить приветствие (см. commands.handle_start)
+    :param_name message: Сообщение от пользователя
+    """
+    user_username = message.from_user.username
+    welcome_text = "Добро пожаловать в нашего бота!"
+    if user_username:
+        welcome_text += f" Ваш телеграм тег: @{user_username}."
+        async with db_async_pool.connection() as db_conn:
+            if is_admin(user_username):
+                welcome_text += " Вы являетесь администратором этого бота."
+                await adb_add_user(db_conn, user_username, role_type_id=1)
+            else:
+                welcome_text += " Наслаждайтесь использованием!"
+                await adb_add_user(db_conn, user_username, role_type_id=2)
+            await adb_set_user_chatid(db_conn, user_username, message.chat.id)
+    else:
+        welcome_text += " Внимание: у Вас не установлен телеграм тег, некоторые функции могут быть недоступны."
+
+    await bot.send_message(message.chat.id, welcome_text)
+
+
+@bot.message_handler(commands=["listme"])
+async def list_events_for_user(message):
+    """
+    Получить список мероприятий, на которые подписан пользователь, и связанных с ними задач
+    :param_name message: Сообщение от пользователя
+    """
+    user_tag = message.from_user.username
+    if not user_tag:
+        await bot.send_message(
+            message.chat.id,
+            "Ваш профиль не имеет тега (username), который необходим для использования этой функции.",
+        )
+        return
+    async with db_async_pool.connection() as db_conn:
+        user = await adb_get_user_by_tg(db_conn, user_tag)
+        events = await adb_get_user_tasks(db_conn, user["id"]) if user else []
+    if not events:
+        await bot.send_message(message.chat.id, "Вы пока не подписаны ни на одно событие.")
+        return
+    await bot.send_message(message.chat.id, format_user_events(events))
+
+
+@bot.message_handler(commands=["newevent"])
+@admin_required
+async def new_event(message):
+    """
+    Начать создание или редактирования мероприятия и перейти в состояние ожидания файла с информацией о задачах
+    :param_name message: Сообщение от пользователя
+    """
+    await bot.send_message(
+        message.chat.id,
+        "Отправьте файл Excel с задачами и их дедлайнами, оформленный по шаблону.",
+        reply_markup=types.ForceReply(selective=False),
+    )
+    user_states.set(message.from_user.username, {"step": "AWAITING_FILE", "file_id": None, "event_name": None})
+
+
+async def handle_document(message):
+    """
+    Получить Excel файл с информацией о задачах или сообщить пользователю, что файл неверного формата
+    :param_name message: Сообщение от пользователя
+    """
+    user_tag = message.from_user.username
+    file_name = message.document.file_name
+    if not (file_name.endswith(".xls") or file_name.endswith(".xlsx")):
+        await bot.send_message(message.chat.id, "Пожалуйста, отправьте файл в формате Excel.")
+        return
+    file_id = message.document.file_id
+    downloaded_file = await bot.download_file((await bot.get_file(file_id)).file_path)
+    try:
+        data_list = await asyncio.to_thread(parse_tasks, downloaded_file, file_name)
+        user_states.update(user_tag, step="AWAITING_EVENT_NAME", file_id=file_id, data_list=data_list)
+        await bot.send_message(message.chat.id, "Файл принят. Теперь введите уникальное название мероприятия.")
+    except ExcelRowsError as e:
+        await bot.send_message(message.chat.id, format_excel_errors(e))
+    except Exception as e:
+        await bot.send_message(message.chat.id, f"Не удалось прочитать Excel-файл: {str(e)}")
+
+
+async def event_name_received(message):
+    """
+    Получить название мероприятия. Оно должно быть уникальным и не длиннее, чем 12 символов
+    :param_name message: Сообщение от пользователя
+    """
+    event_name = message.text
+    if len(event_name) > 12:
+        await bot.send_message(
+            message.chat.id,
+            "Название слишком длинное. Пожалуйста, введите название, длина которого не превышает 12 символов.",
+        )
+    elif '/' in event_name:
+        await bot.send_message(message.chat.id, "Недопустимый символ для названия мероприятия: /. Повторите попытку")
+    else:
+        user_states.update(message.from_user.username, step="AWAITING_REMIND_TIME", event_name=event_name)
+        await bot.send_message(
+            message.chat.id,
+            "Пожалуйста, введите время в минутах, за которое отправляются уведомления всем получателям. "
+            "Можно указать несколько значений через запятую, например: 1440, 60",
+        )
+
+
+async def time_received(message):
+    """
+    Получить время в минутах, за которое отправляются уведомления всем получателям, и загрузить мероприятие
+    :param_name message: Сообщение от пользователя
+    """
+    user_tag = message.from_user.username
+    try:
+        remind_offsets = parse_remind_offsets(message.text)
+    except ValueError:
+        remind_offsets = []
+    if not remind_offsets or not all(offset > 0 for offset in remind_offsets):
+        await bot.send_message(message.chat.id, "Неверное число. Пожалуйста, введите целые положительные числа через запятую")
+        return
+    state = user_states.get(user_tag)
+    if not state or not state.get("event_name") or "data_list" not in state:
+        user_states.delete(user_tag)
+        await bot.send_message(message.chat.id, STATE_EXPIRED_TEXT)
+        return
+    text = await asyncio.to_thread(save_event, state["event_name"], remind_offsets, state["data_list"])
+    await bot.send_message(message.chat.id, text)
+    user_states.delete(user_tag)
+
+
+async def get_listall_page(after_keyname: str = None, before_keyname: str = None):
+    """
+    Получить текст и клавиатуру навигации одной страницы списка мероприятий (см. commands.get_listall_page)
+    """
+    async with db_async_pool.connection() as db_conn:
+        events, has_more = await adb_get_task_group_summaries(db_conn, after_keyname, before_keyname, LISTALL_PAGE_SIZE)
+    return format_listall_page(events, has_more, after_keyname, before_keyname)
+
+
+@bot.message_handler(commands=["listall"])
+@admin_required
+async def listall(message):
+    """
+    Получить постраничный список мероприятий, в которых есть задачи, ожидающие напоминания
+    :param_name message: Сообщение от пользователя
+    """
+    text, markup = await get_listall_page()
+    if text is None:
+        await bot.send_message(message.chat.id, "В данный момент вы не создали ни одного события")
+    else:
+        await bot.send_message(message.chat.id, text, reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda call: call.data and call.data.startswith("listall:"))
+async def listall_page(call):
+    """
+    Перейти на другую страницу списка мероприятий по кнопке навигации
+    :param_name call: Нажатие на кнопку под сообщением со списком
+    """
+    if not is_admin(call.from_user.username):
+        await bot.answer_callback_query(call.id, "Извините, но эта команда только для администраторов.")
+        return
+    _, direction, keyname = call.data.split(":", 2)
+    if direction == "next":
+        text, markup = await get_listall_page(after_keyname=keyname)
+    else:
+        text, markup = await get_listall_page(before_keyname=keyname)
+    if text is None:
+        await bot.answer_callback_query(call.id, "Больше мероприятий нет")
+        return
+    await bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    await bot.answer_callback_query(call.id)
+
+
+@bot.message_handler(commands=["delete_task"])
+@admin_required
+async def delete(message):
+    await bot.send_message(message.chat.id, 'Введите название события, которое вы хотите удалить')
+    user_states.set(message.from_user.username, {"step": "AWAITING_DELETION"})
+
+
+async def deletion_name(message):
+    user_states.delete(message.from_user.username)
+    if await asyncio.to_thread(delete_event, message.text):
+        await bot.send_message(message.chat.id, 'Удаление успешно')
+    else:
+        await bot.send_message(message.chat.id, 'Пожалуйста, проверьте правильность введенного названия')
+
+
+@bot.message_handler(commands=["history"])
+@admin_required
+async def history(message):
+    """
+    Начать просмотр архива мероприятия (см. commands.history)
+    :param_name message: Сообщение от пользователя
+    """
+    await bot.send_message(message.chat.id, "Введите название события, историю которого вы хотите посмотреть")
+    user_states.set(message.from_user.username, {"step": "AWAITING_HISTORY"})
+
+
+async def history_name(message):
+    user_states.delete(message.from_user.username)
+    async with db_async_pool.connection() as db_conn:
+        task_group = await adb_get_task_group_by_keyname(db_conn, message.text)
+        tasks = await adb_get_task_group_history(db_conn, task_group["id"], HISTORY_LIMIT) if task_group else None
+    if task_group is None:
+        await bot.send_message(message.chat.id, "Пожалуйста, проверьте правильность введенного названия")
+    else:
+        await bot.send_message(message.chat.id, format_task_group_history(message.text, tasks))
+
+
+# Обработчики шагов сценариев: шаг -> (обработчик, ожидаемый тип сообщения)
+STEP_HANDLERS = {
+    "AWAITING_FILE": (handle_document, "document"),
+    "AWAITING_EVENT_NAME": (event_name_received, "text"),
+    "AWAITING_REMIND_TIME": (time_received, "text"),
+    "AWAITING_DELETION": (deletion_name, "text"),
+    "AWAITING_HISTORY": (history_name, "text"),
+}
+
+
+@bot.message_handler(
+    func=lambda message: get_user_step(message.from_user.username) in STEP_HANDLERS,
+    content_types=["text", "document"],
+)
+async def handle_step(message):
+    """
+    Передать сообщение обработчику текущего шага сценария пользователя
+    :param_name message: Сообщение от пользователя
+    """
+    handler, content_type = STEP_HANDLERS[get_user_step(message.from_user.username)]
+    if message.content_type == content_type:
+        await handler(message)
+
+
+async def main():
+    """
+    Запустить бота в режиме asyncio: long polling и рассылка напоминаний работают в одном цикле событий
+    """
+    global db_async_pool
+    db_async_pool = await db_create_async_pool(settings.database)
+    delivery = AsyncDeliveryPipeline(
+        bot, concurrency=settings.runtime_concurrency, global_rate=30, per_chat_interval=1.0
+    )
+    dispatcher = AsyncReminderDispatcher(db_async_pool, delivery, reminder_scheduler)
+    reminder_listeners.append(dispatcher.refresh_group_schedule)
+    async_reminder_listeners.append(dispatcher.arefresh_group_schedule)
+    dispatcher_task = asyncio.create_task(dispatcher.run())
+    try:
+        await bot.infinity_polling()
+    finally:
+        dispatcher.stop()
+        await dispatcher_task
+        await bot.close_session()
+        await db_async_pool.close()
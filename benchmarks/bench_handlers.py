@@ -0,0 +1,275 @@
+"""
+Нагрузочный замер обработчиков команд бота (commands.py) при множестве одновременных пользователей.
+
+Импортирует commands.py во временном каталоге с копией config.ini (тестовый токен, тестовые организаторы)
+и конфигурацией подключения к ОТДЕЛЬНОЙ тестовой базе данных MySQL/MariaDB, направляет запросы бота на локальную
+имитацию Bot API (benchmarks/fake_bot_api.py) и передает синтетические обновления в bot.process_new_updates
+из --concurrency потоков одновременно - так же, как их передают потоки обработки в режиме webhook.
+Каждый синтетический пользователь проходит свой сценарий последовательно, разные пользователи - параллельно.
+Этапы замера:
+    start    - все пользователи и организаторы пишут /start (--rounds раз);
+    newevent - организаторы загружают мероприятия: /newevent, Excel-файл, название, сроки напоминаний;
+    listme   - все пользователи запрашивают /listme (--rounds раз);
+    delete   - организаторы удаляют свои мероприятия: /delete_task, название.
+Для каждого шага сценария выводятся задержка обработки (p50, p95, p99, max) и число ошибок, для каждого этапа -
+число вызовов функций db_interact на одно обновление (по метрике db_query_duration_seconds; ответы из кэша
+не учитываются). Результат также записывается в JSON.
+
+Пример:
+    python benchmarks/bench_handlers.py --dbconfig ./dbconfig.bench.ini --reset --users 1000 --admins 10 --concurrency 32
+ВНИМАНИЕ: с ключом --reset все группы задач и тестовые пользователи в указанной БД удаляются.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from telebot import types
+
+from benchmarks.bench_reminders import percentile, reset_database
+from benchmarks.fake_bot_api import FakeBotApi
+from metrics import db_query_seconds
+from migrate import db_apply_migrations
+
+# id чатов синтетических пользователей начинаются с этого числа
+CHAT_ID_BASE = 300000
+
+
+def prepare_workdir(args) -> str:
+    """
+    Временный каталог с копией config.ini (тестовый токен и организаторы) и конфигурацией тестовой БД
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_handlers_")
+    with open(args.config, encoding="utf-8") as f:
+        config = f.read()
+    config = re.sub(r"(?m)^token=.*$", "token=123456:bench", config)
+    config = re.sub(r"(?m)^admins=.*$", "admins=" + ",".join(admin_nick(i) for i in range(args.admins)), config)
+    with open(os.path.join(workdir, "config.ini"), "w", encoding="utf-8") as f:
+        f.write(config)
+    shutil.copy(args.dbconfig, os.path.join(workdir, "dbconfig.ini"))
+    return workdir
+
+
+def user_nick(user_no: int) -> str:
+    return f"bench_u{user_no}"
+
+
+def admin_nick(admin_no: int) -> str:
+    return f"bench_admin{admin_no}"
+
+
+class UpdateFactory:
+    """
+    Синтетические обновления Telegram от пользователей; id пользователя и чата - CHAT_ID_BASE + номер пользователя
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def message(self, user_no: int, nick: str, text: str = None, document: dict = None) -> types.Update:
+        update_id = next(self._ids)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": CHAT_ID_BASE + user_no, "type": "private"},
+            "from": {"id": CHAT_ID_BASE + user_no, "is_bot": False, "first_name": nick, "username": nick},
+        }
+        if document is not None:
+            message["document"] = document
+        else:
+            message["text"] = text
+        return types.Update.de_json({"update_id": update_id, "message": message})
+
+
+def document_json(user_no: int) -> dict:
+    """
+    Документ (Excel-файл мероприятия), который присылает организатор; файл добавляется в имитацию Bot API под этим file_id
+    """
+    return {"file_id": f"doc{user_no}", "file_unique_id": f"doc{user_no}", "file_name": "tasks.xlsx"}
+
+
+def make_workbook(args, user_nicks: list[str]) -> bytes:
+    """
+    Excel-файл мероприятия по шаблону: args.tasks задач с дедлайнами в ближайшие дни и args.participants участниками
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["name", "description", "deadline", "participants"])
+    start = datetime.now().replace(microsecond=0)
+    for i in range(args.tasks):
+        deadline = start + timedelta(days=1 + i % 7, minutes=i)
+        participants = random.sample(user_nicks, min(args.participants, len(user_nicks)))
+        sheet.append([f"load-{i}", "Нагрузочный тест", deadline.strftime("%Y-%m-%d %H:%M:%S"), ", ".join(participants)])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def run_phase(bot, scripts: list[list[tuple[str, types.Update]]], concurrency: int) -> dict:
+    """
+    Передать обновления боту: сценарии выполняются параллельно в concurrency потоках, шаги сценария - по порядку
+    :param_name scripts: сценарии пользователей, списки пар (название шага, обновление)
+    :returns: задержки и ошибки по шагам, вызовы функций db_interact на одно обновление
+    """
+    latencies = {}
+    errors = {}
+    error_samples = []
+
+    def run_script(script):
+        for step, update in script:
+            started = time.perf_counter()
+            try:
+                bot.process_new_updates([update])
+            except Exception as e:
+                errors[step] = errors.get(step, 0) + 1
+                if len(error_samples) < 5:
+                    error_samples.append(f"{step}: {type(e).__name__}: {e}")
+            finally:
+                latencies.setdefault(step, []).append(time.perf_counter() - started)
+
+    db_calls_before = db_query_seconds.counts()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_script, scripts))
+    seconds = time.perf_counter() - started
+    db_calls = {
+        key[0]: count - db_calls_before.get(key, 0)
+        for key, count in db_query_seconds.counts().items()
+        if count > db_calls_before.get(key, 0)
+    }
+    n_updates = sum(len(script) for script in scripts)
+    return {
+        "updates": n_updates,
+        "seconds": seconds,
+        "updates_per_second": n_updates / max(seconds, 1e-9),
+        "steps": {
+            step: {
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+                "max": max(values),
+                "errors": errors.get(step, 0),
+            }
+            for step, values in latencies.items()
+        },
+        "errors": sum(errors.values()),
+        "error_samples": error_samples,
+        "db_calls_per_update": sum(db_calls.values()) / max(n_updates, 1),
+        "db_calls": dict(sorted(db_calls.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.ini"), help="образец конфигурации бота")
+    parser.add_argument("--dbconfig", default="./dbconfig.bench.ini", help="конфигурация подключения к тестовой БД")
+    parser.add_argument("--reset", action="store_true", help="очистить тестовую БД перед замером (обязательно)")
+    parser.add_argument("--users", type=int, default=1000, help="число синтетических участников")
+    parser.add_argument("--admins", type=int, default=10, help="число синтетических организаторов")
+    parser.add_argument("--rounds", type=int, default=2, help="сколько раз каждый участник пишет /start и /listme")
+    parser.add_argument("--tasks", type=int, default=50, help="задач в загружаемом мероприятии")
+    parser.add_argument("--participants", type=int, default=20, help="участников задачи")
+    parser.add_argument("--concurrency", type=int, default=32, help="число потоков, одновременно передающих обновления")
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка ответа имитации Bot API в секундах")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_handlers.json")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("замер удаляет данные в БД; укажите --reset и отдельную тестовую БД")
+    args.config = os.path.abspath(args.config)
+    args.dbconfig = os.path.abspath(args.dbconfig)
+    random.seed(args.seed)
+
+    fake_api = FakeBotApi(latency=args.latency)
+    fake_api.start()
+    workdir = prepare_workdir(args)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import commands
+
+        # Обработчики выполняются в потоке, передавшем обновление, поэтому задержка измеряется вокруг process_new_updates
+        commands.bot.threaded = False
+        with commands.db_pool.connection() as db_conn:
+            db_apply_migrations(db_conn)
+            reset_database(db_conn)
+
+        updates = UpdateFactory()
+        users = [(user_no, user_nick(user_no)) for user_no in range(args.users)]
+        admins = [(args.users + admin_no, admin_nick(admin_no)) for admin_no in range(args.admins)]
+        event_names = {nick: f"load{admin_no}" for admin_no, (_, nick) in enumerate(admins)}
+        for user_no, nick in admins:
+            fake_api.add_file(document_json(user_no)["file_id"], make_workbook(args, [nick for _, nick in users]), "tasks.xlsx")
+
+        phases = {}
+        phases["start"] = run_phase(
+            commands.bot,
+            [[("/start", updates.message(user_no, nick, "/start")) for _ in range(args.rounds)] for user_no, nick in users + admins],
+            args.concurrency,
+        )
+        phases["newevent"] = run_phase(
+            commands.bot,
+            [
+                [
+                    ("/newevent", updates.message(user_no, nick, "/newevent")),
+                    ("document", updates.message(user_no, nick, document=document_json(user_no))),
+                    ("event name", updates.message(user_no, nick, event_names[nick])),
+                    ("remind time", updates.message(user_no, nick, "1440, 60")),
+                ]
+                for user_no, nick in admins
+            ],
+            args.concurrency,
+        )
+        phases["listme"] = run_phase(
+            commands.bot,
+            [[("/listme", updates.message(user_no, nick, "/listme")) for _ in range(args.rounds)] for user_no, nick in users],
+            args.concurrency,
+        )
+        phases["delete"] = run_phase(
+            commands.bot,
+            [
+                [
+                    ("/delete_task", updates.message(user_no, nick, "/delete_task")),
+                    ("event name", updates.message(user_no, nick, event_names[nick])),
+                ]
+                for user_no, nick in admins
+            ],
+            args.concurrency,
+        )
+        db_connections = commands.db_pool._n_open
+        commands.db_pool.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        fake_api.stop()
+
+    result = {
+        "params": vars(args),
+        "phases": phases,
+        "errors": sum(phase["errors"] for phase in phases.values()),
+        "api_requests": fake_api.n_requests,
+        "messages_sent": len(fake_api.sent),
+        "db_connections_open": db_connections,
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+
+
+if __name__ == "__main__":
+    main()
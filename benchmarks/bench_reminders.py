@@ -0,0 +1,216 @@
+"""
+Замер пропускной способности рассылки напоминаний и импорта мероприятий.
+
+Заполняет ОТДЕЛЬНУЮ тестовую базу данных MySQL/MariaDB группами задач и участниками, направляет запросы бота
+на локальную имитацию Bot API (benchmarks/fake_bot_api.py) и запускает рассылку.
+Результат (напоминаний в секунду, задержка относительно срока напоминания, запросов к БД за цикл рассылки,
+время импорта на 1000 строк) выводится и записывается в JSON.
+
+Пример:
+    python benchmarks/bench_reminders.py --dbconfig ./dbconfig.bench.ini --reset --groups 5 --tasks 40 --participants 50
+ВНИМАНИЕ: с ключом --reset все группы задач и тестовые пользователи в указанной БД удаляются.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot
+
+from benchmarks.fake_bot_api import FakeBotApi
+from data_parsing import parse_tasks
+from db_interact import *
+from delivery import DeliveryPipeline
+from migrate import db_apply_migrations
+from notifier import ReminderDispatcher
+from scheduler import ReminderScheduler
+
+TASK_NAME_RE = re.compile(r'"(bench-\d+-\d+)"')
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def db_questions(db_conn) -> int:
+    """
+    Общее число запросов, выполненных сервером БД (включая запросы всех соединений)
+    """
+    with db_conn.cursor() as dbc:
+        dbc.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        return int(dbc.fetchone()["Value"])
+
+
+def reset_database(db_conn):
+    with db_conn.cursor() as dbc:
+        dbc.execute("DELETE FROM task_group")
+        dbc.execute("DELETE FROM user WHERE tg_nick LIKE 'bench%'")
+    db_conn.commit()
+
+
+def make_tasks(args, group_no: int, start: datetime) -> list[dict]:
+    """
+    Задачи одной группы: сроки напоминаний (за 1 минуту до дедлайна) равномерно распределены на args.spread секунд
+    """
+    tasks = []
+    for i in range(args.tasks):
+        offset = args.lead + args.spread * (group_no * args.tasks + i) / max(1, args.groups * args.tasks)
+        deadline = (start + timedelta(minutes=1, seconds=offset)).replace(microsecond=0)
+        participants = random.sample(range(args.users), min(args.participants, args.users))
+        tasks.append({
+            "name": f"bench-{group_no}-{i}",
+            "description": "Нагрузочный тест",
+            "deadline": deadline,
+            "participants": [f"bench_u{p}" for p in participants],
+        })
+    return tasks
+
+
+def measure_parsing(all_tasks: list[dict]) -> float:
+    """
+    Время разбора Excel-файла с задачами в секундах на 1000 строк
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["name", "description", "deadline", "participants"])
+    for task in all_tasks:
+        sheet.append([task["name"], task["description"], task["deadline"].strftime("%Y-%m-%d %H:%M:%S"), ", ".join(task["participants"])])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    started = time.perf_counter()
+    parse_tasks(buffer.getvalue())
+    return (time.perf_counter() - started) / len(all_tasks) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dbconfig", default="./dbconfig.bench.ini", help="конфигурация подключения к тестовой БД")
+    parser.add_argument("--reset", action="store_true", help="очистить тестовую БД перед замером (обязательно)")
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=40, help="задач в группе")
+    parser.add_argument("--participants", type=int, default=50, help="участников задачи")
+    parser.add_argument("--users", type=int, default=500, help="всего тестовых пользователей")
+    parser.add_argument("--lead", type=float, default=5, help="через сколько секунд после заполнения наступает первый срок")
+    parser.add_argument("--spread", type=float, default=10, help="на сколько секунд распределены сроки напоминаний")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа имитации Bot API в секундах")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--rate", type=float, default=30, help="общий лимит отправки сообщений в секунду")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--instances", type=int, default=1, help="число одновременно работающих рассылок (экземпляров бота)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_reminders.json")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("замер удаляет данные в БД; укажите --reset и отдельную тестовую БД")
+    random.seed(args.seed)
+
+    db_pool = db_create_pool(args.dbconfig)
+    with db_pool.connection() as db_conn:
+        db_apply_migrations(db_conn)
+        reset_database(db_conn)
+
+    # Импорт мероприятий
+    start = datetime.now()
+    all_tasks = []
+    import_seconds = 0.0
+    due_at = {}
+    with db_pool.connection() as db_conn:
+        for group_no in range(args.groups):
+            tasks = make_tasks(args, group_no, start)
+            all_tasks.extend(tasks)
+            started = time.perf_counter()
+            db_add_task_group(db_conn, f"bench{group_no}", [1])
+            db_import_tasks(db_conn, tasks, db_get_task_group_by_keyname(db_conn, f"bench{group_no}")["id"], False)
+            import_seconds += time.perf_counter() - started
+            for task in tasks:
+                due_at[task["name"]] = task["deadline"] - timedelta(minutes=1)
+        with db_conn.cursor() as dbc:
+            dbc.execute("UPDATE user SET tg_chatid = id + 100000 WHERE tg_nick LIKE 'bench%'")
+        db_conn.commit()
+    expected = sum(len(task["participants"]) for task in all_tasks)
+    parse_per_1000 = measure_parsing(all_tasks)
+
+    # Рассылка
+    fake_api = FakeBotApi(latency=args.latency, error_rate=args.error_rate)
+    fake_api.start()
+    bot = telebot.TeleBot("123456:bench", threaded=False)
+    # Каждый экземпляр получает свою долю общего лимита отправки, как если бы они работали от имени одного бота
+    deliveries = [
+        DeliveryPipeline(bot, workers=args.workers, global_rate=args.rate / args.instances, per_chat_interval=1.0)
+        for _ in range(args.instances)
+    ]
+    dispatchers = [ReminderDispatcher(db_pool, delivery, ReminderScheduler()) for delivery in deliveries]
+    with db_pool.connection() as db_conn:
+        questions_before = db_questions(db_conn)
+    threads = [threading.Thread(target=dispatcher.run, daemon=True) for dispatcher in dispatchers]
+    for thread in threads:
+        thread.start()
+    finish_by = time.time() + args.timeout
+    while sum(dispatcher.stats["sent"] for dispatcher in dispatchers) < expected and time.time() < finish_by:
+        time.sleep(0.2)
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+    for thread in threads:
+        thread.join(timeout=30)
+    with db_pool.connection() as db_conn:
+        questions = db_questions(db_conn) - questions_before
+    fake_api.stop()
+    for delivery in deliveries:
+        delivery.shutdown()
+    ticks = sum(dispatcher.stats["ticks"] for dispatcher in dispatchers)
+
+    # Напоминания одному получателю объединяются в сообщения, поэтому задержка считается по каждой задаче в сообщении
+    lags = []
+    received = set()
+    duplicates = 0
+    for received_at, chat_id, text in fake_api.sent:
+        for name in TASK_NAME_RE.findall(text):
+            lags.append(received_at - due_at[name].timestamp())
+            duplicates += (chat_id, name) in received
+            received.add((chat_id, name))
+    first_due = min(due_at.values()).timestamp()
+    last_received = max((sent[0] for sent in fake_api.sent), default=first_due)
+    result = {
+        "params": vars(args),
+        "reminders_expected": expected,
+        "reminders_sent": len(lags),
+        "reminders_per_second": len(lags) / max(last_received - first_due, 1e-9),
+        "messages_sent": len(fake_api.sent),
+        "duplicates": duplicates,
+        "lag_seconds": {
+            "p50": percentile(lags, 0.5),
+            "p95": percentile(lags, 0.95),
+            "max": max(lags, default=0.0),
+            "mean": statistics.fmean(lags) if lags else 0.0,
+        },
+        "dispatch_ticks": ticks,
+        "queries_per_tick": questions / max(ticks, 1),
+        "api_requests": fake_api.n_requests,
+        "api_rate_limited": fake_api.n_rate_limited,
+        "import_seconds_per_1000_tasks": import_seconds / len(all_tasks) * 1000,
+        "parse_seconds_per_1000_rows": parse_per_1000,
+        "delivery": [delivery.stats() for delivery in deliveries],
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+    db_pool.close()
+
+
+if __name__ == "__main__":
+    main()
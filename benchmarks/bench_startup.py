@@ -0,0 +1,113 @@
+"""
+Замер времени холодного запуска бота.
+
+В отдельных процессах импортирует main.py (как при запуске бота, но без подключения к Telegram и миграций БД)
+во временном каталоге с копиями config.ini и dbconfig.ini, в которых подставлен тестовый токен.
+Сервер БД не нужен: соединения с БД открываются при первом обращении к пулу, и замер проверяет, что при импорте
+не открыто ни одного соединения. Результат (медиана и максимум времени импорта, время запуска интерпретатора,
+самые долгие импорты модулей по -X importtime) выводится и записывается в JSON.
+
+Пример:
+    python benchmarks/bench_startup.py --runs 10 --max-seconds 0.5
+С ключом --max-seconds замер завершается с кодом 1, если медиана времени импорта больше заданной.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Импортирует main и печатает время импорта и число открытых соединений с БД
+PROBE = (
+    "import time; started = time.perf_counter(); import main, commands; "
+    "print(time.perf_counter() - started, commands.db_pool._n_open)"
+)
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def prepare_workdir(args) -> str:
+    """
+    Временный каталог с копиями файлов конфигурации; токен заменяется на тестовый
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    with open(args.config, encoding="utf-8") as f:
+        config = re.sub(r"(?m)^token=.*$", "token=123456:bench", f.read())
+    with open(os.path.join(workdir, "config.ini"), "w", encoding="utf-8") as f:
+        f.write(config)
+    shutil.copy(args.dbconfig, os.path.join(workdir, "dbconfig.ini"))
+    return workdir
+
+
+def run_python(workdir: str, code: str, *options: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run(
+        [sys.executable, *options, "-c", code], cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def slowest_imports(stderr: str, top: int) -> list[dict]:
+    """
+    Модули, импортируемые непосредственно из main, с наибольшим суммарным временем импорта (по выводу -X importtime;
+    вложенность импорта обозначается отступом в два пробела на уровень)
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and len(match.group(3)) == 3:
+            modules.append({"module": match.group(4), "cumulative_ms": int(match.group(2)) / 1000})
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.ini"), help="образец конфигурации бота")
+    parser.add_argument("--dbconfig", default=os.path.join(ROOT, "dbconfig.ini"), help="образец конфигурации подключения к БД")
+    parser.add_argument("--runs", type=int, default=10, help="число запусков")
+    parser.add_argument("--top", type=int, default=10, help="сколько самых долгих импортов показать")
+    parser.add_argument("--max-seconds", type=float, default=None, help="допустимая медиана времени импорта")
+    parser.add_argument("--output", default="bench_startup.json")
+    args = parser.parse_args()
+
+    workdir = prepare_workdir(args)
+    try:
+        interpreter, imports, connections = [], [], set()
+        for _ in range(args.runs):
+            # Время запуска и завершения пустого интерпретатора - нижняя граница времени перезапуска
+            started = time.perf_counter()
+            run_python(workdir, "pass")
+            interpreter.append(time.perf_counter() - started)
+            seconds, n_open = run_python(workdir, PROBE).stdout.split()[-2:]
+            imports.append(float(seconds))
+            connections.add(int(n_open))
+        importtime = run_python(workdir, "import main", "-X", "importtime")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "params": vars(args),
+        "import_seconds": {
+            "median": statistics.median(imports),
+            "max": max(imports),
+            "min": min(imports),
+        },
+        "interpreter_seconds": statistics.median(interpreter),
+        "db_connections_at_import": max(connections),
+        "slowest_imports": slowest_imports(importtime.stderr, args.top),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.max_seconds is not None and result["import_seconds"]["median"] > args.max_seconds:
+        print(f"Медиана времени импорта {result['import_seconds']['median']:.3f} с больше допустимой {args.max_seconds} с")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
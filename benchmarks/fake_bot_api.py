@@ -0,0 +1,169 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import telebot
+from telebot import asyncio_helper
+
+
+class FakeBotApi:
+    """
+    Локальная имитация Telegram Bot API для нагрузочных замеров.
+    Отвечает на sendMessage (и любые другие методы - пустым успешным ответом) с заданной задержкой,
+    с заданной вероятностью возвращает 429 с retry_after и записывает все отправленные сообщения.
+    Файлы, добавленные через add_file, отдаются методом getFile и по адресу скачивания файлов (bot.download_file)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, error_rate: float = 0.0, retry_after: int = 1):
+        """
+        :param_name host, port: адрес сервера (port = 0 - любой свободный порт)
+        :param_name latency: задержка ответа в секундах
+        :param_name error_rate: доля запросов, на которые возвращается 429
+        :param_name retry_after: значение retry_after в ответе 429
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.sent = []  # тройки (момент получения time.time(), chat_id, text)
+        self.n_requests = 0
+        self.n_rate_limited = 0
+        self.files = {}  # file_path -> содержимое файла
+        self._file_paths = {}  # file_id -> file_path
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    @property
+    def api_url(self) -> str:
+        """
+        Шаблон адреса для telebot.apihelper.API_URL
+        """
+        return f"http://127.0.0.1:{self.port}/bot{{0}}/{{1}}"
+
+    @property
+    def file_url(self) -> str:
+        """
+        Шаблон адреса для telebot.apihelper.FILE_URL
+        """
+        return f"http://127.0.0.1:{self.port}/file/bot{{0}}/{{1}}"
+
+    def add_file(self, file_id: str, content: bytes, file_name: str = "file"):
+        """
+        Добавить файл, который бот сможет получить по file_id (как документ, присланный пользователем)
+        """
+        file_path = f"documents/{file_id}_{file_name}"
+        with self._lock:
+            self._file_paths[file_id] = file_path
+            self.files[file_path] = content
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _handle(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/file/"):
+                    self._send_file(url.path.split("/", 3)[-1])
+                    return
+                method = url.path.rsplit("/", 1)[-1]
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = self.rfile.read(length).decode("utf-8", "replace")
+                    params.update({key: values[0] for key, values in parse_qs(body).items()})
+                time.sleep(api.latency)
+                status, result = api.handle(method, params)
+                data = json.dumps(result).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_file(self, file_path: str):
+                time.sleep(api.latency)
+                content = api.files.get(file_path)
+                if content is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, method: str, params: dict) -> tuple[int, dict]:
+        """
+        Ответ на вызов метода Bot API
+        :returns: пара (HTTP-код, тело ответа)
+        """
+        with self._lock:
+            self.n_requests += 1
+            if method == "sendMessage" and random.random() < self.error_rate:
+                self.n_rate_limited += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            if method == "sendMessage":
+                self._message_id += 1
+                chat_id = int(params.get("chat_id", 0))
+                self.sent.append((time.time(), chat_id, params.get("text", "")))
+                return 200, {
+                    "ok": True,
+                    "result": {
+                        "message_id": self._message_id,
+                        "date": int(time.time()),
+                        "chat": {"id": chat_id, "type": "private"},
+                        "text": params.get("text", ""),
+                    },
+                }
+            if method == "getFile":
+                file_id = params.get("file_id", "")
+                if file_id not in self._file_paths:
+                    return 400, {"ok": False, "error_code": 400, "description": "Bad Request: invalid file_id"}
+                file_path = self._file_paths[file_id]
+                return 200, {
+                    "ok": True,
+                    "result": {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.files[file_path]), "file_path": file_path},
+                }
+            if method == "getMe":
+                return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}}
+        return 200, {"ok": True, "result": True}
+
+    def start(self):
+        """
+        Запустить сервер в фоновом потоке и направить на него запросы telebot (и TeleBot, и AsyncTeleBot)
+        """
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self._async_api_url = asyncio_helper.API_URL
+        telebot.apihelper.API_URL = self.api_url
+        telebot.apihelper.FILE_URL = self.file_url
+        asyncio_helper.API_URL = self.api_url
+        asyncio_helper.FILE_URL = self.file_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        telebot.apihelper.API_URL = None
+        telebot.apihelper.FILE_URL = None
+        asyncio_helper.API_URL = self._async_api_url
+        asyncio_helper.FILE_URL = None
@@ -0,0 +1,109 @@
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+class TTLCache:
+    """
+    Потокобезопасный кэш с вытеснением давно не использованных записей (LRU) и ограниченным временем жизни записи (TTL).
+    Считает попадания и промахи
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 300):
+        """
+        :param_name name: имя кэша (для статистики)
+        :param_name max_size: максимальное число записей
+        :param_name ttl: время жизни записи в секундах
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # ключ -> (момент устаревания, значение)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :returns: пара (найдено ли значение, значение)
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Сбросить все записи (вызывается при изменении данных в БД)
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+def cached(cache: TTLCache):
+    """
+    Декоратор функций чтения из БД вида f(dbconn, *args): результат кэшируется по остальным аргументам.
+    Пустой результат (None) не кэшируется, чтобы только что добавленные записи были видны сразу.
+    Поддерживает и асинхронные функции (async def)
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def wrapped_async(dbconn, *args):
+                key = (func.__name__,) + args
+                found, value = cache.get(key)
+                if found:
+                    return _copy(value)
+                value = await func(dbconn, *args)
+                if value is not None:
+                    cache.put(key, _copy(value))
+                return value
+
+            wrapped_async.cache = cache
+            return wrapped_async
+
+        @wraps(func)
+        def wrapped(dbconn, *args):
+            key = (func.__name__,) + args
+            found, value = cache.get(key)
+            if found:
+                return _copy(value)
+            value = func(dbconn, *args)
+            if value is not None:
+                cache.put(key, _copy(value))
+            return value
+
+        wrapped.cache = cache
+        return wrapped
+
+    return decorator
+
+
+def _copy(value):
+    # Строки БД - словари; отдаем копии, чтобы вызывающий код не мог испортить содержимое кэша
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return [dict(row) if isinstance(row, dict) else row for row in value]
+    return value
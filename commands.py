@@ -1,28 +1,37 @@
+import re
 import telebot
 from telebot import types
-from config import load_configuration
+from config import load_settings
 from db_interact import *
-from datetime import datetime
 from data_parsing import *
+from state_store import create_state_store
 
-# Путь к файлу конфигурации
+# Пути к файлам конфигурации бота и подключения к БД
 config_path = "./config.ini"
+dbconfig_path = "./dbconfig.ini"
 try:
-    config_data = load_configuration(config_path)
-    admins = set(
-        config_data["admins"]
-    )  # Преобразуем список в множество для ускорения проверки
+    # Настройки читаются один раз; соединения с БД открываются при первом обращении к пулу
+    settings = load_settings(config_path, dbconfig_path)
+    admins = set(settings.admins)  # Преобразуем список в множество для ускорения проверки
     print("Конфигурация успешно загружена.")
-    print("Токен бота:", config_data["token"])
-    print("Администраторы:", config_data["admins"])
-    db_conn = db_connect("./dbconfig.ini")
-    print("Подключение к БД успешно")
-    bot = telebot.TeleBot(config_data["token"])
+    print("Администраторы:", ", ".join(settings.admins))
+    db_pool = db_create_pool_from_settings(settings.database)
+    # В режиме webhook обработчики выполняются в рабочих потоках WebhookServer: ограниченная очередь сервера
+    # задерживает прием обновлений, пока обработчики заняты. Собственный пул потоков telebot эту очередь обходил бы
+    bot = telebot.TeleBot(settings.token, threaded=not settings.webhook_enabled)
 except Exception as e:
     print("Ошибка:", str(e))
     exit(1)
 
 
+def is_admin(user_username: str | None) -> bool:
+    """
+    Является ли пользователь администратором бота
+    :param_name user_username: Телеграм-тег пользователя без @
+    """
+    return bool(user_username) and (user_username in admins or "@" + user_username in admins)
+
+
 # ДЕКОРАТОР ADMIN ONLY COMMAND
 def admin_required(func):
     def wrapped(message):
@@ -33,7 +42,7 @@ def admin_required(func):
                 "Ваш профиль не имеет тега (username), который необходим для использования этой функции.",
             )
             return
-        if not (user_username in admins or "@" + user_username in admins):
+        if not is_admin(user_username):
             bot.send_message(
                 message.chat.id, "Извините, но эта команда только для администраторов."
             )
@@ -55,14 +64,15 @@ def handle_start(message):
     welcome_text = "Добро пожаловать в нашего бота!"
     if user_username:
         welcome_text += f" Ваш телеграм тег: @{user_username}."
-        if user_username in admins or "@" + user_username in admins:
-            welcome_text += " Вы являетесь администратором этого бота."
-            db_add_user(db_conn, f"{user_username}", role_type_id=1)
-            db_set_user_chatid(db_conn, user_username, message.chat.id)
-        else:
-            welcome_text += " Наслаждайтесь использованием!"
-            db_add_user(db_conn, f"{user_username}", role_type_id=2)
-            db_set_user_chatid(db_conn, user_username, message.chat.id)
+        with db_pool.connection() as db_conn:
+            if is_admin(user_username):
+                welcome_text += " Вы являетесь администратором этого бота."
+                db_add_user(db_conn, f"{user_username}", role_type_id=1)
+                db_set_user_chatid(db_conn, user_username, message.chat.id)
+            else:
+                welcome_text += " Наслаждайтесь использованием!"
+                db_add_user(db_conn, f"{user_username}", role_type_id=2)
+                db_set_user_chatid(db_conn, user_username, message.chat.id)
     else:
         welcome_text += " Внимание: у Вас не установлен телеграм тег, некоторые функции могут быть недоступны."
 
@@ -85,12 +95,21 @@ def list_events_for_user(message):
         return
 
     # Вызываем функцию, которая возвращает список событий и дедлайны из базы данных
-    user_id = db_get_user_by_tg(db_conn, user_tag)["id"]
-    events = db_get_user_tasks(db_conn, user_id)
+    with db_pool.connection() as db_conn:
+        user = db_get_user_by_tg(db_conn, user_tag)
+        events = db_get_user_tasks(db_conn, user["id"]) if user else []
 
     if not events:
         bot.send_message(message.chat.id, "Вы пока не подписаны ни на одно событие.")
         return
+    bot.send_message(message.chat.id, format_user_events(events))
+
+
+def format_user_events(events: list[dict]) -> str:
+    """
+    Текст списка задач пользователя, сгруппированных по мероприятиям
+    :param_name events: строки из db_get_user_tasks
+    """
     response_message = "Вы подписаны на следующие события и дедлайны:\n"
     grouped_tasks = {}
     for event in events:
@@ -104,16 +123,100 @@ def list_events_for_user(message):
             deadline_str = task["deadline"].strftime("%Y-%m-%d %H:%M:%S")
             response_message += f"   - {task['name']}: {deadline_str}\n"
         remind_info = (
-            f"Вы получите напоминание за {task['org_remind_in_minutes']} минут до дедлайна."
-            if task["org_remind_in_minutes"] is not None
+            f"Вы получите напоминания за {format_offsets(task['remind_offsets'])} минут до дедлайна."
+            if task["remind_offsets"] is not None
             else "Напоминание не установлено."
         )
         response_message += f"   {remind_info}\n"
-    bot.send_message(message.chat.id, response_message)
+    return response_message
+
+
+def format_offsets(offsets: str | None) -> str:
+    """
+    Отформатировать смещения напоминаний из БД (числа через запятую) для вывода пользователю
+    :param_name offsets: строка вида "1440,60"
+    """
+    return ", ".join((offsets or "").split(","))
+
+
+def parse_remind_offsets(text: str) -> list[int]:
+    """
+    Разобрать смещения напоминаний, введенные пользователем (целые числа минут через запятую или пробел)
+    :raises ValueError: если среди значений есть не числа
+    """
+    return [int(value) for value in re.split(r"[\s,;]+", text.strip()) if value]
+
+
+def format_excel_errors(error: ExcelRowsError) -> str:
+    """
+    Текст сообщения об ошибках в строках Excel-файла (не больше 10 строк)
+    """
+    errors_text = "\n".join(f"Строка {row}: {text}" for row, text in error.errors[:10])
+    if len(error.errors) > 10:
+        errors_text += f"\n... и еще {len(error.errors) - 10}"
+    return (
+        "Excel-файл заполнен с ошибками. Пожалуйста, обратите внимание на требуемый формат времени: YYYY-mm-dd HH:MM:SS\n\n"
+        + errors_text
+    )
+
+
+def save_event(event_name: str, remind_offsets: list[int], tasks: list[dict]) -> str:
+    """
+    Создать или отредактировать мероприятие и загрузить в него задачи
+    :param_name event_name: название мероприятия
+    :param_name remind_offsets: за сколько минут до дедлайна отправлять напоминания
+    :param_name tasks: задачи из parse_tasks
+    :returns: текст ответа пользователю
+    """
+    with db_pool.connection() as db_conn:
+        # Создание мероприятия, если его еще нет в БД
+        db_add_task_group(db_conn, event_name, remind_offsets)
+        task_group_id = db_get_task_group_by_keyname(db_conn, event_name)["id"]
+        # Редактирование времени до дедлайна, если мероприятие уже есть в БД
+        db_set_task_group_remind(db_conn, task_group_id, remind_offsets)
+        # Применяются только изменения относительно задач, уже загруженных в мероприятие;
+        # у неизменных задач сохраняются отметки об отправленных напоминаниях
+        changes = db_sync_tasks(db_conn, tasks, task_group_id)
+    text = (
+        f"Событие '{event_name}' создано/отредактировано.\n"
+        f"Задач добавлено: {changes['inserted']}, изменено: {changes['updated']}, "
+        f"удалено: {changes['deleted']}, без изменений: {changes['unchanged']}."
+    )
+    if changes["archived"]:
+        text += f"\nПропущено задач, уже перенесенных в архив: {changes['archived']}."
+    return text
+
+
+def delete_event(event_name: str) -> bool:
+    """
+    Удалить мероприятие со всеми задачами
+    :returns: False, если мероприятия с таким названием нет
+    """
+    with db_pool.connection() as db_conn:
+        task_group = db_get_task_group_by_keyname(db_conn, event_name)
+        if task_group is None:
+            return False
+        db_del_task_group(db_conn, task_group["id"])
+    return True
+
+
+# Хранилище состояний пользователей и их данных (ограничено по размеру и времени жизни записей).
+# Обращения к SQLite блокируют поток, а в режиме asyncio обработчики выполняются в цикле событий,
+# поэтому в этом режиме состояния всегда хранятся в памяти процесса
+state_backend = settings.state_backend
+if settings.runtime_mode == "asyncio" and state_backend != "memory":
+    print("В режиме asyncio состояния диалогов хранятся в памяти (хранилище {} не используется).".format(state_backend))
+    state_backend = "memory"
+user_states = create_state_store(
+    state_backend,
+    settings.state_path,
+    settings.state_max_entries,
+    settings.state_ttl,
+)
 
 
-# Словарь для управления состояниями пользователей и их данными
-user_data = {}
+# Ответ на шаг сценария, состояние которого уже удалено из хранилища (истекло время жизни)
+STATE_EXPIRED_TEXT = "Время ожидания истекло, загруженные данные не сохранились. Начните заново командой /newevent"
 
 
 def get_user_step(user_tag: str) -> str:
@@ -121,8 +224,9 @@ def get_user_step(user_tag: str) -> str:
     Получить текущее состояния пользователя (step)
     :param_name user_tag: Телеграм-тег пользователя без @
     """
-    if user_tag in user_data:
-        return user_data[user_tag]["step"]
+    state = user_states.get(user_tag) if user_tag else None
+    if state and state.get("step"):
+        return state["step"]
     else:
         return "AWAITING_COMMANDS"
 
@@ -135,21 +239,15 @@ def new_event(message):
     :param_name message: Сообщение от пользователя
     """
     user_tag = message.from_user.username
-    if user_tag not in user_data:
-        user_data[user_tag] = {"step": None, "file_id": None, "event_name": None}
     markup = types.ForceReply(selective=False)
     bot.send_message(
         message.chat.id,
         "Отправьте файл Excel с задачами и их дедлайнами, оформленный по шаблону.",
         reply_markup=markup,
     )
-    user_data[user_tag]["step"] = "AWAITING_FILE"
+    user_states.set(user_tag, {"step": "AWAITING_FILE", "file_id": None, "event_name": None})
 
 
-@bot.message_handler(
-    func=lambda message: get_user_step(message.from_user.username) == "AWAITING_FILE",
-    content_types=["document"],
-)
 def handle_document(message):
     """
     Получить Excel файл с информацией о задачах или сообщить пользователю, что файл неверного формата
@@ -160,25 +258,21 @@ def handle_document(message):
     if not (file_name.endswith(".xls") or file_name.endswith(".xlsx")):
         bot.send_message(message.chat.id, "Пожалуйста, отправьте файл в формате Excel.")
         return
-    user_data[user_tag]["file_id"] = message.document.file_id
-    file_id = user_data[user_tag]["file_id"]
+    file_id = message.document.file_id
     downloaded_file = bot.download_file(bot.get_file(file_id).file_path)
     try:
-        data_list = parse_pandas_dataframe(parse_excel(downloaded_file))
-        user_data[user_tag]["data_list"] = data_list
-        user_data[user_tag]["step"] = "AWAITING_EVENT_NAME"
+        data_list = parse_tasks(downloaded_file, file_name)
+        user_states.update(user_tag, step="AWAITING_EVENT_NAME", file_id=file_id, data_list=data_list)
         bot.send_message(
             message.chat.id, "Файл принят. Теперь введите уникальное название мероприятия.")
-    except ValueError:
+    except ExcelRowsError as e:
+        bot.send_message(message.chat.id, format_excel_errors(e))
+    except Exception as e:
         bot.send_message(
-            message.chat.id, "Excel-файл заполнен с ошибками. Пожалуйста, обратите внимание на требуемый формат времени: YYYY-mm-dd HH:MM:SS"
+            message.chat.id, f"Не удалось прочитать Excel-файл: {str(e)}"
         )
 
 
-@bot.message_handler(
-    func=lambda message: get_user_step(message.from_user.username)
-    == "AWAITING_EVENT_NAME"
-)
 def event_name_received(message):
     """
     Получить название мероприятия. Оно должно быть уникальным и не длиннее, чем 12 символов
@@ -188,116 +282,214 @@ def event_name_received(message):
     if len(event_name) > 12:
         bot.send_message(
             message.chat.id,
-            f"Название слишком длинное. Пожалуйста, введите название, длина которого не превышает 12 символов.",
+            "Название слишком длинное. Пожалуйста, введите название, длина которого не превышает 12 символов.",
         )
     elif '/' in event_name:
         bot.send_message(
             message.chat.id,
-            f"Недопустимый символ для названия мероприятия: /. Повторите попытку",
+            "Недопустимый символ для названия мероприятия: /. Повторите попытку",
         )
     else:
         user_tag = message.from_user.username
-        user_data[user_tag]["step"] = "AWAITING_REMIND_TIME"
-        user_data[user_tag]["event_name"] = event_name
+        user_states.update(user_tag, step="AWAITING_REMIND_TIME", event_name=event_name)
         bot.send_message(
             message.chat.id,
-            f"Пожалуйста, введите время в минутах, за которое отправляются уведомления всем получателям",
+            "Пожалуйста, введите время в минутах, за которое отправляются уведомления всем получателям. "
+            "Можно указать несколько значений через запятую, например: 1440, 60",
         )
 
 
-@bot.message_handler(
-    func=lambda message: get_user_step(message.from_user.username)
-    == "AWAITING_REMIND_TIME"
-)
 def time_received(message):
     """
     Получить время в минутах, за которое отправляются уведомления всем получателям.
-    Например, число 120 будет означать, что напоминание будет выслано за 2 часа до дедлайна.
+    Например, число 120 будет означать, что напоминание будет выслано за 2 часа до дедлайна,
+    а "1440, 60" - что напоминания будут высланы за сутки и за час до дедлайна.
     :param_name message: Сообщение от пользователя
     """
     try:
         user_tag = message.from_user.username
-        remind_time = int(message.text)             # Попытка перевести текст сообщения в число
-        if remind_time > 0:                         # Проверка на то, что число положительное
-            event_name = user_data[user_tag]["event_name"]
-            # Создание мероприятия, если его еще нет в БД
-            db_add_task_group(db_conn, event_name, remind_time)     
-            # Редактирование времени до дедлайна, если мероприятие уже есть в БД        
-            db_set_task_group_remind(db_conn, db_get_task_group_by_keyname(db_conn, event_name)["id"], remind_time) 
-            unique_participants = set()
-            for event in user_data[user_tag]["data_list"]:
-                unique_participants.update(event['participants'])
-            for participant in unique_participants:
-                if len(participant) >= 5:
-                    db_add_user(db_conn, participant)
-            filtered_events = [
-                {**event, 'participants': [db_get_user_by_tg(db_conn, p)["id"] for p in event['participants'] if len(p) >= 5]}
-                for event in user_data[user_tag]["data_list"]
-            ]
-            db_set_tasks(
-                db_conn, filtered_events,
-                db_get_task_group_by_keyname(db_conn, event_name)["id"],
-                False,
-            )
-            bot.send_message(
-                message.chat.id,
-                f"Событие '{event_name}' создано/отредактировано.",
-            )
-            user_data[user_tag]["step"] = "AWAITING_COMMANDS"
+        # Попытка перевести текст сообщения в список чисел
+        remind_offsets = parse_remind_offsets(message.text)
+        if remind_offsets and all(offset > 0 for offset in remind_offsets):  # Проверка на то, что числа положительные
+            state = user_states.get(user_tag)
+            if not state or not state.get("event_name") or "data_list" not in state:
+                user_states.delete(user_tag)
+                bot.send_message(message.chat.id, STATE_EXPIRED_TEXT)
+                return
+            bot.send_message(message.chat.id, save_event(state["event_name"], remind_offsets, state["data_list"]))
+            # Загруженные задачи больше не нужны - освобождаем память
+            user_states.delete(user_tag)
         else:
-            bot.send_message(message.chat.id, "Неверное число. Пожалуйста, введите целое положительное число")
+            bot.send_message(message.chat.id, "Неверное число. Пожалуйста, введите целые положительные числа через запятую")
     except ValueError:
-        bot.send_message(message.chat.id, "Неверное число. Пожалуйста, введите целое положительное число")
+        bot.send_message(message.chat.id, "Неверное число. Пожалуйста, введите целые положительные числа через запятую")
+
+
+# Число мероприятий на одной странице /listall
+LISTALL_PAGE_SIZE = 10
+
+
+def get_listall_page(after_keyname: str = None, before_keyname: str = None):
+    """
+    Получить текст и клавиатуру навигации одной страницы списка мероприятий
+    :param_name after_keyname: показать мероприятия, следующие за этим
+    :param_name before_keyname: показать мероприятия, предшествующие этому
+    :returns: (текст, клавиатура) или (None, None), если на странице нет мероприятий
+    """
+    with db_pool.connection() as db_conn:
+        events, has_more = db_get_task_group_summaries(
+            db_conn, after_keyname, before_keyname, LISTALL_PAGE_SIZE
+        )
+    return format_listall_page(events, has_more, after_keyname, before_keyname)
+
+
+def format_listall_page(events: list[dict], has_more: bool, after_keyname: str = None, before_keyname: str = None):
+    """
+    Текст и клавиатура навигации страницы списка мероприятий
+    :param_name events, has_more: результат db_get_task_group_summaries
+    :returns: (текст, клавиатура) или (None, None), если на странице нет мероприятий
+    """
+    if not events:
+        return None, None
+    formatted_info = ""
+    for event in events:
+        formatted_info += (
+            f"🔹 {event['keyname']}: \n"
+            f"Задач: {event['n_tasks']}, ожидают напоминания: {event['n_pending']}, просрочено: {event['n_overdue']}, "
+            f"напоминания за {format_offsets(event['remind_offsets'])} минут до начала.\n"
+        )
+    # В направлении выборки о наличии страниц говорит has_more, в обратном - сам факт перехода
+    has_prev = has_more if before_keyname is not None else after_keyname is not None
+    has_next = has_more if before_keyname is None else True
+    markup = types.InlineKeyboardMarkup()
+    buttons = []
+    if has_prev:
+        buttons.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"listall:prev:{events[0]['keyname']}"))
+    if has_next:
+        buttons.append(types.InlineKeyboardButton("Вперед ▶️", callback_data=f"listall:next:{events[-1]['keyname']}"))
+    if buttons:
+        markup.row(*buttons)
+    return formatted_info, markup if buttons else None
 
 
 @bot.message_handler(commands=["listall"])
 @admin_required
 def listall(message):
     """
-    Получить список всех мероприятий и связанных с ними задач, созданных организаторами.
+    Получить постраничный список мероприятий, в которых есть задачи, ожидающие напоминания.
     :param_name message: Сообщение от пользователя
     """
-    events = db_get_task_groups(db_conn)
-    if not events:
+    text, markup = get_listall_page()
+    if text is None:
         bot.send_message(
             message.chat.id, "В данный момент вы не создали ни одного события"
         )
     else:
-        formatted_info = ""
-        for event in events:
-            tasks = db_get_tasks_in_group(db_conn, event['id'])
-            unfinished_event_count = 0
-            for task in tasks:
-                if task['reminder_sent'] == 0:
-                    unfinished_event_count += 1
-                    break
-            if unfinished_event_count == 0: continue
-            formatted_info += (
-                f"🔹 {event['keyname']}: \n"
-                f"Задач: {event['n_tasks']}, "
-                f"напоминание за {event['remind_in_minutes']} минут до начала.\n"
-            )
-        bot.send_message(message.chat.id, formatted_info)
+        bot.send_message(message.chat.id, text, reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda call: call.data and call.data.startswith("listall:"))
+def listall_page(call):
+    """
+    Перейти на другую страницу списка мероприятий по кнопке навигации
+    :param_name call: Нажатие на кнопку под сообщением со списком
+    """
+    if not is_admin(call.from_user.username):
+        bot.answer_callback_query(call.id, "Извините, но эта команда только для администраторов.")
+        return
+    _, direction, keyname = call.data.split(":", 2)
+    if direction == "next":
+        text, markup = get_listall_page(after_keyname=keyname)
+    else:
+        text, markup = get_listall_page(before_keyname=keyname)
+    if text is None:
+        bot.answer_callback_query(call.id, "Больше мероприятий нет")
+        return
+    bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    bot.answer_callback_query(call.id)
 
 
 @bot.message_handler(commands=["delete_task"])
 @admin_required
 def delete(message):
     user_tag = message.from_user.username
-    if user_tag not in user_data:
-        user_data[user_tag] = {}
     bot.send_message(message.chat.id, 'Введите название события, которое вы хотите удалить')
-    user_data[user_tag]["step"] = "AWAITING_DELETION"
+    user_states.set(user_tag, {"step": "AWAITING_DELETION"})
 
 
-@bot.message_handler(func=lambda message: get_user_step(message.from_user.username)
-    == "AWAITING_DELETION")
 def deletion_name(message):
     user_tag = message.from_user.username
-    user_data[user_tag]["step"] = "AWAITING_COMMANDS"
+    user_states.delete(user_tag)
     task_name = message.text
-    try:
-        db_del_task_group(db_conn, db_get_task_group_by_keyname(db_conn, task_name)['id'])
+    if delete_event(task_name):
         bot.send_message(message.chat.id, 'Удаление успешно')
-    except:
+    else:
         bot.send_message(message.chat.id, 'Пожалуйста, проверьте правильность введенного названия')
+
+
+# Сколько последних задач из архива показывает /history
+HISTORY_LIMIT = 20
+
+
+def format_task_group_history(event_name: str, tasks: list[dict]) -> str:
+    """
+    Текст истории мероприятия: задачи из архива, начиная с последней по дедлайну
+    :param_name tasks: строки из db_get_task_group_history
+    """
+    if not tasks:
+        return f"В архиве мероприятия '{event_name}' пока нет задач."
+    text = f"Архив мероприятия '{event_name}' (последние {len(tasks)} задач):\n"
+    for task in tasks:
+        deadline_str = task["deadline"].strftime("%Y-%m-%d %H:%M:%S")
+        text += (
+            f"   - {task['name']}: {deadline_str}, исполнителей: {task['n_participants']}, "
+            f"отправлено напоминаний: {task['n_reminders_sent']}\n"
+        )
+    return text
+
+
+@bot.message_handler(commands=["history"])
+@admin_required
+def history(message):
+    """
+    Начать просмотр архива мероприятия: задач, дедлайн которых давно прошел
+    :param_name message: Сообщение от пользователя
+    """
+    bot.send_message(message.chat.id, "Введите название события, историю которого вы хотите посмотреть")
+    user_states.set(message.from_user.username, {"step": "AWAITING_HISTORY"})
+
+
+def history_name(message):
+    user_states.delete(message.from_user.username)
+    with db_pool.connection() as db_conn:
+        task_group = db_get_task_group_by_keyname(db_conn, message.text)
+        tasks = db_get_task_group_history(db_conn, task_group["id"], HISTORY_LIMIT) if task_group else None
+    if task_group is None:
+        bot.send_message(message.chat.id, "Пожалуйста, проверьте правильность введенного названия")
+    else:
+        bot.send_message(message.chat.id, format_task_group_history(message.text, tasks))
+
+
+# Обработчики шагов сценариев: шаг -> (обработчик, ожидаемый тип сообщения)
+STEP_HANDLERS = {
+    "AWAITING_FILE": (handle_document, "document"),
+    "AWAITING_EVENT_NAME": (event_name_received, "text"),
+    "AWAITING_REMIND_TIME": (time_received, "text"),
+    "AWAITING_DELETION": (deletion_name, "text"),
+    "AWAITING_HISTORY": (history_name, "text"),
+}
+
+
+@bot.message_handler(
+    func=lambda message: get_user_step(message.from_user.username) in STEP_HANDLERS,
+    content_types=["text", "document"],
+)
+def handle_step(message):
+    """
+    Передать сообщение обработчику текущего шага сценария пользователя.
+    Регистрируется последним, поэтому команды обрабатываются в любом состоянии
+    :param_name message: Сообщение от пользователя
+    """
+    handler, content_type = STEP_HANDLERS[get_user_step(message.from_user.username)]
+    if message.content_type == content_type:
+        handler(message)
@@ -1,6 +1,8 @@
 import configparser
 import os
 import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
 
 
 def load_configuration(file_path):
@@ -30,8 +32,127 @@ def load_configuration(file_path):
         print("Список администраторов не найден в файле конфигурации.")
         sys.exit(1)
 
+    # Необязательная секция [State] - хранилище состояний диалогов с пользователями
+    state = config["State"] if "State" in config else {}
+    # Необязательная секция [Webhook] - прием обновлений через webhook вместо long polling
+    webhook = config["Webhook"] if "Webhook" in config else {}
+    # Необязательная секция [Metrics] - HTTP-сервер с метриками в формате Prometheus
+    metrics = config["Metrics"] if "Metrics" in config else {}
+    # Необязательная секция [Runtime] - режим работы: threads (потоки) или asyncio (цикл событий)
+    runtime = config["Runtime"] if "Runtime" in config else {}
+    runtime_mode = runtime.get("mode", "threads").strip().lower()
+    if runtime_mode not in ("threads", "asyncio"):
+        print("Неизвестный режим работы в секции [Runtime]: {} (ожидается threads или asyncio).".format(runtime_mode))
+        sys.exit(1)
+    # Необязательная секция [Archive] - перенос в архив задач, дедлайн которых давно прошел (по умолчанию выключен)
+    archive = config["Archive"] if "Archive" in config else {}
+
     # Возвращаем данные в виде словаря
     return {
         "token": config["Bot"]["token"],
         "admins": config["Bot"]["admins"].split(","),
+        "state_backend": state.get("backend", "memory"),
+        "state_path": state.get("path", "./user_state.sqlite3"),
+        "state_ttl": int(state.get("ttl", 24 * 3600)),
+        "state_max_entries": int(state.get("max_entries", 1000)),
+        "webhook_enabled": webhook.get("enabled", "false").strip().lower() in ("1", "true", "yes", "on"),
+        "webhook_url": webhook.get("url", ""),
+        "webhook_listen": webhook.get("listen", "127.0.0.1"),
+        "webhook_port": int(webhook.get("port", 8443)),
+        "webhook_path": webhook.get("path", "/webhook"),
+        "webhook_secret": webhook.get("secret", ""),
+        "webhook_workers": int(webhook.get("workers", 4)),
+        "webhook_queue_size": int(webhook.get("queue_size", 1000)),
+        "metrics_enabled": metrics.get("enabled", "false").strip().lower() in ("1", "true", "yes", "on"),
+        "metrics_listen": metrics.get("listen", "127.0.0.1"),
+        "metrics_port": int(metrics.get("port", 9464)),
+        "runtime_mode": runtime_mode,
+        "runtime_concurrency": int(runtime.get("concurrency", 64)),
+        "archive_enabled": archive.get("enabled", "false").strip().lower() in ("1", "true", "yes", "on"),
+        "archive_grace_days": int(archive.get("grace_days", 30)),
+        "archive_batch_size": int(archive.get("batch_size", 500)),
+        "archive_interval": int(archive.get("interval_minutes", 60)) * 60,
     }
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """
+    Параметры подключения к базе данных в MySQL из файла dbconfig.ini (см. load_database_settings)
+    """
+
+    host: str
+    port: int
+    user: str
+    password: str = field(repr=False)
+    dbname: str
+    charset: str
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Неизменяемые настройки бота: config.ini (см. load_configuration) и параметры подключения к БД
+    """
+
+    token: str = field(repr=False)
+    admins: tuple
+    state_backend: str
+    state_path: str
+    state_ttl: int
+    state_max_entries: int
+    webhook_enabled: bool
+    webhook_url: str
+    webhook_listen: str
+    webhook_port: int
+    webhook_path: str
+    webhook_secret: str = field(repr=False)
+    webhook_workers: int
+    webhook_queue_size: int
+    metrics_enabled: bool
+    metrics_listen: str
+    metrics_port: int
+    runtime_mode: str
+    runtime_concurrency: int
+    archive_enabled: bool
+    archive_grace_days: int
+    archive_batch_size: int
+    archive_interval: int
+    database: DatabaseSettings
+
+
+@lru_cache(maxsize=None)
+def load_database_settings(file_path: str) -> DatabaseSettings:
+    """
+    Прочитать параметры подключения к базе данных в MySQL; файл читается один раз, повторные вызовы возвращают тот же объект
+    :param_name file_path: путь к файлу конфигурации подключения к БД
+    Файл конфигурации должен быть формата .ini и содержать заголовок [Connection] с ключами
+    ip, port, username, password, dbname, dbcharset и необязательными pool_min_size, pool_max_size
+    """
+    config = configparser.ConfigParser()
+    config.read(file_path)
+    connection = config["Connection"]
+    return DatabaseSettings(
+        host=connection["ip"],
+        port=int(connection["port"]),
+        user=connection["username"],
+        password=connection["password"],
+        dbname=connection["dbname"],
+        charset=connection["dbcharset"],
+        pool_min_size=connection.getint("pool_min_size", 1),
+        pool_max_size=connection.getint("pool_max_size", 10),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_settings(file_path: str = "./config.ini", dbconfig_path: str = "./dbconfig.ini") -> Settings:
+    """
+    Прочитать настройки бота и подключения к БД; файлы читаются один раз, повторные вызовы возвращают тот же объект
+    :param_name file_path: путь к файлу конфигурации бота
+    :param_name dbconfig_path: путь к файлу конфигурации подключения к БД
+    """
+    configuration = load_configuration(file_path)
+    configuration["admins"] = tuple(admin.strip() for admin in configuration["admins"])
+    return Settings(**configuration, database=load_database_settings(dbconfig_path))
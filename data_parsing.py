@@ -1,32 +1,114 @@
-import pandas as pd
-import numpy as np
 import datetime
 import re
-from pandas import DataFrame, Series
+from functools import lru_cache
 from io import BytesIO
-def parse_excel(excel_file: bytes) -> DataFrame:
-  return pd.read_excel(BytesIO(excel_file), usecols="A:D", names=['name', 'description', 'deadline', 'participants'])
 
-def pandas_row_to_dict(data: Series) -> dict:
+DEADLINE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+TASK_NAME_MAX_LENGTH = 48
+
+
+class ExcelRowsError(ValueError):
+  """
+  Ошибки заполнения строк Excel-файла
+  :param_name errors: список пар (номер строки в файле, описание ошибки)
+  """
+  def __init__(self, errors: list[tuple[int, str]]):
+    super().__init__("; ".join(f"строка {row}: {text}" for row, text in errors))
+    self.errors = errors
+
+
+@lru_cache(maxsize=4096)
+def parse_deadline(value: str) -> datetime.datetime:
+  """
+  Разобрать строку с дедлайном в одном из форматов DEADLINE_FORMATS.
+  Результаты кэшируются: в таблицах задач дедлайны часто повторяются
+  """
+  for deadline_format in DEADLINE_FORMATS:
+    try:
+      return datetime.datetime.strptime(value, deadline_format)
+    except ValueError:
+      pass
+  raise ValueError(f"неверный формат дедлайна '{value}', ожидается YYYY-mm-dd HH:MM:SS")
+
+
+def iter_excel_rows(excel_file: bytes, file_name: str = ".xlsx"):
   """
-  Получить 4 переменных, соответствующих четырем столбцам строки датафрейма
-  :param_name data: строка датафрейма со столбцами 'name', 'description', 'deadline', 'participants'
+  Построчно читать первые 4 столбца первого листа Excel-файла, пропуская строку заголовков
+  :param_name excel_file: содержимое файла
+  :param_name file_name: имя файла (по расширению выбирается способ чтения)
+  :returns: итератор пар (номер строки в файле, кортеж значений)
+  Файлы .xlsx читаются потоково через openpyxl; для старого формата .xls используется pandas.
+  Библиотеки импортируются только при первом разборе файла
   """
-  name = str(data['name'] if data['name'] else "Безымянная задача")
-  descr = str(data['description'])
+  if file_name.endswith(".xls"):
+    import pandas as pd
+    df = pd.read_excel(BytesIO(excel_file), usecols="A:D", header=None, skiprows=1, dtype=object)
+    df = df.astype(object).where(df.notna(), None)
+    for i, row in enumerate(df.itertuples(index=False, name=None), start=2):
+      yield i, row
+    return
+  from openpyxl import load_workbook
+  workbook = load_workbook(BytesIO(excel_file), read_only=True, data_only=True)
   try:
-    deadline = datetime.datetime.strptime(str(data['deadline']), '%Y-%m-%d %H:%M:%S')
-  except ValueError:
-    deadline = datetime.datetime.strptime(str(data['deadline']), '%Y-%m-%d %H:%M')
-  particip = [item for item in re.split(r'[ ,@]+', data['participants'].strip()) if item]
+    for i, row in enumerate(workbook.active.iter_rows(min_row=2, max_col=4, values_only=True), start=2):
+      yield i, row
+  finally:
+    workbook.close()
+
+
+def row_to_dict(row: tuple) -> dict:
+  """
+  Преобразовать строку таблицы в словарь задачи для последующей записи в БД
+  :param_name row: значения столбцов 'name', 'description', 'deadline', 'participants'
+  """
+  row = tuple(row) + (None,) * (4 - len(row))
+  name, descr, deadline, particip = row[:4]
+  name = str(name).strip() if name is not None and str(name).strip() else "Безымянная задача"
+  if len(name) > TASK_NAME_MAX_LENGTH:
+    raise ValueError(f"название задачи длиннее {TASK_NAME_MAX_LENGTH} символов")
+  descr = "" if descr is None else str(descr)
+  if deadline is None:
+    raise ValueError("не указан дедлайн")
+  if isinstance(deadline, datetime.datetime):
+    deadline = deadline.replace(microsecond=0)
+  elif isinstance(deadline, datetime.date):
+    deadline = datetime.datetime.combine(deadline, datetime.time())
+  else:
+    deadline = parse_deadline(str(deadline).strip())
+  particip = [item for item in re.split(r'[ ,@]+', str(particip or "").strip()) if item]
   return {'name': name, 'description': descr, 'deadline': deadline, 'participants': particip}
 
-def parse_pandas_dataframe(df_org: DataFrame) -> list[dict]:
+
+def iter_tasks(excel_file: bytes, file_name: str = ".xlsx"):
+  """
+  Потоково разобрать Excel-файл с задачами, оформленный по шаблону
+  :param_name excel_file: содержимое файла
+  :param_name file_name: имя файла
+  :returns: итератор троек (номер строки, словарь задачи или None, текст ошибки или None); пустые строки пропускаются
+  """
+  for i, row in iter_excel_rows(excel_file, file_name):
+    if all(value is None or str(value).strip() == "" for value in row):
+      continue
+    try:
+      yield i, row_to_dict(row), None
+    except ValueError as e:
+      yield i, None, str(e)
+
+
+def parse_tasks(excel_file: bytes, file_name: str = ".xlsx") -> list[dict]:
   """
-  Преобразовать датафрейм Pandas в словарь для последующей записи в БД
-  :param_name df_org: Pandas датафрейм со столбцами 'name', 'description', 'deadline', 'participants'
+  Разобрать Excel-файл с задачами в список словарей для последующей записи в БД
+  :param_name excel_file: содержимое файла
+  :param_name file_name: имя файла
+  :raises ExcelRowsError: если хотя бы одна строка заполнена с ошибками (перечисляются все такие строки)
   """
   res_list = []
-  for i in range(0, len(df_org.index)):
-    res_list.append(pandas_row_to_dict(df_org.iloc[i]))
-  return res_list
\ No newline at end of file
+  errors = []
+  for i, task, error in iter_tasks(excel_file, file_name):
+    if error is None:
+      res_list.append(task)
+    else:
+      errors.append((i, error))
+  if errors:
+    raise ExcelRowsError(errors)
+  return res_list
@@ -0,0 +1,258 @@
+import aiomysql
+from contextlib import asynccontextmanager
+from cache import cached
+from metrics import timed_query
+from config import DatabaseSettings
+from db_interact import (
+    users_cache,
+    task_groups_cache,
+    db_config_from_settings,
+    _query_get_user_by_tg,
+    _query_add_user,
+    _queries_set_user_chatid,
+    _query_get_user_pending_task_groups,
+    _query_get_user_tasks,
+    _query_get_task_group_by_keyname,
+    _query_get_task_group_summaries,
+    _summaries_page,
+    _query_get_task_group_history,
+    _query_get_reminder_schedule,
+    _query_expire_reminders,
+    _query_claim_due_reminders,
+    _query_get_due_reminders,
+    _queries_reminders_ack,
+    _queries_update_chat_health,
+)
+
+# Асинхронные варианты функций db_interact для режима asyncio (см. async_bot.py).
+# Тексты запросов общие с db_interact; здесь только их выполнение через aiomysql.
+# Функции, которые изменяют несколько таблиц одной транзакцией (импорт задач, удаление группы),
+# в режиме asyncio выполняются в отдельном потоке через синхронный пул db_interact.
+
+# Асинхронные обработчики изменения расписания напоминаний, вызываются как await callback(dbconn, task_group_id)
+# с соединением aiomysql (обработчики db_interact.reminder_listeners получают соединение pymysql)
+reminder_listeners = []
+
+
+class AsyncDBPool:
+    """
+    Пул асинхронных соединений с базой данных в MySQL (обертка над aiomysql.Pool).
+    Соединение выдается через асинхронный контекстный менеджер connection(); по выходу из него незавершенная транзакция
+    откатывается, а соединение возвращается в пул
+    """
+
+    def __init__(self, pool: aiomysql.Pool):
+        self.pool = pool
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self.pool.acquire() as dbconn:
+            try:
+                yield dbconn
+            finally:
+                # aiomysql закрывает соединения, возвращенные в пул с открытой транзакцией
+                if not dbconn.closed and dbconn.get_transaction_status():
+                    await dbconn.rollback()
+
+    async def close(self):
+        """
+        Закрыть все соединения пула
+        """
+        self.pool.close()
+        await self.pool.wait_closed()
+
+
+async def db_create_async_pool(database: DatabaseSettings, max_idle: float = 300) -> AsyncDBPool:
+    """
+    Создать пул асинхронных соединений с базой данных в MySQL
+    :param_name database: настройки подключения к БД (см. config.Settings.database)
+    :param_name max_idle: соединения старше этого числа секунд пересоздаются
+    """
+    conf = db_config_from_settings(database)
+    connect = dict(conf["connect"], cursorclass=aiomysql.DictCursor)
+    pool = await aiomysql.create_pool(
+        minsize=conf["pool_min_size"], maxsize=conf["pool_max_size"], pool_recycle=max_idle, **connect
+    )
+    return AsyncDBPool(pool)
+
+
+async def _fetchone(dbconn, query: str, params: list):
+    async with dbconn.cursor() as dbc:
+        await dbc.execute(query, params)
+        return await dbc.fetchone()
+
+
+async def _fetchall(dbconn, query: str, params: list):
+    async with dbconn.cursor() as dbc:
+        await dbc.execute(query, params)
+        return await dbc.fetchall()
+
+
+async def _execute(dbconn, query: str, params: list) -> int:
+    async with dbconn.cursor() as dbc:
+        n_rows = await dbc.execute(query, params)
+        await dbconn.commit()
+        return n_rows
+
+
+async def _notify_reminders_changed_for_user(dbconn, tg_nick: str):
+    """
+    (Система) Сообщить подписчикам об изменении расписания напоминаний групп, в которых у пользователя есть неотправленные
+    напоминания (см. db_interact._notify_reminders_changed_for_user)
+    """
+    if not reminder_listeners:
+        return
+    for row in await _fetchall(dbconn, *_query_get_user_pending_task_groups(tg_nick)):
+        for callback in reminder_listeners:
+            await callback(dbconn, row["task_group_id"])
+
+
+@cached(users_cache)
+@timed_query
+async def adb_get_user_by_tg(dbconn, user_tg_nick: str):
+    """
+    Данные о пользователе по никнейму в Telegram (см. db_get_user_by_tg)
+    """
+    return await _fetchone(dbconn, *_query_get_user_by_tg(user_tg_nick))
+
+
+@timed_query
+async def adb_get_user_tasks(dbconn, user_id: int):
+    """
+    Список задач, назначенных пользователю с заданным id (см. db_get_user_tasks)
+    """
+    return await _fetchall(dbconn, *_query_get_user_tasks(user_id))
+
+
+@cached(task_groups_cache)
+@timed_query
+async def adb_get_task_group_by_keyname(dbconn, keyname: str):
+    """
+    (Организатор) Группа задач по ключу (см. db_get_task_group_by_keyname)
+    """
+    return await _fetchone(dbconn, *_query_get_task_group_by_keyname(keyname))
+
+
+@timed_query
+async def adb_get_task_group_summaries(dbconn, after_keyname: str = None, before_keyname: str = None, limit: int = 10, only_pending: bool = True):
+    """
+    (Организатор) Страница списка групп задач (см. db_get_task_group_summaries)
+    :returns: (список групп, есть ли еще группы в направлении выборки)
+    """
+    query, params = _query_get_task_group_summaries(after_keyname, before_keyname, limit, only_pending)
+    return _summaries_page(await _fetchall(dbconn, query, params), before_keyname, limit)
+
+
+@timed_query
+async def adb_get_task_group_history(dbconn, task_group_id: int, limit: int = 20):
+    """
+    (Организатор) Последние по дедлайну задачи группы из архива (см. db_get_task_group_history)
+    """
+    return await _fetchall(dbconn, *_query_get_task_group_history(task_group_id, limit))
+
+
+@timed_query
+async def adb_add_user(dbconn, tg_nick: str, tg_chatid: int = 0, role_type_id: int | None = None):
+    """
+    (Организатор) Добавить пользователя в систему (см. db_add_user)
+    """
+    query, params = _query_add_user(tg_nick, tg_chatid, role_type_id)
+    async with dbconn.cursor() as dbc:
+        await dbc.execute(query, params)
+        await dbconn.commit()
+        users_cache.clear()
+        return dbc.lastrowid
+
+
+@timed_query
+async def adb_set_user_chatid(dbconn, tg_nick: str, tg_chatid: int):
+    """
+    (Система) Установить id чата с пользователем в Telegram и снять отметку о недоступности его чата (см. db_set_user_chatid).
+    Отложенные напоминания сразу попадают в расписание рассылки (см. reminder_listeners)
+    """
+    (query, params), reset_query = _queries_set_user_chatid(tg_nick, tg_chatid)
+    async with dbconn.cursor() as dbc:
+        n_rows = await dbc.execute(query, params)
+        n_reset = await dbc.execute(*reset_query)
+        await dbconn.commit()
+    users_cache.clear()
+    if n_rows or n_reset:
+        await _notify_reminders_changed_for_user(dbconn, tg_nick)
+    return n_rows != 0
+
+
+@timed_query
+async def adb_get_reminder_schedule(dbconn, task_group_id: int | None = None, reminder_ids: list | None = None):
+    """
+    (Система) Моменты отправки еще не разосланных напоминаний (см. db_get_reminder_schedule)
+    """
+    return await _fetchall(dbconn, *_query_get_reminder_schedule(task_group_id, reminder_ids))
+
+
+@timed_query
+async def adb_expire_reminders(dbconn) -> int:
+    """
+    (Система) Отбросить неотправленные напоминания, дедлайн которых уже прошел (см. db_expire_reminders)
+    :returns: число отброшенных напоминаний
+    """
+    return await _execute(dbconn, *_query_expire_reminders())
+
+
+@timed_query
+async def adb_claim_due_reminders(dbconn, claim_token: str, lease_seconds: int, limit: int) -> int:
+    """
+    (Система) Захватить для отправки до limit наступивших напоминаний (см. db_claim_due_reminders)
+    :returns: число захваченных строк
+    """
+    return await _execute(dbconn, *_query_claim_due_reminders(claim_token, lease_seconds, limit))
+
+
+@timed_query
+async def adb_get_due_reminders(dbconn, claim_token: str):
+    """
+    (Система) Захваченные рассылкой напоминания со всеми данными для отправки (см. db_get_due_reminders)
+    """
+    return await _fetchall(dbconn, *_query_get_due_reminders(claim_token))
+
+
+@timed_query
+async def adb_reminders_ack(
+    dbconn,
+    claim_token: str,
+    sent_ids: list,
+    retry_ids: list,
+    failed_ids: list,
+    retry_delay: int,
+    max_attempts: int,
+    expired_ids: list = (),
+):
+    """
+    (Система) Записать результаты отправки захваченных напоминаний одной транзакцией (см. db_reminders_ack)
+    """
+    async with dbconn.cursor() as dbc:
+        try:
+            for query, params in _queries_reminders_ack(
+                claim_token, sent_ids, retry_ids, failed_ids, retry_delay, max_attempts, expired_ids
+            ):
+                await dbc.execute(query, params)
+            await dbconn.commit()
+        except Exception:
+            await dbconn.rollback()
+            raise
+
+
+@timed_query
+async def adb_update_chat_health(
+    dbconn, recovered_ids: list, unreachable: dict, transient: dict, backoff_base: float, backoff_max: float
+):
+    """
+    (Система) Записать результаты доставки в чаты получателей одной транзакцией (см. db_update_chat_health)
+    """
+    async with dbconn.cursor() as dbc:
+        try:
+            for query, params in _queries_update_chat_health(recovered_ids, unreachable, transient, backoff_base, backoff_max):
+                await dbc.execute(query, params)
+            await dbconn.commit()
+        except Exception:
+            await dbconn.rollback()
+            raise
@@ -1,17 +1,102 @@
 import pymysql
 import pymysql.cursors
-import configparser
+from pymysql.constants import SERVER_STATUS
+import threading
+import time
+from contextlib import contextmanager
+from config import DatabaseSettings, load_database_settings
+from cache import TTLCache, cached
+from metrics import registry, timed_query
 
 
 COLLIST_SELECT_USER = "user.id, user.tg_nick, role.name as role, user.tg_chatid"
 TABLE_SELECT_USER = "user LEFT JOIN role on (user.role_id = role.id)"
-COLLIST_SELECT_TASK_BASE = "task.id, task.name, task.description, task.deadline, task.reminder_sent"
+# reminder_sent - все напоминания о задаче отправлены (или отправлять их уже некому)
+COLLIST_SELECT_TASK_BASE = (
+    "task.id, task.name, task.description, task.deadline,"
+    " NOT EXISTS (SELECT 1 FROM reminder WHERE reminder.task_id = task.id AND reminder.state = 'pending') as reminder_sent"
+)
+# Смещения напоминаний группы задач через запятую, от большего к меньшему
+COLLIST_REMIND_OFFSETS = "(SELECT GROUP_CONCAT(minutes ORDER BY minutes DESC) FROM task_group_offset WHERE task_group_offset.task_group_id = task_group.id) as remind_offsets"
+# Получатель напоминания не начинал диалог с ботом, заблокировал его или чат на паузе после временной ошибки (см. chat_health)
+CONDITION_RECIPIENT_UNREACHABLE = (
+    "EXISTS (SELECT 1 FROM user LEFT JOIN chat_health ON (chat_health.user_id = user.id) WHERE user.id = reminder.user_id"
+    " AND (user.tg_chatid = 0 OR chat_health.state IN ('blocked', 'not_found') OR chat_health.retry_at > now()))"
+)
 
+# Кэши редко меняющихся данных; сбрасываются функциями, изменяющими соответствующие таблицы
+roles_cache = TTLCache("roles", max_size=16, ttl=3600)
+users_cache = TTLCache("users", max_size=4096, ttl=300)
+task_groups_cache = TTLCache("task_groups", max_size=512, ttl=300)
 
-def db_connect(config_path: str):
+
+def db_cache_stats() -> dict:
     """
-    Начать сеанс соединения с базой данных в MySQL
-    :returns: объект сеанса соединения с базой данных в MySQL
+    (Система) Размер и число попаданий и промахов кэшей запросов к БД
+    """
+    return {cache.name: cache.stats() for cache in (roles_cache, users_cache, task_groups_cache)}
+
+
+def _cache_metric(field: str):
+    return lambda: {(name, ): stats[field] for name, stats in db_cache_stats().items()}
+
+
+registry.gauge("db_cache_hits", "Число попаданий в кэш запросов к БД", ("cache",), _cache_metric("hits"))
+registry.gauge("db_cache_misses", "Число промахов кэша запросов к БД", ("cache",), _cache_metric("misses"))
+
+
+# Обработчики изменения расписания напоминаний, вызываются как callback(dbconn, task_group_id)
+reminder_listeners = []
+
+
+def _notify_reminders_changed(dbconn, task_group_id: int):
+    """
+    (Система) Сообщить подписчикам, что расписание напоминаний группы задач изменилось
+    """
+    for callback in reminder_listeners:
+        callback(dbconn, task_group_id)
+
+
+def _notify_reminders_changed_for_task(dbconn, task_id: int):
+    """
+    (Система) Сообщить подписчикам об изменении расписания напоминаний группы, в которую входит задача
+    """
+    if not reminder_listeners:
+        return
+    query = "SELECT task_group_id FROM task WHERE id = %s"
+    params = [task_id]
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        row = dbc.fetchone()
+    if row:
+        _notify_reminders_changed(dbconn, row["task_group_id"])
+
+
+def _notify_reminders_changed_for_user(dbconn, tg_nick: str):
+    """
+    (Система) Сообщить подписчикам об изменении расписания напоминаний групп, в которых у пользователя есть неотправленные напоминания
+    """
+    if not reminder_listeners:
+        return
+    with dbconn.cursor() as dbc:
+        dbc.execute(*_query_get_user_pending_task_groups(tg_nick))
+        rows = dbc.fetchall()
+    for row in rows:
+        _notify_reminders_changed(dbconn, row["task_group_id"])
+
+
+def _query_get_user_pending_task_groups(tg_nick: str) -> tuple[str, list]:
+    query = (
+        "SELECT DISTINCT task.task_group_id FROM reminder INNER JOIN task ON (reminder.task_id = task.id)"
+        " INNER JOIN user ON (reminder.user_id = user.id) WHERE user.tg_nick = %s AND reminder.state = 'pending'"
+    )
+    return query, [tg_nick]
+
+
+def db_read_config(config_path: str) -> dict:
+    """
+    Прочитать параметры подключения к базе данных в MySQL
+    :returns: словарь с параметрами для pymysql.connect и размерами пула соединений
     :param_name config_path: путь к файлу конфигурации подключения к базе данных в MySQL
     Файл конфигурации должен быть формата .ini и содержать заголовок [Connection] со следующими ключами:
     > ip - IP (или домен) сервера, на котором запущена СУБД MySQL (или MariaDB)
@@ -20,28 +105,177 @@ def db_connect(config_path: str):
     > password - Пароль пользователя MySQL
     > dbname - Наименование базы данных в MySQL
     > dbcharset - Кодировка в БД (обычно выставляют utf8mb4)
+    Необязательные ключи:
+    > pool_min_size, pool_max_size - минимальное и максимальное число соединений в пуле (по умолчанию 1 и 10)
+    Файл читается один раз (см. config.load_database_settings)
     """
-    conf = configparser.ConfigParser()
-    conf.read(config_path)
-    conf_conn = conf["Connection"]
-    ip = conf_conn["ip"]
-    port = int(conf_conn["port"])
-    username = conf_conn["username"]
-    password = conf_conn["password"]
-    dbname = conf_conn["dbname"]
-    charset = conf_conn["dbcharset"]
-    dbconn = pymysql.connect(
-        host=ip,
-        port=port,
-        user=username,
-        password=password,
-        db=dbname,
-        charset=charset,
-        cursorclass=pymysql.cursors.DictCursor,
-    )
-    return dbconn
+    return db_config_from_settings(load_database_settings(config_path))
+
+
+def db_config_from_settings(database: DatabaseSettings) -> dict:
+    """
+    Параметры для pymysql.connect и размеры пула соединений из настроек подключения к БД
+    """
+    return {
+        "connect": {
+            "host": database.host,
+            "port": database.port,
+            "user": database.user,
+            "password": database.password,
+            "db": database.dbname,
+            "charset": database.charset,
+            "cursorclass": pymysql.cursors.DictCursor,
+        },
+        "pool_min_size": database.pool_min_size,
+        "pool_max_size": database.pool_max_size,
+    }
+
+
+@timed_query
+def db_connect(config_path: str):
+    """
+    Начать сеанс соединения с базой данных в MySQL
+    :returns: объект сеанса соединения с базой данных в MySQL
+    :param_name config_path: путь к файлу конфигурации подключения к базе данных в MySQL (см. db_read_config)
+    """
+    return pymysql.connect(**db_read_config(config_path)["connect"])
+
+
+class DBPool:
+    """
+    Потокобезопасный пул соединений с базой данных в MySQL.
+    Соединение выдается через контекстный менеджер connection(); по выходу из него незавершенная транзакция откатывается,
+    а соединение возвращается в пул. Соединения открываются при первой необходимости, а не при создании пула. Соединения, простаивавшие дольше check_after секунд, перед выдачей проверяются ping,
+    а простаивавшие дольше max_idle секунд закрываются (сверх min_size).
+    """
+
+    def __init__(
+        self,
+        connect_params: dict,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_idle: float = 300,
+        check_after: float = 30,
+        timeout: float = 30,
+    ):
+        """
+        :param_name connect_params: параметры для pymysql.connect
+        :param_name min_size: число соединений, которые держатся открытыми постоянно (после того как были открыты)
+        :param_name max_size: максимальное число одновременно открытых соединений
+        :param_name max_idle: через сколько секунд простоя лишнее соединение закрывается
+        :param_name check_after: через сколько секунд простоя соединение проверяется перед выдачей
+        :param_name timeout: сколько секунд ждать свободного соединения
+        """
+        self.connect_params = connect_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.timeout = timeout
+        self._idle = []  # пары (соединение, момент возврата в пул)
+        self._n_open = 0
+        self._cond = threading.Condition()
 
+    def _discard(self, conn):
+        self._n_open -= 1
+        try:
+            conn.close()
+        except pymysql.err.Error:
+            pass
 
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                # Закрываем лишние соединения, которые слишком долго простаивали
+                while len(self._idle) > 0 and self._n_open > self.min_size and now - self._idle[0][1] > self.max_idle:
+                    self._discard(self._idle.pop(0)[0])
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._n_open < self.max_size:
+                    self._n_open += 1
+                    conn, released_at = None, now
+                    break
+                if not self._cond.wait(deadline - now) and time.monotonic() >= deadline:
+                    raise TimeoutError("Нет свободных соединений с БД в пуле")
+        if conn is None:
+            try:
+                conn = pymysql.connect(**self.connect_params)
+            except Exception:
+                with self._cond:
+                    self._n_open -= 1
+                    self._cond.notify()
+                raise
+        elif time.monotonic() - released_at > self.check_after:
+            try:
+                # При обрыве (например, по wait_timeout) ping переподключается сам
+                conn.ping(reconnect=True)
+            except Exception:
+                with self._cond:
+                    self._discard(conn)
+                    self._cond.notify()
+                raise
+        return conn
+
+    def _release(self, conn, broken: bool = False):
+        if not broken and conn.open:
+            try:
+                if conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    conn.rollback()
+            except pymysql.err.Error:
+                broken = True
+        with self._cond:
+            if broken or not conn.open:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Взять соединение из пула на время блока with
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self._release(conn, broken=True)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def close(self):
+        """
+        Закрыть все свободные соединения пула
+        """
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+def db_create_pool(config_path: str) -> DBPool:
+    """
+    Создать пул соединений с базой данных в MySQL (соединения открываются при первом обращении)
+    :param_name config_path: путь к файлу конфигурации подключения к базе данных в MySQL (см. db_read_config)
+    """
+    return db_create_pool_from_settings(load_database_settings(config_path))
+
+
+def db_create_pool_from_settings(database: DatabaseSettings) -> DBPool:
+    """
+    Создать пул соединений с базой данных в MySQL по настройкам подключения (см. config.Settings.database)
+    """
+    conf = db_config_from_settings(database)
+    return DBPool(conf["connect"], conf["pool_min_size"], conf["pool_max_size"])
+
+
+@timed_query
 def db_disconnect(dbconn):
     """
     Завершить сеанс соединения с базой данных в MySQL
@@ -49,6 +283,8 @@ def db_disconnect(dbconn):
     dbconn.close()
 
 
+@cached(roles_cache)
+@timed_query
 def db_get_roles(dbconn):
     """
     Список уровней доступа пользователей в системе
@@ -59,6 +295,7 @@ def db_get_roles(dbconn):
         return dbc.fetchall()
 
 
+@timed_query
 def db_get_users(dbconn):
     """
     Список пользователей
@@ -71,6 +308,8 @@ def db_get_users(dbconn):
         return dbc.fetchall()
 
 
+@cached(users_cache)
+@timed_query
 def db_get_user(dbconn, user_id: int):
     """
     Данные о пользователе по id в БД
@@ -90,25 +329,25 @@ def db_get_user(dbconn, user_id: int):
         return dbc.fetchone()
 
 
+@cached(users_cache)
+@timed_query
 def db_get_user_by_tg(dbconn, user_tg_nick: str):
     """
     Данные о пользователе по никнейму в Telegram
     """
-    global COLLIST_SELECT_USER
-    global TABLE_SELECT_USER
-    query = (
-        "SELECT "
-        + COLLIST_SELECT_USER
-        + " FROM "
-        + TABLE_SELECT_USER
-        + " WHERE user.tg_nick = %s"
-    )
-    params = [user_tg_nick]
+    query, params = _query_get_user_by_tg(user_tg_nick)
     with dbconn.cursor() as dbc:
         dbc.execute(query, params)
         return dbc.fetchone()
 
 
+def _query_get_user_by_tg(user_tg_nick: str) -> tuple[str, list]:
+    query = "SELECT " + COLLIST_SELECT_USER + " FROM " + TABLE_SELECT_USER + " WHERE user.tg_nick = %s"
+    return query, [user_tg_nick]
+
+
+@cached(users_cache)
+@timed_query
 def db_get_user_by_tg_chatid(dbconn, user_tg_chatid: int):
     """
     Данные о пользователе по идентификатору чата с ним в Telegram
@@ -130,33 +369,47 @@ def db_get_user_by_tg_chatid(dbconn, user_tg_chatid: int):
         return dbc.fetchone()
 
 
+@timed_query
 def db_get_user_tasks(dbconn, user_id: int):
     """
     Список задач, назначенных пользователю с заданным id
     """
-    global COLLIST_SELECT_TASK_BASE
+    query, params = _query_get_user_tasks(user_id)
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        return dbc.fetchall()
+
+
+def _query_get_user_tasks(user_id: int) -> tuple[str, list]:
     query = (
         "SELECT "
         + COLLIST_SELECT_TASK_BASE
-        + ", task_group.keyname as group_keyname, task_group.remind_in_minutes as org_remind_in_minutes, user_task.again_remind_in_minutes as participant_remind_in_minutes FROM user_task LEFT JOIN task on (task_id=task.id) LEFT JOIN task_group on (task_group_id=task_group.id) WHERE user_id = %s AND task.deadline > now()"
+        + ", task_group.keyname as group_keyname, "
+        + COLLIST_REMIND_OFFSETS
+        + ", (SELECT GROUP_CONCAT(minutes ORDER BY minutes DESC) FROM user_task_offset WHERE user_task_offset.user_id = user_task.user_id AND user_task_offset.task_id = user_task.task_id) as participant_remind_offsets"
+        + " FROM user_task LEFT JOIN task on (task_id=task.id) LEFT JOIN task_group on (task_group_id=task_group.id) WHERE user_id = %s AND task.deadline > now()"
     )
-    params = [user_id]
-    with dbconn.cursor() as dbc:
-        dbc.execute(query, params)
-        return dbc.fetchall()
+    return query, [user_id]
 
 
+@cached(task_groups_cache)
+@timed_query
 def db_get_task_group_by_keyname(dbconn, keyname: str):
     """
     (Организатор) Группа задач по ключу (keyname)
     """
-    query = "SELECT task_group.id, keyname, remind_in_minutes, count(task.id) as n_tasks FROM task_group left join task on (task_group_id=task_group.id) WHERE keyname = %s GROUP BY task_group_id"
-    params = [keyname]
+    query, params = _query_get_task_group_by_keyname(keyname)
     with dbconn.cursor() as dbc:
         dbc.execute(query, params)
         return dbc.fetchone()
 
 
+def _query_get_task_group_by_keyname(keyname: str) -> tuple[str, list]:
+    query = "SELECT task_group.id, keyname, " + COLLIST_REMIND_OFFSETS + ", count(task.id) as n_tasks FROM task_group left join task on (task_group_id=task_group.id) WHERE keyname = %s GROUP BY task_group.id"
+    return query, [keyname]
+
+
+@timed_query
 def db_get_tasks_in_group(dbconn, task_group_id: int):
     """
     (Организатор) Список задач в группе с заданным id
@@ -173,17 +426,67 @@ def db_get_tasks_in_group(dbconn, task_group_id: int):
         return dbc.fetchall()
 
 
+@timed_query
 def db_get_task_groups(dbconn):
     """
     (Организатор) Список групп задач
     """
-    # query = 'SELECT id, keyname, remind_in_minutes FROM task_group'
-    query = "SELECT task_group.id, keyname, remind_in_minutes, count(task.id) as n_tasks FROM task_group left join task on (task_group_id=task_group.id) GROUP BY task_group_id"
+    query = "SELECT task_group.id, keyname, " + COLLIST_REMIND_OFFSETS + ", count(task.id) as n_tasks FROM task_group left join task on (task_group_id=task_group.id) GROUP BY task_group.id"
     with dbconn.cursor() as dbc:
         dbc.execute(query)
         return dbc.fetchall()
 
 
+@timed_query
+def db_get_task_group_summaries(dbconn, after_keyname: str = None, before_keyname: str = None, limit: int = 10, only_pending: bool = True):
+    """
+    (Организатор) Страница списка групп задач с числом всех, ожидающих напоминания и просроченных задач, упорядоченная по keyname.
+    Страницы выбираются по ключу (keyset), а не по смещению, поэтому запрос не замедляется на дальних страницах
+    :param_name after_keyname: вернуть группы, следующие за этой (следующая страница)
+    :param_name before_keyname: вернуть группы, предшествующие этой (предыдущая страница)
+    :param_name limit: размер страницы
+    :param_name only_pending: только группы, в которых есть задачи, напоминание о которых еще не отправлено
+    :returns: (список групп, есть ли еще группы в направлении выборки)
+    """
+    query, params = _query_get_task_group_summaries(after_keyname, before_keyname, limit, only_pending)
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        return _summaries_page(dbc.fetchall(), before_keyname, limit)
+
+
+def _query_get_task_group_summaries(after_keyname: str, before_keyname: str, limit: int, only_pending: bool) -> tuple[str, list]:
+    query = (
+        "SELECT task_group.id, keyname, " + COLLIST_REMIND_OFFSETS + ", count(task.id) AS n_tasks, "
+        "coalesce(sum(EXISTS (SELECT 1 FROM reminder WHERE reminder.task_id = task.id AND reminder.state = 'pending')), 0) AS n_pending, "
+        "coalesce(sum(task.deadline < now()), 0) AS n_overdue "
+        "FROM task_group LEFT JOIN task ON task.task_group_id = task_group.id"
+    )
+    params = []
+    if before_keyname is not None:
+        query += " WHERE keyname < %s"
+        params.append(before_keyname)
+    elif after_keyname is not None:
+        query += " WHERE keyname > %s"
+        params.append(after_keyname)
+    query += " GROUP BY task_group.id"
+    if only_pending:
+        query += " HAVING n_pending > 0"
+    query += " ORDER BY keyname DESC" if before_keyname is not None else " ORDER BY keyname"
+    query += " LIMIT %s"
+    params.append(limit + 1)
+    return query, params
+
+
+def _summaries_page(groups: list, before_keyname: str, limit: int) -> tuple[list, bool]:
+    # Запрос выбирает на одну группу больше страницы, чтобы узнать, есть ли еще группы
+    has_more = len(groups) > limit
+    groups = list(groups[:limit])
+    if before_keyname is not None:
+        groups.reverse()
+    return groups, has_more
+
+
+@timed_query
 def db_get_task_by_id(dbconn, task_id):
     """
     (Система) Задача по ее id
@@ -196,6 +499,7 @@ def db_get_task_by_id(dbconn, task_id):
 
 
 
+@timed_query
 def db_get_task_participants(dbconn, task_id: int):
     """
     (Организатор) Список участников, которым была назначена задача с заданным id
@@ -212,6 +516,7 @@ def db_get_task_participants(dbconn, task_id: int):
         return dbc.fetchall()
 
 
+@timed_query
 def db_add_user(
     dbconn, tg_nick: str, tg_chatid: int = 0, role_type_id: int | None = None
 ):
@@ -221,6 +526,15 @@ def db_add_user(
     :param_name tg_chatid: id чата с пользователем в Telegram (0 - не получен)
     :param_name role_type_id: номер уровня доступа к системе (1 - организатор, 2 - участник (по умолчанию))
     """
+    query, params = _query_add_user(tg_nick, tg_chatid, role_type_id)
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        dbconn.commit()
+        users_cache.clear()
+        return dbc.lastrowid
+
+
+def _query_add_user(tg_nick: str, tg_chatid: int, role_type_id: int | None) -> tuple[str, list]:
     if role_type_id == None:
         query = "INSERT IGNORE INTO user(tg_nick, tg_chatid) VALUES (%s, %s)"
         params = [tg_nick, tg_chatid]
@@ -229,83 +543,102 @@ def db_add_user(
             "INSERT IGNORE INTO user(tg_nick, role_id, tg_chatid) VALUES (%s, %s, %s)"
         )
         params = [tg_nick, role_type_id, tg_chatid]
-    with dbconn.cursor() as dbc:
-        dbc.execute(query, params)
-        dbconn.commit()
-        return dbc.lastrowid
+    return query, params
 
 
+@timed_query
 def db_set_user_chatid(dbconn, tg_nick: str, tg_chatid: int):
     """
     (Система) Установить id чата с пользователем в Telegram
     :param_name tg_nick: никнейм пользователя в Telegram
     :param_name tg_chatid: новый id чата с пользователем в Telegram
+    Пользователь снова написал боту, поэтому отметка о недоступности его чата (chat_health) снимается
+    и отложенные напоминания ему снова рассылаются
     """
-    query = "UPDATE user SET tg_chatid = %s WHERE tg_nick = %s"
-    params = [tg_chatid, tg_nick]
+    (query, params), reset_query = _queries_set_user_chatid(tg_nick, tg_chatid)
     with dbconn.cursor() as dbc:
         n_rows = dbc.execute(query, params)
+        n_reset = dbc.execute(*reset_query)
         dbconn.commit()
-        return n_rows != 0
+        users_cache.clear()
+    if n_rows or n_reset:
+        _notify_reminders_changed_for_user(dbconn, tg_nick)
+    return n_rows != 0
+
 
+def _queries_set_user_chatid(tg_nick: str, tg_chatid: int) -> list[tuple[str, list]]:
+    return [
+        ("UPDATE user SET tg_chatid = %s WHERE tg_nick = %s", [tg_chatid, tg_nick]),
+        ("DELETE chat_health FROM chat_health INNER JOIN user ON (chat_health.user_id = user.id) WHERE user.tg_nick = %s", [tg_nick]),
+    ]
 
-def db_add_task_group(dbconn, keyname: str, remind_in_minutes: int | None = None):
+
+# Смещения напоминаний новой группы задач по умолчанию (за сколько минут до дедлайна)
+DEFAULT_REMIND_OFFSETS = (60,)
+
+
+def _expand_reminders(dbc, condition: str, params: list, sources: tuple = ("group", "user")):
     """
-    (Организатор) Добавить группу задач
-    :param_name keyname: ключ группы
-    :param_name remind_in_minutes: напомнить через минуту
+    Развернуть смещения напоминаний в строки таблицы reminder для пар (исполнитель, задача), выбранных условием condition
+    по таблицам task и user_task. Напоминания с тем же сроком, уже имеющиеся в таблице (в том числе отправленные), не дублируются.
+    Из напоминаний, срок которых уже прошел, добавляется только последнее перед дедлайном (если дедлайн еще не наступил)
+    :param_name condition: условие по таблицам task, user_task и смещениям o (например, o.minutes IN (...))
+    :param_name sources: group - напоминания по смещениям группы задач, user - по индивидуальным смещениям исполнителей
     """
-    if remind_in_minutes == None:
-        query = "INSERT IGNORE INTO task_group(keyname) VALUES (%s)"
-        params = [keyname]
-    else:
+    if "group" in sources:
         query = (
-            "INSERT IGNORE INTO task_group(keyname, remind_in_minutes) VALUES (%s, %s)"
+            "INSERT IGNORE INTO reminder(task_id, user_id, source, due_at, deadline, next_attempt_at)"
+            " SELECT task.id, user_task.user_id, 'group', task.deadline - INTERVAL o.minutes MINUTE, task.deadline, task.deadline - INTERVAL o.minutes MINUTE"
+            " FROM task INNER JOIN user_task ON (user_task.task_id = task.id)"
+            " INNER JOIN task_group_offset o ON (o.task_group_id = task.task_group_id)"
+            " WHERE task.deadline > now() AND (task.deadline - INTERVAL o.minutes MINUTE > now()"
+            " OR o.minutes = (SELECT min(minutes) FROM task_group_offset WHERE task_group_id = task.task_group_id))"
+            " AND (" + condition + ")"
+        )
+        dbc.execute(query, params)
+    if "user" in sources:
+        query = (
+            "INSERT IGNORE INTO reminder(task_id, user_id, source, due_at, deadline, next_attempt_at)"
+            " SELECT task.id, user_task.user_id, 'user', task.deadline - INTERVAL o.minutes MINUTE, task.deadline, task.deadline - INTERVAL o.minutes MINUTE"
+            " FROM task INNER JOIN user_task ON (user_task.task_id = task.id)"
+            " INNER JOIN user_task_offset o ON (o.user_id = user_task.user_id AND o.task_id = user_task.task_id)"
+            " WHERE task.deadline > now() AND (task.deadline - INTERVAL o.minutes MINUTE > now()"
+            " OR o.minutes = (SELECT min(minutes) FROM user_task_offset WHERE user_id = user_task.user_id AND task_id = user_task.task_id))"
+            " AND (" + condition + ")"
         )
-        params = [keyname, remind_in_minutes]
-    with dbconn.cursor() as dbc:
         dbc.execute(query, params)
-        dbconn.commit()
-        return dbc.lastrowid
 
 
-def db_set_tasks(
-    dbconn, tasks: list, task_group_id: int, add_mode: bool = True
-):  # TODO: НЕОБХОДИМО ТЕСТИРОВАНИЕ. #FIXME преобразовывать deadline в правильную mysql-строку типа datetime
+def _pairs_condition(pairs: list, table: str = "user_task") -> tuple[str, list]:
     """
-    (Организатор) Заменить задачи в группе (add_mode = False) или добавить к существующим (add_mode = True)
-    :param_name tasks: список из словарей с задачами
-    :param_name task_group_id: id группы задач
-    :param_name add_mode: False - заменить задачи, True - добавить новые задачи
+    Условие отбора по списку пар (user_id, task_id) и его параметры
+    """
+    condition = f"({table}.user_id, {table}.task_id) IN (" + ", ".join(["(%s, %s)"] * len(pairs)) + ")"
+    return condition, [value for pair in pairs for value in pair]
+
+
+@timed_query
+def db_add_task_group(dbconn, keyname: str, remind_offsets: list | None = None):
     """
+    (Организатор) Добавить группу задач
+    :param_name keyname: ключ группы
+    :param_name remind_offsets: за сколько минут до дедлайна напоминать (список; по умолчанию DEFAULT_REMIND_OFFSETS)
+    """
+    query = "INSERT IGNORE INTO task_group(keyname) VALUES (%s)"
+    params = [keyname]
     with dbconn.cursor() as dbc:
-        query = "SELECT * FROM task_group WHERE id = %s"
-        params = [task_group_id]
-        n_groups_by_id_count = dbc.execute(query, params)
-        if n_groups_by_id_count == 0:
-            raise ValueError("Не найдена такая группа задач")
-        if not add_mode:
-            query = "DELETE IGNORE FROM task WHERE task_group_id = %s"
-            params = [task_group_id]
-            dbc.execute(query, params)  # delete tasks of specified group
-        query = "INSERT INTO task(name, description, deadline, task_group_id) VALUES (%s, %s, %s, %s)"
-        query_sub = "INSERT INTO user_task(user_id, task_id) VALUES (%s, %s)"
-        for task in tasks:
-            params = [
-                task["name"],
-                task["description"],
-                task["deadline"],
-                task_group_id,
-            ]
-            dbc.execute(query, params)  # insert new task
-            rec_id = dbc.lastrowid
-            # получить rec_id (id новой записи)
-            for task_user_id in task["participants"]:
-                params_sub = [task_user_id, rec_id]
-                dbc.execute(query_sub, params_sub)
+        dbc.execute(query, params)
+        task_group_id = dbc.lastrowid
+        if task_group_id:
+            offsets = sorted(set(remind_offsets or DEFAULT_REMIND_OFFSETS))
+            query = "INSERT INTO task_group_offset(task_group_id, minutes) VALUES " + ", ".join(["(%s, %s)"] * len(offsets))
+            dbc.execute(query, [value for minutes in offsets for value in (task_group_id, minutes)])
         dbconn.commit()
+        task_groups_cache.clear()
+        return task_group_id
 
 
+@timed_query
 def db_del_user(dbconn, user_id: int):
     """
     (Организатор) Удалить пользователя из системы
@@ -315,9 +648,11 @@ def db_del_user(dbconn, user_id: int):
     with dbconn.cursor() as dbc:
         n_rows = dbc.execute(query, params)
         dbconn.commit()
+        users_cache.clear()
         return n_rows != 0
 
 
+@timed_query
 def db_del_task_group(dbconn, task_group_id: int):
     """
     (Организатор) Удалить группу задач из системы (вместе с ней удалятся задачи, принадлежащие этой группе)
@@ -327,9 +662,12 @@ def db_del_task_group(dbconn, task_group_id: int):
     with dbconn.cursor() as dbc:
         n_rows = dbc.execute(query, params)
         dbconn.commit()
-        return n_rows != 0
+        task_groups_cache.clear()
+    _notify_reminders_changed(dbconn, task_group_id)
+    return n_rows != 0
 
 
+@timed_query
 def db_task_deattach_participant(dbconn, task_id: int, user_id: int):
     """
     (Организатор) Убрать пользователя с id = user_id из списка исполнителей задачи с id = task_id
@@ -338,9 +676,14 @@ def db_task_deattach_participant(dbconn, task_id: int, user_id: int):
     params = [task_id, user_id]
     with dbconn.cursor() as dbc:
         n_rows = dbc.execute(query, params)
-        return n_rows != 0
+        query = "DELETE FROM reminder WHERE task_id = %s AND user_id = %s AND state = 'pending'"
+        dbc.execute(query, params)
+        dbconn.commit()
+    _notify_reminders_changed_for_task(dbconn, task_id)
+    return n_rows != 0
 
 
+@timed_query
 def db_task_deattach_all_participants(dbconn, task_id: int):
     """
     (Организатор) Убрать всех пользователей из списка исполнителей задачи с id = task_id
@@ -349,94 +692,651 @@ def db_task_deattach_all_participants(dbconn, task_id: int):
     params = [task_id]
     with dbconn.cursor() as dbc:
         n_rows = dbc.execute(query, params)
+        query = "DELETE FROM reminder WHERE task_id = %s AND state = 'pending'"
+        dbc.execute(query, params)
         dbconn.commit()
-        return n_rows != 0
+    _notify_reminders_changed_for_task(dbconn, task_id)
+    return n_rows != 0
 
 
-def db_set_task_group_remind(dbconn, task_group_id: int, remind_mins: int):
+@timed_query
+def db_set_task_group_remind(dbconn, task_group_id: int, remind_offsets: list):
     """
-    (Организатор) Установить срок напоминания о дедлайне для группы задач
-    :param_name remind_mins: за сколько минут до дедлайна
+    (Организатор) Установить сроки напоминаний о дедлайне для группы задач и пересчитать неотправленные напоминания.
+    Изменяются только напоминания по удаленным и добавленным срокам; если сроки не изменились, напоминания не трогаются.
+    Захваченные рассылкой напоминания не удаляются
+    :param_name remind_offsets: за сколько минут до дедлайна напоминать (непустой список)
     """
-    query = "UPDATE task_group SET remind_in_minutes = %s WHERE id = %s"
-    params = [remind_mins, task_group_id]
+    offsets = sorted(set(remind_offsets))
+    if not offsets:
+        raise ValueError("Не указаны сроки напоминаний")
     with dbconn.cursor() as dbc:
-        n_rows = dbc.execute(query, params)
-        dbconn.commit()
-        return n_rows != 0
+        try:
+            query = "SELECT id FROM task_group WHERE id = %s FOR UPDATE"
+            n_rows = dbc.execute(query, [task_group_id])
+            changed = False
+            if n_rows:
+                dbc.execute("SELECT minutes FROM task_group_offset WHERE task_group_id = %s", [task_group_id])
+                removed, added, expand = _offsets_diff([row["minutes"] for row in dbc.fetchall()], offsets)
+                changed = bool(removed or added)
+            if changed:
+                if removed:
+                    query = "DELETE FROM task_group_offset WHERE task_group_id = %s AND minutes IN " + _in_placeholders(removed)
+                    dbc.execute(query, [task_group_id, *removed])
+                    query = (
+                        "DELETE reminder FROM reminder INNER JOIN task ON (reminder.task_id = task.id)"
+                        " WHERE reminder.state = 'pending' AND reminder.source = 'group' AND task.task_group_id = %s"
+                        " AND (reminder.claimed_by IS NULL OR reminder.claim_expires_at < now())"
+                        " AND TIMESTAMPDIFF(MINUTE, reminder.due_at, reminder.deadline) IN " + _in_placeholders(removed)
+                    )
+                    dbc.execute(query, [task_group_id, *removed])
+                if added:
+                    query = "INSERT INTO task_group_offset(task_group_id, minutes) VALUES " + ", ".join(["(%s, %s)"] * len(added))
+                    dbc.execute(query, [value for minutes in added for value in (task_group_id, minutes)])
+                condition = "task.task_group_id = %s AND o.minutes IN " + _in_placeholders(expand)
+                _expand_reminders(dbc, condition, [task_group_id, *expand], ("group",))
+            dbconn.commit()
+        except Exception:
+            dbconn.rollback()
+            raise
+    if changed:
+        task_groups_cache.clear()
+        _notify_reminders_changed(dbconn, task_group_id)
+    return n_rows != 0
 
 
+@timed_query
 def db_set_task_participant_remind(
-    dbconn, task_id: int, user_id: int, remind_mins: int
+    dbconn, task_id: int, user_id: int, remind_offsets: list
 ):
     """
-    (Участник) Установить индивидуальный срок напоминания о дедлайне для задачи
+    (Участник) Установить индивидуальные сроки напоминаний о дедлайне для задачи и пересчитать неотправленные напоминания
+    (только по удаленным и добавленным срокам, см. db_set_task_group_remind)
     :param_name task_id: id задачи
     :param_name user_id: id пользователя - исполнителя задачи
-    :param_name remind_mins: за сколько минут до дедлайна
+    :param_name remind_offsets: за сколько минут до дедлайна напоминать (пустой список - без индивидуальных напоминаний)
     """
-    query = "UPDATE user_task SET again_remind_in_minutes = %s WHERE user_id = %s AND task_id = %s"
-    params = [remind_mins, user_id, task_id]
+    offsets = sorted(set(remind_offsets))
+    params = [user_id, task_id]
     with dbconn.cursor() as dbc:
-        n_rows = dbc.execute(query, params)
-        dbconn.commit()
-        return n_rows != 0
+        try:
+            n_rows = dbc.execute("SELECT task_id FROM user_task WHERE user_id = %s AND task_id = %s FOR UPDATE", params)
+            changed = False
+            if n_rows:
+                dbc.execute("SELECT minutes FROM user_task_offset WHERE user_id = %s AND task_id = %s", params)
+                removed, added, expand = _offsets_diff([row["minutes"] for row in dbc.fetchall()], offsets)
+                changed = bool(removed or added)
+            if changed:
+                if removed:
+                    query = "DELETE FROM user_task_offset WHERE user_id = %s AND task_id = %s AND minutes IN " + _in_placeholders(removed)
+                    dbc.execute(query, [*params, *removed])
+                    query = (
+                        "DELETE FROM reminder WHERE state = 'pending' AND source = 'user' AND user_id = %s AND task_id = %s"
+                        " AND (claimed_by IS NULL OR claim_expires_at < now())"
+                        " AND TIMESTAMPDIFF(MINUTE, due_at, deadline) IN " + _in_placeholders(removed)
+                    )
+                    dbc.execute(query, [*params, *removed])
+                if added:
+                    query = "INSERT INTO user_task_offset(user_id, task_id, minutes) VALUES " + ", ".join(["(%s, %s, %s)"] * len(added))
+                    dbc.execute(query, [value for minutes in added for value in (user_id, task_id, minutes)])
+                if expand:
+                    condition = "user_task.user_id = %s AND user_task.task_id = %s AND o.minutes IN " + _in_placeholders(expand)
+                    _expand_reminders(dbc, condition, [*params, *expand], ("user",))
+            dbconn.commit()
+        except Exception:
+            dbconn.rollback()
+            raise
+    if changed:
+        _notify_reminders_changed_for_task(dbconn, task_id)
+    return n_rows != 0
+
+
+def _offsets_diff(stored: list, offsets: list) -> tuple[list, list, list]:
+    """
+    Сравнить сохраненные сроки напоминаний с новыми
+    :param_name stored: сохраненные смещения (в минутах)
+    :param_name offsets: новые смещения
+    :returns: (удаленные смещения, добавленные смещения, смещения, по которым нужно развернуть напоминания:
+    добавленные и наименьшее - напоминание по нему добавляется, даже если его срок уже прошел, см. _expand_reminders)
+    """
+    stored, offsets = set(stored), set(offsets)
+    removed = sorted(stored - offsets)
+    added = sorted(offsets - stored)
+    expand = set(added)
+    if offsets and removed:
+        expand.add(min(offsets))
+    return removed, added, sorted(expand)
 
 
+@timed_query
 def db_task_attach_participant(dbconn, task_id: int, user_id: int):
     """
     (Организатор) Добавить нового исполнителя к задаче
     :param_name task_id: id задачи
     :param_name user_id: id пользователя
     """
-    query = "INSERT INTO user_task(user_id, task_id) VALUES (%s, %s)"
+    query = "INSERT IGNORE INTO user_task(user_id, task_id) VALUES (%s, %s)"
     params = [user_id, task_id]
     with dbconn.cursor() as dbc:
         dbc.execute(query, params)
+        _expand_reminders(dbc, "user_task.user_id = %s AND user_task.task_id = %s", params, ("group",))
+        dbconn.commit()
+    _notify_reminders_changed_for_task(dbconn, task_id)
+
+
+@timed_query
+def db_get_reminder_schedule(dbconn, task_group_id: int | None = None, reminder_ids: list | None = None):
+    """
+    (Система) Моменты отправки (или повторной попытки отправки) еще не разосланных напоминаний.
+    Напоминания получателям, до которых сейчас нельзя достучаться (см. CONDITION_RECIPIENT_UNREACHABLE), в расписание не входят,
+    а для чатов на паузе после временной ошибки момент отправки - не раньше следующей попытки
+    :param_name task_group_id: id группы задач (None - по всем группам)
+    :param_name reminder_ids: id напоминаний (None - все напоминания)
+    """
+    query, params = _query_get_reminder_schedule(task_group_id, reminder_ids)
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        return dbc.fetchall()
+
+
+def _query_get_reminder_schedule(task_group_id: int | None, reminder_ids: list | None = None) -> tuple[str, list]:
+    # Напоминание, захваченное другим экземпляром бота, снова станет доступно не раньше окончания захвата
+    query = (
+        "SELECT reminder.id, task.task_group_id,"
+        " GREATEST(reminder.next_attempt_at, coalesce(reminder.claim_expires_at, '1000-01-01'), coalesce(chat_health.retry_at, '1000-01-01')) as due_at"
+        " FROM reminder INNER JOIN task ON (reminder.task_id = task.id) INNER JOIN user ON (reminder.user_id = user.id)"
+        " LEFT JOIN chat_health ON (chat_health.user_id = reminder.user_id)"
+        " WHERE reminder.state = 'pending' AND user.tg_chatid <> 0 AND (chat_health.state IS NULL OR chat_health.state = 'backoff')"
+    )
+    params = []
+    if task_group_id is not None:
+        query += " AND task.task_group_id = %s"
+        params.append(task_group_id)
+    if reminder_ids is not None:
+        query += " AND reminder.id IN " + _in_placeholders(reminder_ids)
+        params.extend(reminder_ids)
+    return query, params
+
+
+@timed_query
+def db_claim_due_reminders(dbconn, claim_token: str, lease_seconds: int, limit: int) -> int:
+    """
+    (Система) Захватить для отправки до limit напоминаний, срок отправки которых наступил (по диапазону индекса reminder_due).
+    Захватываются только незахваченные строки и строки с истекшим захватом (экземпляр бота, захвативший их, упал),
+    поэтому каждое напоминание достается только одному экземпляру бота.
+    Если наступивших напоминаний больше limit, первыми захватываются напоминания с самым близким дедлайном;
+    напоминания, дедлайн которых уже прошел, не захватываются (см. db_expire_reminders).
+    Напоминания получателям, до которых сейчас нельзя достучаться, не захватываются и не расходуют попытки отправки:
+    они будут отправлены после /start или окончания паузы, либо отброшены по истечении дедлайна
+    :param_name claim_token: уникальная метка этой рассылки
+    :param_name lease_seconds: на сколько секунд захватываются напоминания
+    :param_name limit: наибольшее число захватываемых строк
+    :returns: число захваченных строк
+    """
+    query, params = _query_claim_due_reminders(claim_token, lease_seconds, limit)
+    with dbconn.cursor() as dbc:
+        n_claimed = dbc.execute(query, params)
+        dbconn.commit()
+    return n_claimed
+
+
+@timed_query
+def db_expire_reminders(dbconn) -> int:
+    """
+    (Система) Отбросить неотправленные напоминания, дедлайн которых уже прошел (по диапазону индекса reminder_expiry):
+    такие напоминания больше бесполезны, а их отправка задержала бы более срочные.
+    Напоминания, захваченные другой рассылкой, не затрагиваются - их результат запишет она сама
+    :returns: число отброшенных напоминаний
+    """
+    query, params = _query_expire_reminders()
+    with dbconn.cursor() as dbc:
+        n_expired = dbc.execute(query, params)
+        dbconn.commit()
+    return n_expired
+
+
+def _query_expire_reminders() -> tuple[str, list]:
+    query = (
+        "UPDATE reminder SET state = 'expired', claimed_by = NULL, claim_expires_at = NULL"
+        " WHERE state = 'pending' AND deadline <= now() AND (claim_expires_at IS NULL OR claim_expires_at < now())"
+    )
+    return query, []
+
+
+def _query_claim_due_reminders(claim_token: str, lease_seconds: int, limit: int) -> tuple[str, list]:
+    query = (
+        "UPDATE reminder SET claimed_by = %s, claim_expires_at = now() + INTERVAL %s SECOND"
+        " WHERE state = 'pending' AND next_attempt_at <= now() AND deadline > now()"
+        " AND (claim_expires_at IS NULL OR claim_expires_at < now()) AND NOT " + CONDITION_RECIPIENT_UNREACHABLE +
+        " ORDER BY deadline, next_attempt_at LIMIT %s"
+    )
+    return query, [claim_token, lease_seconds, limit]
+
+
+@timed_query
+def db_get_due_reminders(dbconn, claim_token: str):
+    """
+    (Система) Напоминания, захваченные рассылкой (см. db_claim_due_reminders), вместе со всеми данными для отправки:
+    напоминание (reminder_id, source, attempts), получатель (user_id, tg_nick, tg_chatid),
+    задача (task_id, name, description, deadline), группа (task_group_id, keyname); due_at - момент, когда напоминание должно было быть отправлено;
+    chat_failures - число неудачных отправок подряд в чат получателя (NULL, если последняя отправка удалась)
+    :param_name claim_token: метка рассылки
+    """
+    query, params = _query_get_due_reminders(claim_token)
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        return dbc.fetchall()
+
+
+def _query_get_due_reminders(claim_token: str) -> tuple[str, list]:
+    query = (
+        "SELECT reminder.id as reminder_id, reminder.source, reminder.attempts, reminder.due_at,"
+        " task.id as task_id, user.id as user_id, user.tg_nick, user.tg_chatid, task.name, task.description, task.deadline,"
+        " task.task_group_id, task_group.keyname, chat_health.failures as chat_failures"
+        " FROM reminder INNER JOIN task ON (reminder.task_id = task.id)"
+        " INNER JOIN task_group ON (task.task_group_id = task_group.id) INNER JOIN user ON (reminder.user_id = user.id)"
+        " LEFT JOIN chat_health ON (chat_health.user_id = reminder.user_id)"
+        " WHERE reminder.claimed_by = %s AND reminder.state = 'pending'"
+    )
+    return query, [claim_token]
+
+
+@timed_query
+def db_reminders_ack(
+    dbconn,
+    claim_token: str,
+    sent_ids: list,
+    retry_ids: list,
+    failed_ids: list,
+    retry_delay: int,
+    max_attempts: int,
+    expired_ids: list = (),
+):
+    """
+    (Система) Записать результаты отправки захваченных напоминаний одной транзакцией,
+    по одному UPDATE ... WHERE id IN (...) на каждый исход (и каждые IMPORT_BATCH_SIZE строк)
+    :param_name claim_token: метка рассылки; захват со всех ее напоминаний снимается
+    :param_name sent_ids: id отправленных напоминаний
+    :param_name retry_ids: id напоминаний, отправку которых нужно повторить; после max_attempts попыток напоминание считается неотправленным (failed)
+    :param_name failed_ids: id напоминаний, которые не удастся отправить (например, бот заблокирован получателем)
+    :param_name retry_delay: пауза перед первой повторной попыткой в секундах, каждая следующая пауза вдвое длиннее
+    (со случайным разбросом от половины до полной паузы, чтобы повторы многих напоминаний не совпадали по времени)
+    :param_name max_attempts: наибольшее число попыток отправки
+    :param_name expired_ids: id напоминаний, которые не были отправлены до дедлайна и больше не нужны
+    """
+    with dbconn.cursor() as dbc:
+        try:
+            for query, params in _queries_reminders_ack(
+                claim_token, sent_ids, retry_ids, failed_ids, retry_delay, max_attempts, expired_ids
+            ):
+                dbc.execute(query, params)
+            dbconn.commit()
+        except Exception:
+            dbconn.rollback()
+            raise
+
+
+def _queries_reminders_ack(
+    claim_token: str, sent_ids: list, retry_ids: list, failed_ids: list, retry_delay: int, max_attempts: int, expired_ids: list = ()
+) -> list[tuple[str, list]]:
+    release = "claimed_by = NULL, claim_expires_at = NULL"
+    queries = []
+    for chunk in _chunks(list(sent_ids), IMPORT_BATCH_SIZE):
+        query = "UPDATE reminder SET state = 'sent', sent_at = now(), attempts = attempts + 1, " + release + " WHERE id IN " + _in_placeholders(chunk)
+        queries.append((query, chunk))
+    # state и next_attempt_at вычисляются до увеличения attempts
+    for chunk in _chunks(list(retry_ids), IMPORT_BATCH_SIZE):
+        query = (
+            "UPDATE reminder SET state = IF(attempts + 1 >= %s, 'failed', 'pending'),"
+            " next_attempt_at = now() + INTERVAL (%s * POW(2, attempts) * (0.5 + RAND() / 2)) SECOND, attempts = attempts + 1, "
+            + release + " WHERE id IN " + _in_placeholders(chunk)
+        )
+        queries.append((query, [max_attempts, retry_delay] + chunk))
+    for chunk in _chunks(list(failed_ids), IMPORT_BATCH_SIZE):
+        query = "UPDATE reminder SET state = 'failed', attempts = attempts + 1, " + release + " WHERE id IN " + _in_placeholders(chunk)
+        queries.append((query, chunk))
+    for chunk in _chunks(list(expired_ids), IMPORT_BATCH_SIZE):
+        query = "UPDATE reminder SET state = 'expired', " + release + " WHERE id IN " + _in_placeholders(chunk)
+        queries.append((query, chunk))
+    queries.append(("UPDATE reminder SET " + release + " WHERE claimed_by = %s", [claim_token]))
+    return queries
+
+
+@timed_query
+def db_update_chat_health(
+    dbconn, recovered_ids: list, unreachable: dict, transient: dict, backoff_base: float, backoff_max: float
+):
+    """
+    (Система) Записать результаты доставки в чаты получателей одной транзакцией (см. таблицу chat_health)
+    :param_name recovered_ids: id пользователей, в чаты которых отправка снова удалась (после неудачных попыток)
+    :param_name unreachable: id пользователя -> (состояние blocked или not_found, текст ошибки) для недоступных чатов
+    :param_name transient: id пользователя -> текст ошибки для чатов с временной ошибкой
+    :param_name backoff_base: пауза перед первой повторной попыткой в чат в секундах, каждая следующая пауза вдвое длиннее
+    (со случайным разбросом от половины до полной паузы)
+    :param_name backoff_max: наибольшая пауза в секундах
+    """
+    with dbconn.cursor() as dbc:
+        try:
+            for query, params in _queries_update_chat_health(recovered_ids, unreachable, transient, backoff_base, backoff_max):
+                dbc.execute(query, params)
+            dbconn.commit()
+        except Exception:
+            dbconn.rollback()
+            raise
+
+
+def _queries_update_chat_health(
+    recovered_ids: list, unreachable: dict, transient: dict, backoff_base: float, backoff_max: float
+) -> list[tuple[str, list]]:
+    queries = []
+    for chunk in _chunks(list(recovered_ids), IMPORT_BATCH_SIZE):
+        queries.append(("DELETE FROM chat_health WHERE user_id IN " + _in_placeholders(chunk), chunk))
+    for chunk in _chunks(list(unreachable.items()), IMPORT_BATCH_SIZE):
+        query = (
+            "INSERT INTO chat_health (user_id, state, last_error) VALUES " + ", ".join(["(%s, %s, %s)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE failures = failures + 1, state = VALUES(state), last_error = VALUES(last_error), retry_at = NULL"
+        )
+        queries.append((query, [value for user_id, (state, error) in chunk for value in (user_id, state, error[:255])]))
+    for chunk in _chunks(list(transient.items()), IMPORT_BATCH_SIZE):
+        # retry_at вычисляется до увеличения failures
+        query = (
+            "INSERT INTO chat_health (user_id, state, last_error, retry_at) VALUES "
+            + ", ".join(["(%s, 'backoff', %s, now() + INTERVAL (%s * (0.5 + RAND() / 2)) SECOND)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE retry_at = now() + INTERVAL (LEAST(%s, %s * POW(2, failures)) * (0.5 + RAND() / 2)) SECOND,"
+            " failures = failures + 1, state = 'backoff', last_error = VALUES(last_error)"
+        )
+        params = [value for user_id, error in chunk for value in (user_id, error[:255], backoff_base)]
+        queries.append((query, params + [backoff_max, backoff_base]))
+    return queries
+
+
+def _in_placeholders(values) -> str:
+    return "(" + ", ".join(["%s"] * len(values)) + ")"
+
+
+def _chunks(values: list, size: int):
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+# Сколько строк вставлять одним многострочным INSERT при массовом импорте
+IMPORT_BATCH_SIZE = 500
+
+
+def _import_users(dbc, nicks: list) -> dict:
+    """
+    Добавить в систему пользователей по списку никнеймов (по одному запросу на IMPORT_BATCH_SIZE никнеймов)
+    :returns: словарь никнейм в нижнем регистре -> id пользователя
+    """
+    user_ids = {}
+    for chunk in _chunks(nicks, IMPORT_BATCH_SIZE):
+        query = "INSERT IGNORE INTO user(tg_nick, tg_chatid) VALUES " + ", ".join(["(%s, 0)"] * len(chunk))
+        dbc.execute(query, chunk)
+        query = "SELECT id, tg_nick FROM user WHERE tg_nick IN " + _in_placeholders(chunk)
+        dbc.execute(query, chunk)
+        # Сравнение никнеймов в MySQL не зависит от регистра, поэтому и здесь приводим к нижнему регистру
+        user_ids.update({row["tg_nick"].lower(): row["id"] for row in dbc.fetchall()})
+    return user_ids
+
+
+def _participant_ids(task: dict, user_ids: dict) -> set:
+    return {user_ids[nick.lower()] for nick in task["participants"] if nick.lower() in user_ids}
+
+
+def _insert_tasks(dbc, tasks: list, task_group_id: int, user_ids: dict) -> list:
+    """
+    Вставить задачи многострочными INSERT. Группа должна быть заблокирована (SELECT ... FOR UPDATE)
+    :returns: список пар (user_id, task_id) участников вставленных задач
+    """
+    links = []
+    for chunk in _chunks(tasks, IMPORT_BATCH_SIZE):
+        query = "INSERT INTO task(name, description, deadline, task_group_id) VALUES " + ", ".join(["(%s, %s, %s, %s)"] * len(chunk))
+        params = [
+            value
+            for task in chunk
+            for value in (task["name"], task["description"], task["deadline"], task_group_id)
+        ]
+        dbc.execute(query, params)
+        # Многострочный INSERT получает id по порядку строк; группа заблокирована FOR UPDATE, поэтому
+        # задачи этой группы с id не меньше первого вставленного - ровно строки этого INSERT
+        query = "SELECT id FROM task WHERE task_group_id = %s AND id >= %s ORDER BY id LIMIT %s"
+        dbc.execute(query, [task_group_id, dbc.lastrowid, len(chunk)])
+        task_ids = [row["id"] for row in dbc.fetchall()]
+        for task, task_id in zip(chunk, task_ids):
+            links.extend((user_id, task_id) for user_id in _participant_ids(task, user_ids))
+    return links
+
+
+def _lock_task_group(dbc, task_group_id: int):
+    query = "SELECT id FROM task_group WHERE id = %s FOR UPDATE"
+    if dbc.execute(query, [task_group_id]) == 0:
+        raise ValueError("Не найдена такая группа задач")
+
+
+@timed_query
+def db_import_tasks(dbconn, tasks: list, task_group_id: int, add_mode: bool = True):
+    """
+    (Организатор) Массовый импорт задач в группу одной транзакцией: участники добавляются в систему одним запросом,
+    их id определяются одним запросом по списку никнеймов, задачи и связи задач с участниками вставляются многострочными INSERT
+    :param_name tasks: список из словарей с задачами, participants - список никнеймов в Telegram
+    :param_name task_group_id: id группы задач
+    :param_name add_mode: False - заменить задачи, True - добавить новые задачи
+    :returns: число импортированных задач
+    Никнеймы короче 5 символов (ограничение Telegram) пропускаются.
+    """
+    nicks = sorted({nick for task in tasks for nick in task["participants"] if len(nick) >= 5})
+    try:
+        with dbconn.cursor() as dbc:
+            _lock_task_group(dbc, task_group_id)
+            user_ids = _import_users(dbc, nicks)
+            if not add_mode:
+                query = "DELETE FROM task WHERE task_group_id = %s"
+                dbc.execute(query, [task_group_id])
+            links = _insert_tasks(dbc, tasks, task_group_id, user_ids)
+            for chunk in _chunks(links, IMPORT_BATCH_SIZE):
+                query = "INSERT INTO user_task(user_id, task_id) VALUES " + ", ".join(["(%s, %s)"] * len(chunk))
+                dbc.execute(query, [value for link in chunk for value in link])
+            _expand_reminders(dbc, "task.task_group_id = %s", [task_group_id])
+        dbconn.commit()
+        users_cache.clear()
+        task_groups_cache.clear()
+    except Exception:
+        dbconn.rollback()
+        raise
+    _notify_reminders_changed(dbconn, task_group_id)
+    return len(tasks)
+
+
+def task_import_keys(names: list) -> list:
+    """
+    Ключи сопоставления задач при повторном импорте: пара (название, номер среди задач с тем же названием по порядку)
+    :param_name names: названия задач в порядке строк таблицы (или в порядке id для задач в БД)
+    """
+    seen = {}
+    keys = []
+    for name in names:
+        keys.append((name, seen.get(name, 0)))
+        seen[name] = seen.get(name, 0) + 1
+    return keys
+
+
+def task_sync_plan(tasks: list, existing_rows: list, participants: dict, archived: set, user_ids: dict) -> dict:
+    """
+    Изменения, которые нужно выполнить при повторном импорте задач группы (см. db_sync_tasks)
+    :param_name tasks: задачи из таблицы, participants - список никнеймов в Telegram
+    :param_name existing_rows: задачи группы в БД (id, name, description, deadline) в порядке id
+    :param_name participants: id задачи в БД -> множество id исполнителей
+    :param_name archived: пары (название, дедлайн) задач группы, уже перенесенных в архив
+    :param_name user_ids: никнейм в Telegram -> id пользователя
+    :returns: словарь: new_tasks - задачи для вставки, changed - список (задача из таблицы, id задачи в БД, изменился ли дедлайн),
+    rescheduled_ids - id задач с изменившимся дедлайном, deleted_ids - id задач для удаления,
+    attach и detach - пары (id пользователя, id задачи), unchanged и archived - число неизменных и уже архивных задач
+    """
+    existing = dict(zip(task_import_keys([row["name"] for row in existing_rows]), existing_rows))
+    # Задачи, уже перенесенные в архив, исключаются до сопоставления: в БД их больше нет, и иначе они сдвигали бы
+    # номера следующих задач с тем же названием
+    live_tasks = [task for task in tasks if (task["name"], task["deadline"]) not in archived]
+    new_tasks = []
+    changed = []
+    attach = []
+    detach = []
+    unchanged = 0
+    for key, task in zip(task_import_keys([task["name"] for task in live_tasks]), live_tasks):
+        row = existing.pop(key, None)
+        if row is None:
+            new_tasks.append(task)
+            continue
+        deadline_changed = row["deadline"] != task["deadline"]
+        if deadline_changed or (row["description"] or "") != task["description"]:
+            changed.append((task, row["id"], deadline_changed))
+        else:
+            unchanged += 1
+        wanted = _participant_ids(task, user_ids)
+        current = participants.get(row["id"], set())
+        attach.extend((user_id, row["id"]) for user_id in sorted(wanted - current))
+        detach.extend((user_id, row["id"]) for user_id in sorted(current - wanted))
+    return {
+        "new_tasks": new_tasks,
+        "changed": changed,
+        "rescheduled_ids": [task_id for _, task_id, deadline_changed in changed if deadline_changed],
+        "deleted_ids": [row["id"] for row in existing.values()],
+        "attach": attach,
+        "detach": detach,
+        "unchanged": unchanged,
+        "archived": len(tasks) - len(live_tasks),
+    }
+
+
+@timed_query
+def db_sync_tasks(dbconn, tasks: list, task_group_id: int) -> dict:
+    """
+    (Организатор) Повторный импорт задач группы одной транзакцией: выполняются только нужные изменения.
+    Задачи таблицы, кроме уже перенесенных в архив (то же название и дедлайн), сопоставляются с задачами в БД по названию
+    и номеру среди задач с тем же названием (task_import_keys);
+    новые задачи вставляются, отсутствующие в таблице - удаляются, у изменившихся обновляются описание и дедлайн,
+    участники привязываются и отвязываются по разнице. У неизменных задач сохраняются напоминания и отметки об их отправке;
+    при изменении дедлайна неотправленные напоминания по задаче разворачиваются заново (изменения вычисляет task_sync_plan).
+    :param_name tasks: список из словарей с задачами, participants - список никнеймов в Telegram
+    :param_name task_group_id: id группы задач
+    :returns: словарь с числом задач inserted, updated, deleted, unchanged, archived и связей с участниками attached, detached
+    """
+    nicks = sorted({nick for task in tasks for nick in task["participants"] if len(nick) >= 5})
+    stats = dict.fromkeys(("inserted", "updated", "deleted", "unchanged", "archived", "attached", "detached"), 0)
+    try:
+        with dbconn.cursor() as dbc:
+            _lock_task_group(dbc, task_group_id)
+            user_ids = _import_users(dbc, nicks)
+            query = "SELECT id, name, description, deadline FROM task WHERE task_group_id = %s ORDER BY id"
+            dbc.execute(query, [task_group_id])
+            existing_rows = dbc.fetchall()
+            query = "SELECT user_task.user_id, user_task.task_id FROM user_task INNER JOIN task ON (user_task.task_id = task.id) WHERE task.task_group_id = %s"
+            dbc.execute(query, [task_group_id])
+            participants = {}
+            for row in dbc.fetchall():
+                participants.setdefault(row["task_id"], set()).add(row["user_id"])
+            query = "SELECT name, deadline FROM task_archive WHERE task_group_id = %s"
+            dbc.execute(query, [task_group_id])
+            archived = {(row["name"], row["deadline"]) for row in dbc.fetchall()}
+            plan = task_sync_plan(tasks, existing_rows, participants, archived, user_ids)
+            new_tasks, changed, deleted_ids = plan["new_tasks"], plan["changed"], plan["deleted_ids"]
+            attach, detach = plan["attach"], plan["detach"]
+            stats.update(unchanged=plan["unchanged"], archived=plan["archived"])
+
+            for chunk in _chunks(deleted_ids, IMPORT_BATCH_SIZE):
+                dbc.execute("DELETE FROM task WHERE id IN " + _in_placeholders(chunk), chunk)
+            for task, task_id, deadline_changed in changed:
+                query = "UPDATE task SET description = %s, deadline = %s WHERE id = %s"
+                dbc.execute(query, [task["description"], task["deadline"], task_id])
+            for chunk in _chunks(plan["rescheduled_ids"], IMPORT_BATCH_SIZE):
+                # Напоминания о прежнем дедлайне больше не нужны, о новом - разворачиваются заново
+                dbc.execute("DELETE FROM reminder WHERE state = 'pending' AND task_id IN " + _in_placeholders(chunk), chunk)
+                _expand_reminders(dbc, "task.id IN " + _in_placeholders(chunk), chunk)
+            for chunk in _chunks(detach, IMPORT_BATCH_SIZE):
+                condition, params = _pairs_condition(chunk, "user_task")
+                dbc.execute("DELETE FROM user_task WHERE " + condition, params)
+                condition, params = _pairs_condition(chunk, "reminder")
+                dbc.execute("DELETE FROM reminder WHERE state = 'pending' AND " + condition, params)
+            links = attach + _insert_tasks(dbc, new_tasks, task_group_id, user_ids)
+            for chunk in _chunks(links, IMPORT_BATCH_SIZE):
+                query = "INSERT IGNORE INTO user_task(user_id, task_id) VALUES " + ", ".join(["(%s, %s)"] * len(chunk))
+                dbc.execute(query, [value for link in chunk for value in link])
+                # Новые исполнители получают напоминания по смещениям группы (индивидуальных смещений у них еще нет)
+                _expand_reminders(dbc, *_pairs_condition(chunk), ("group",))
         dbconn.commit()
+        users_cache.clear()
+        task_groups_cache.clear()
+    except Exception:
+        dbconn.rollback()
+        raise
+    stats.update(
+        inserted=len(new_tasks),
+        updated=len(changed),
+        deleted=len(deleted_ids),
+        attached=len(attach),
+        detached=len(detach),
+    )
+    _notify_reminders_changed(dbconn, task_group_id)
+    return stats
+
 
-def db_reminder_mark_as_sent_for_group(dbconn, task_id: int):
-	query = 'UPDATE task SET reminder_sent = true WHERE id = %s'
-	params = [task_id]
-	with dbconn.cursor() as dbc:
-		dbc.execute(query, params)
-		dbconn.commit()
-
-def db_reminder_mark_as_sent_for_user(dbconn, user_id: int, task_id: int):
-	query = 'UPDATE user_task SET reminder_sent = true WHERE user_id = %s AND task_id = %s'
-	params = [user_id, task_id]
-	with dbconn.cursor() as dbc:
-		dbc.execute(query, params)
-		dbconn.commit()
-
-def db_reminder_unmark_as_sent_for_group(dbconn, task_id: int):
-	query = 'UPDATE task SET reminder_sent = false WHERE id = %s'
-	params = [task_id]
-	with dbconn.cursor() as dbc:
-		dbc.execute(query, params)
-		dbconn.commit()
-
-def db_reminder_unmark_as_sent_for_user(dbconn, user_id: int, task_id: int):
-	query = 'UPDATE user_task SET reminder_sent = false WHERE user_id = %s AND task_id = %s'
-	params = [user_id, task_id]
-	with dbconn.cursor() as dbc:
-		dbc.execute(query, params)
-		dbconn.commit()
-
-def db_get_tasks_unnotified_for_groups(dbconn):
-	"""
-	Получить список id задач, по которым уже необходимо оповестить исполнителей о приближающемся дедлайне; интервал напоминания для группы задач, установленный организатором.
-	"""
-	query = 'SELECT t.id as task_id FROM (SELECT task.id, task.deadline, TIMESTAMPDIFF(MINUTE,now(),deadline) as minutes_before_deadline, remind_in_minutes AS group_remind_in_minutes FROM task INNER JOIN task_group ON (task_group_id=task_group.id) WHERE task.reminder_sent = false) t WHERE t.minutes_before_deadline - cast(t.group_remind_in_minutes as signed) < 0;'
-	with dbconn.cursor() as dbc:
-		dbc.execute(query)
-		return dbc.fetchall()
-
-def db_get_tasks_unnotified_for_users(dbconn):
-	"""
-	Получить список id задач, по которым уже необходимо оповестить исполнителей о приближающемся дедлайне; индивидуальный интервал напоминания для задачи, установленный исполнителем.
-	"""
-	query = 'SELECT t.id as task_id FROM (SELECT task.id, task.deadline, TIMESTAMPDIFF(MINUTE,now(),deadline) as minutes_before_deadline, again_remind_in_minutes AS user_remind_in_minutes FROM task INNER JOIN user_task ON (task_id=task.id) WHERE user_task.reminder_sent = false) t WHERE t.minutes_before_deadline - cast(t.user_remind_in_minutes as signed) < 0;'
-	with dbconn.cursor() as dbc:
-		dbc.execute(query)
-		return dbc.fetchall()
+@timed_query
+def db_archive_tasks(dbconn, grace_days: int, limit: int) -> int:
+    """
+    (Система) Перенести в архив одной транзакцией до limit задач, дедлайн которых прошел больше grace_days дней назад.
+    Задачи и их исполнители копируются в task_archive и user_task_archive (с числом отправленных напоминаний),
+    затем удаляются из task; связи с исполнителями, смещения и напоминания удаляются каскадно.
+    Задачи выбираются по индексу task_deadline, поэтому размер транзакции ограничен limit при любом объеме архива
+    :param_name grace_days: сколько дней после дедлайна задача остается в рабочих таблицах
+    :param_name limit: наибольшее число задач за одну транзакцию
+    :returns: число перенесенных задач
+    """
+    try:
+        with dbconn.cursor() as dbc:
+            query = "SELECT id FROM task WHERE deadline < now() - INTERVAL %s DAY ORDER BY deadline LIMIT %s FOR UPDATE"
+            dbc.execute(query, [grace_days, limit])
+            task_ids = [row["id"] for row in dbc.fetchall()]
+            if task_ids:
+                condition = "IN " + _in_placeholders(task_ids)
+                dbc.execute(
+                    "INSERT INTO task_archive (id, name, description, deadline, task_group_id) "
+                    "SELECT id, name, description, deadline, task_group_id FROM task WHERE id " + condition,
+                    task_ids,
+                )
+                dbc.execute(
+                    "INSERT INTO user_task_archive (user_id, task_id, reminders_sent) "
+                    "SELECT user_id, task_id, (SELECT count(*) FROM reminder WHERE reminder.task_id = user_task.task_id "
+                    "AND reminder.user_id = user_task.user_id AND reminder.state = 'sent') "
+                    "FROM user_task WHERE task_id " + condition,
+                    task_ids,
+                )
+                dbc.execute("DELETE FROM task WHERE id " + condition, task_ids)
+        dbconn.commit()
+    except Exception:
+        dbconn.rollback()
+        raise
+    if task_ids:
+        task_groups_cache.clear()
+    return len(task_ids)
+
+
+@timed_query
+def db_get_task_group_history(dbconn, task_group_id: int, limit: int = 20):
+    """
+    (Организатор) Последние по дедлайну задачи группы из архива с числом исполнителей и отправленных им напоминаний
+    :param_name task_group_id: id группы задач
+    :param_name limit: наибольшее число задач
+    """
+    query, params = _query_get_task_group_history(task_group_id, limit)
+    with dbconn.cursor() as dbc:
+        dbc.execute(query, params)
+        return dbc.fetchall()
+
+
+def _query_get_task_group_history(task_group_id: int, limit: int) -> tuple[str, list]:
+    query = (
+        "SELECT task_archive.id, task_archive.name, task_archive.description, task_archive.deadline, task_archive.archived_at, "
+        "count(user_task_archive.user_id) AS n_participants, coalesce(sum(user_task_archive.reminders_sent), 0) AS n_reminders_sent "
+        "FROM task_archive LEFT JOIN user_task_archive ON (user_task_archive.task_id = task_archive.id) "
+        "WHERE task_archive.task_group_id = %s GROUP BY task_archive.id ORDER BY task_archive.deadline DESC LIMIT %s"
+    )
+    return query, [task_group_id, limit]
@@ -0,0 +1,338 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import telebot
+
+from metrics import registry
+
+messages_total = registry.counter(
+    "telegram_messages_total", "Сообщения, отправленные через Bot API, по результату", ("outcome",)
+)
+rate_limited_total = registry.counter("telegram_rate_limited_total", "Ответы 429 (Too Many Requests) от Bot API")
+retries_total = registry.counter("telegram_retries_total", "Повторные попытки отправки сообщений")
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов ("ведро с токенами").
+    Токены восполняются со скоростью rate в секунду, в ведро помещается не более capacity токенов.
+    Если токенов нет, acquire резервирует следующий токен и ждет его появления, поэтому очередность запросов сохраняется.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, clock=time.monotonic):
+        """
+        :param_name rate: сколько токенов восполняется в секунду
+        :param_name capacity: наибольшее число токенов (по умолчанию rate)
+        :param_name clock: источник монотонного времени в секундах
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def block(self, seconds: float):
+        """
+        Приостановить выдачу токенов (например, по ответу 429 от Telegram)
+        :param_name seconds: на сколько секунд
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+    def reserve(self) -> float:
+        """
+        Зарезервировать токен
+        :returns: сколько секунд нужно подождать до его появления
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(-self._tokens / self.rate, self._blocked_until - now, 0.0)
+
+    def acquire(self):
+        """
+        Получить токен, при необходимости дождавшись его
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Получить токен, при необходимости дождавшись его без блокировки цикла событий
+        """
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class PerChatLimiter:
+    """
+    Ограничитель частоты сообщений в один чат: не чаще одного сообщения за interval секунд
+    """
+
+    def __init__(self, interval: float, clock=time.monotonic):
+        """
+        :param_name interval: минимальный интервал между сообщениями в один чат в секундах
+        :param_name clock: источник монотонного времени в секундах
+        """
+        self.interval = interval
+        self._clock = clock
+        self._next_slot = {}  # chat_id -> момент (по clock), с которого можно писать в чат
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id: int) -> float:
+        """
+        Занять очередь на отправку сообщения в чат
+        :param_name chat_id: id чата в Telegram
+        :returns: сколько секунд нужно подождать до своей очереди
+        """
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot.get(chat_id, now))
+            self._next_slot[chat_id] = slot + self.interval
+            if len(self._next_slot) > 10000:
+                # Чаты, в которые уже можно писать без ожидания, больше не нужно помнить
+                self._next_slot = {
+                    chat: moment for chat, moment in self._next_slot.items() if moment > now
+                }
+        return slot - now
+
+    def acquire(self, chat_id: int):
+        """
+        Дождаться своей очереди на отправку сообщения в чат
+        :param_name chat_id: id чата в Telegram
+        """
+        wait = self.reserve(chat_id)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, chat_id: int):
+        """
+        Дождаться своей очереди на отправку сообщения в чат без блокировки цикла событий
+        :param_name chat_id: id чата в Telegram
+        """
+        wait = self.reserve(chat_id)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class DeliveryPipeline:
+    """
+    Параллельная отправка сообщений в Telegram с соблюдением ограничений Bot API:
+    общий лимит около 30 сообщений в секунду и не чаще 1 сообщения в секунду в один чат.
+    При ответе 429 выдерживает паузу retry_after, при сетевых ошибках и ошибках сервера повторяет отправку с нарастающей паузой.
+    """
+
+    def __init__(
+        self,
+        bot: telebot.TeleBot,
+        workers: int = 8,
+        global_rate: float = 30,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 0.5,
+    ):
+        """
+        :param_name bot: бот, через которого отправляются сообщения
+        :param_name workers: число потоков отправки (0 - без потоков, для AsyncDeliveryPipeline)
+        :param_name global_rate: общий лимит сообщений в секунду
+        :param_name per_chat_interval: минимальный интервал между сообщениями в один чат в секундах
+        :param_name max_attempts: максимальное число попыток отправки одного сообщения
+        :param_name backoff_base: начальная пауза перед повторной попыткой в секундах
+        """
+        self.bot = bot
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.global_limiter = TokenBucket(global_rate)
+        self.chat_limiter = PerChatLimiter(per_chat_interval)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="delivery") if workers else None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "sent": 0,
+            "failed": 0,
+            "expired": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "busy_seconds": 0.0,
+            "last_batch_size": 0,
+            "last_batch_seconds": 0.0,
+        }
+
+    def _count(self, key: str, value: float = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _send_one(self, item: dict) -> dict:
+        """
+        Отправить одно сообщение с повторными попытками
+        :returns: item, дополненный полями ok (bool), error (исключение или None), sent_at (момент отправки или None)
+        и expired (сообщение не отправлено, потому что наступил срок expires_at)
+        """
+        error = None
+        for attempt in range(self.max_attempts):
+            self.chat_limiter.acquire(item["chat_id"])
+            self.global_limiter.acquire()
+            if self._expired(item):
+                return self._expired_result(item)
+            try:
+                self.bot.send_message(item["chat_id"], item["text"])
+                self._count("sent")
+                messages_total.inc(outcome="sent")
+                return {**item, "ok": True, "error": None, "sent_at": time.time(), "expired": False}
+            except telebot.apihelper.ApiTelegramException as e:
+                error = e
+                if e.error_code == 429:
+                    retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                    self._count("rate_limited")
+                    rate_limited_total.inc()
+                    # Лимит превышен для всего бота - приостанавливаем все потоки отправки
+                    self.global_limiter.block(retry_after)
+                    time.sleep(retry_after)
+                elif e.error_code < 500:
+                    break
+                else:
+                    time.sleep(self._backoff(attempt))
+            except requests.exceptions.RequestException as e:
+                error = e
+                time.sleep(self._backoff(attempt))
+            self._count("retries")
+            retries_total.inc()
+        self._count("failed")
+        messages_total.inc(outcome="failed")
+        return {**item, "ok": False, "error": error, "sent_at": None, "expired": False}
+
+    def _expired(self, item: dict) -> bool:
+        # Пока сообщение ждало очереди на отправку, его срок мог пройти - тогда отправлять его уже бесполезно
+        return item.get("expires_at") is not None and time.time() >= item["expires_at"]
+
+    def _expired_result(self, item: dict) -> dict:
+        self._count("expired")
+        messages_total.inc(outcome="expired")
+        return {**item, "ok": False, "error": None, "sent_at": None, "expired": True}
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2**attempt) * random.uniform(0.5, 1.5)
+
+    def send_batch(self, items: list[dict]) -> list[dict]:
+        """
+        Отправить пачку сообщений и дождаться окончания отправки
+        :param_name items: словари с ключами chat_id, text и необязательным expires_at (time.time(), после которого сообщение
+        не отправляется); остальные ключи возвращаются без изменений. Сообщения начинают отправляться в порядке списка
+        :returns: список items, дополненных полями ok, error, sent_at (момент отправки, time.time()) и expired, в исходном порядке
+        """
+        started = time.monotonic()
+        results = list(self._executor.map(self._send_one, items))
+        self._record_batch(len(items), time.monotonic() - started)
+        return results
+
+    def _record_batch(self, size: int, elapsed: float):
+        with self._stats_lock:
+            self._stats["busy_seconds"] += elapsed
+            self._stats["last_batch_size"] = size
+            self._stats["last_batch_seconds"] = elapsed
+
+    def stats(self) -> dict:
+        """
+        Счетчики отправки и пропускная способность (сообщений в секунду) за последнюю пачку и за все время
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["last_batch_throughput"] = (
+            stats["last_batch_size"] / stats["last_batch_seconds"] if stats["last_batch_seconds"] else 0.0
+        )
+        stats["throughput"] = stats["sent"] / stats["busy_seconds"] if stats["busy_seconds"] else 0.0
+        return stats
+
+    def shutdown(self):
+        """
+        Остановить потоки отправки
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class AsyncDeliveryPipeline(DeliveryPipeline):
+    """
+    Вариант DeliveryPipeline для режима asyncio: сообщения отправляются через AsyncTeleBot задачами цикла событий,
+    а не потоками; одновременно выполняется не более concurrency запросов к Bot API. Лимиты и повторы те же
+    """
+
+    def __init__(
+        self,
+        bot: "telebot.async_telebot.AsyncTeleBot",
+        concurrency: int = 64,
+        global_rate: float = 30,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 0.5,
+    ):
+        """
+        :param_name bot: асинхронный бот, через которого отправляются сообщения
+        :param_name concurrency: наибольшее число одновременных запросов к Bot API
+        (остальные параметры - как у DeliveryPipeline)
+        """
+        super().__init__(bot, 0, global_rate, per_chat_interval, max_attempts, backoff_base)
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    async def _send_one_async(self, item: dict) -> dict:
+        """
+        Отправить одно сообщение с повторными попытками (см. DeliveryPipeline._send_one)
+        """
+        # aiohttp и асинхронный telebot загружаются только в режиме asyncio
+        import aiohttp
+        from telebot import asyncio_helper
+
+        error = None
+        for attempt in range(self.max_attempts):
+            await self.chat_limiter.acquire_async(item["chat_id"])
+            await self.global_limiter.acquire_async()
+            if self._expired(item):
+                return self._expired_result(item)
+            try:
+                async with self._semaphore:
+                    await self.bot.send_message(item["chat_id"], item["text"])
+                self._count("sent")
+                messages_total.inc(outcome="sent")
+                return {**item, "ok": True, "error": None, "sent_at": time.time(), "expired": False}
+            except asyncio_helper.ApiTelegramException as e:
+                error = e
+                if e.error_code == 429:
+                    retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                    self._count("rate_limited")
+                    rate_limited_total.inc()
+                    self.global_limiter.block(retry_after)
+                    await asyncio.sleep(retry_after)
+                elif e.error_code < 500:
+                    break
+                else:
+                    await asyncio.sleep(self._backoff(attempt))
+            except (aiohttp.ClientError, asyncio.TimeoutError, asyncio_helper.RequestTimeout) as e:
+                error = e
+                await asyncio.sleep(self._backoff(attempt))
+            self._count("retries")
+            retries_total.inc()
+        self._count("failed")
+        messages_total.inc(outcome="failed")
+        return {**item, "ok": False, "error": error, "sent_at": None, "expired": False}
+
+    async def send_batch(self, items: list[dict]) -> list[dict]:
+        """
+        Отправить пачку сообщений и дождаться окончания отправки (см. DeliveryPipeline.send_batch)
+        """
+        if self._semaphore is None:
+            # Семафор создается в цикле событий, в котором работает рассылка
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._send_one_async(item) for item in items))
+        self._record_batch(len(items), time.monotonic() - started)
+        return list(results)
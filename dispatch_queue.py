@@ -0,0 +1,54 @@
+import heapq
+from datetime import datetime
+
+# Ширина окна срочности в секундах: сообщения, дедлайны которых попадают в одно окно, считаются одинаково срочными
+FAIRNESS_WINDOW = 5 * 60
+
+
+class DispatchQueue:
+    """
+    Очередь сообщений с напоминаниями, упорядоченная по срочности: первыми отправляются сообщения о самых близких дедлайнах,
+    поэтому при упоре в лимиты Telegram задерживаются наименее срочные напоминания.
+    Внутри одного окна срочности (fairness_window секунд) группы задач чередуются: большое мероприятие
+    не откладывает напоминания других мероприятий с почти теми же дедлайнами.
+    Напоминания с прошедшим дедлайном отбрасываются до составления сообщений (см. ReminderDispatcher._prepare)
+    """
+
+    def __init__(self, fairness_window: float = FAIRNESS_WINDOW):
+        """
+        :param_name fairness_window: ширина окна срочности в секундах
+        """
+        self.fairness_window = fairness_window
+
+    @staticmethod
+    def deadline(item: dict) -> datetime:
+        """
+        Дедлайн сообщения - самый близкий из дедлайнов вошедших в него напоминаний
+        """
+        return min(reminder["deadline"] for reminder in item["reminders"])
+
+    @staticmethod
+    def expires_at(item: dict) -> datetime:
+        """
+        Момент, после которого сообщение отправлять бесполезно - самый поздний из дедлайнов вошедших в него напоминаний
+        """
+        return max(reminder["deadline"] for reminder in item["reminders"])
+
+    def order(self, items: list[dict], now: datetime | None = None) -> list[dict]:
+        """
+        Упорядочить сообщения для отправки
+        :param_name items: сообщения с ключом reminders (строки из db_get_due_reminders с полями deadline и task_group_id)
+        :param_name now: текущий момент (по умолчанию datetime.now())
+        :returns: сообщения в порядке отправки
+        """
+        now = now or datetime.now()
+        heap = []
+        turns = {}  # (окно срочности, id группы задач) -> сколько сообщений группы уже стоит в этом окне
+        for seq, item in enumerate(sorted(items, key=self.deadline)):
+            deadline = self.deadline(item)
+            window = max(0, int((deadline - now).total_seconds() // self.fairness_window))
+            group = min(item["reminders"], key=lambda reminder: reminder["deadline"])["task_group_id"]
+            turn = turns.get((window, group), 0)
+            turns[(window, group)] = turn + 1
+            heapq.heappush(heap, (window, turn, deadline, seq, item))
+        return [heapq.heappop(heap)[-1] for _ in range(len(heap))]
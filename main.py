@@ -1,61 +1,61 @@
-import telebot
-from config import load_configuration
-from commands import bot
+import sys
+from commands import bot, db_pool, settings
 from threading import Thread
-import time
 from db_interact import *
+from scheduler import reminder_scheduler
+from migrate import db_apply_migrations
+from webhook import WebhookServer
+from delivery import DeliveryPipeline
+from notifier import ReminderDispatcher
+from archive import TaskArchiver
+from metrics import start_metrics_server
 
-def get_message_text(db_conn, task_id: int) -> str:
-    """
-    Получить текст напоминания для конкретной задачи
-    :param_name task_id: id задачи
-    """
-    # Получаем задачу по ее id
-    task = db_get_task_by_id(db_conn, task_id)
-    # Формируем текст сообщения
-    message_text = (
-        f"❗Приближается дедлайн задачи \"{task['name']}\" по \"{task['keyname']}\"❗\n\n"
-        f"📆 {task['deadline']}\n\n"
-        f"Описание задачи: {task['description']}"
-    )
-    return message_text
+# Параллельная отправка сообщений с учетом лимитов Telegram (около 30 сообщ./с всего и 1 сообщ./с в один чат)
+delivery = DeliveryPipeline(bot, workers=8, global_rate=30, per_chat_interval=1.0)
+dispatcher = ReminderDispatcher(db_pool, delivery, reminder_scheduler)
+archiver = TaskArchiver(db_pool, settings.archive_grace_days, settings.archive_batch_size, settings.archive_interval)
 
 
-def send_notifications():
-    """
-    Отправить напоминания о задачах участникам, подписанным на них. Проверка необходимости отправки осуществляется 2 раза в минуту
-    """
-    db_conn = db_connect("./dbconfig.ini")
-    while True:
-        time.sleep(30)  # Пауза между проверками уведомлений в секундах
-        # Рассылка напоминаний, установленных организаторами
-        db_disconnect(db_conn)
-        db_conn = db_connect("./dbconfig.ini")
-        tasks = db_get_tasks_unnotified_for_groups(db_conn)
-        if not tasks:
-            continue
-        tasks_receivers = []
-        for task in tasks:
-            users = db_get_task_participants(db_conn, task['task_id'])
-            for user in users:
-                tasks_receivers.append({'user': user, 'task_id': task['task_id']})
-        # Рассылка напоминаний, установленных участниками
-        notification_info = db_get_tasks_unnotified_for_users(db_conn)
-        for info in notification_info:
-            user_id = info['user_id']
-            task_id = info['task_id']
-            tasks_receivers.append({'user': db_get_user(db_conn, user_id), 'task_id': task_id})
-        for notificaton in tasks_receivers:
-            try:
-                bot.send_message(notificaton['user']['tg_chatid'], get_message_text(db_conn, notificaton['task_id']))
-                db_reminder_mark_as_sent_for_group(db_conn, notificaton['task_id'])
-            except telebot.apihelper.ApiException as e:
-                print(
-                    f"Не удалось отправить сообщение пользователю {notificaton['user']['tg_nick']}, возможно он не начинал диалог с ботом: {str(e)}"
-                )
+if __name__ == "__main__":
+    # Приводим схему БД к версии, которую ожидает код (см. каталог migrations)
+    with db_pool.connection() as db_conn:
+        for migration_name in db_apply_migrations(db_conn):
+            print("Применена миграция БД:", migration_name)
+    if settings.metrics_enabled:
+        start_metrics_server(settings.metrics_listen, settings.metrics_port)
+        print(f"Метрики доступны по адресу http://{settings.metrics_listen}:{settings.metrics_port}/metrics")
+    if settings.archive_enabled:
+        # Перенос в архив работает в обоих режимах через синхронный пул; поток-демон не задерживает выход из процесса
+        Thread(target=archiver.run, daemon=True).start()
 
+    if settings.runtime_mode == "asyncio":
+        # Режим asyncio: обработчики команд и рассылка работают в одном цикле событий (см. async_bot.py)
+        if settings.webhook_enabled:
+            print("Режим asyncio поддерживает только long polling: выключите [Webhook] enabled.")
+            sys.exit(1)
+        import asyncio
+        from async_bot import main as async_main
 
-notification_thread = Thread(target=send_notifications)
-notification_thread.start()
+        asyncio.run(async_main())
+        sys.exit(0)
 
-bot.polling(none_stop=True)
+    reminder_listeners.append(dispatcher.refresh_group_schedule)
+    notification_thread = Thread(target=dispatcher.run)
+    notification_thread.start()
+
+    if settings.webhook_enabled:
+        # Режим webhook: Telegram сам присылает обновления на встроенный HTTP-сервер
+        webhook_server = WebhookServer(
+            bot,
+            settings.webhook_listen,
+            settings.webhook_port,
+            settings.webhook_secret,
+            settings.webhook_path,
+            settings.webhook_workers,
+            settings.webhook_queue_size,
+        )
+        bot.remove_webhook()
+        bot.set_webhook(url=settings.webhook_url, secret_token=settings.webhook_secret or None)
+        webhook_server.serve_forever()
+    else:
+        bot.polling(none_stop=True)
@@ -0,0 +1,107 @@
+import os
+import re
+import sys
+
+from db_interact import db_connect, db_disconnect
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Имя блокировки MySQL, чтобы миграции не применялись одновременно несколькими экземплярами бота
+MIGRATION_LOCK_NAME = "notificationbot_migrate"
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_.+\.sql$")
+
+
+def list_migrations(migrations_dir: str = MIGRATIONS_DIR) -> list[tuple[int, str]]:
+    """
+    Список файлов миграций схемы БД по возрастанию версии
+    :param_name migrations_dir: каталог с файлами вида 0001_описание.sql
+    :returns: список пар (версия, имя файла)
+    """
+    migrations = []
+    for file_name in os.listdir(migrations_dir):
+        match = MIGRATION_FILE_RE.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), file_name))
+    return sorted(migrations)
+
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Разбить SQL-сценарий на отдельные запросы. Запрос заканчивается точкой с запятой в конце строки,
+    строки-комментарии (начинающиеся с --) отбрасываются
+    """
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        if line.strip().startswith("--") or not line.strip():
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+
+def db_get_schema_version(dbconn) -> int:
+    """
+    Текущая версия схемы БД (0 - миграции еще не применялись)
+    """
+    with dbconn.cursor() as dbc:
+        dbc.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migration ("
+            "version int(11) NOT NULL PRIMARY KEY, "
+            "name varchar(128) NOT NULL, "
+            "applied_at datetime NOT NULL DEFAULT current_timestamp()"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        )
+        dbc.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_migration")
+        version = dbc.fetchone()["version"]
+    dbconn.commit()
+    return version
+
+
+def db_apply_migrations(dbconn, migrations_dir: str = MIGRATIONS_DIR) -> list[str]:
+    """
+    Применить к БД все миграции, версия которых выше текущей версии схемы
+    :returns: имена примененных файлов миграций
+    Изменения структуры таблиц в MySQL не откатываются транзакцией, поэтому при ошибке миграция
+    не отмечается примененной и требует ручного исправления БД.
+    """
+    applied = []
+    with dbconn.cursor() as dbc:
+        dbc.execute("SELECT GET_LOCK(%s, 60) AS locked", [MIGRATION_LOCK_NAME])
+        if not dbc.fetchone()["locked"]:
+            raise RuntimeError("Не удалось получить блокировку для применения миграций")
+    try:
+        version = db_get_schema_version(dbconn)
+        for migration_version, file_name in list_migrations(migrations_dir):
+            if migration_version <= version:
+                continue
+            with open(os.path.join(migrations_dir, file_name), encoding="utf-8") as f:
+                statements = split_statements(f.read())
+            with dbconn.cursor() as dbc:
+                for statement in statements:
+                    dbc.execute(statement)
+                dbc.execute(
+                    "INSERT INTO schema_migration(version, name) VALUES (%s, %s)",
+                    [migration_version, file_name],
+                )
+            dbconn.commit()
+            applied.append(file_name)
+    finally:
+        with dbconn.cursor() as dbc:
+            dbc.execute("SELECT RELEASE_LOCK(%s)", [MIGRATION_LOCK_NAME])
+    return applied
+
+
+if __name__ == "__main__":
+    # Использование: python migrate.py [путь к dbconfig.ini]
+    config_path = sys.argv[1] if len(sys.argv) > 1 else "./dbconfig.ini"
+    db_conn = db_connect(config_path)
+    try:
+        for name in db_apply_migrations(db_conn):
+            print("Применена миграция", name)
+        print("Версия схемы БД:", db_get_schema_version(db_conn))
+    finally:
+        db_disconnect(db_conn)
@@ -0,0 +1,25 @@
+-- Индексы для выборки напоминаний, срок отправки которых наступил
+
+-- Напоминания организатора: для каждой группы просматриваются только неотправленные задачи в порядке дедлайна
+ALTER TABLE `task` ADD KEY `task_group_reminder` (`task_group_id`, `reminder_sent`, `deadline`);
+
+-- Индивидуальные напоминания: момент отправки хранится в строке, чтобы выборка шла по диапазону индекса
+ALTER TABLE `user_task` ADD COLUMN `remind_at` datetime DEFAULT NULL;
+UPDATE `user_task` INNER JOIN `task` ON (`user_task`.`task_id` = `task`.`id`)
+  SET `user_task`.`remind_at` = `task`.`deadline` - INTERVAL `user_task`.`again_remind_in_minutes` MINUTE
+  WHERE `user_task`.`again_remind_in_minutes` IS NOT NULL;
+ALTER TABLE `user_task` ADD KEY `reminder_due` (`reminder_sent`, `remind_at`);
+
+-- Первичный ключ user_task: перед его созданием убираем повторные назначения одной задачи одному пользователю
+CREATE TEMPORARY TABLE `user_task_dedup` AS
+  SELECT `user_id`, `task_id`, MIN(`again_remind_in_minutes`) AS `again_remind_in_minutes`,
+    MAX(`reminder_sent`) AS `reminder_sent`, MIN(`remind_at`) AS `remind_at`
+  FROM `user_task` GROUP BY `user_id`, `task_id` HAVING COUNT(*) > 1;
+DELETE `user_task` FROM `user_task` INNER JOIN `user_task_dedup` USING (`user_id`, `task_id`);
+INSERT INTO `user_task` (`user_id`, `task_id`, `again_remind_in_minutes`, `reminder_sent`, `remind_at`)
+  SELECT `user_id`, `task_id`, `again_remind_in_minutes`, `reminder_sent`, `remind_at` FROM `user_task_dedup`;
+DROP TEMPORARY TABLE `user_task_dedup`;
+ALTER TABLE `user_task` ADD PRIMARY KEY (`user_id`, `task_id`), DROP KEY `user_id`;
+
+-- Поиск пользователя по id чата в Telegram
+ALTER TABLE `user` ADD KEY `tg_chatid` (`tg_chatid`);
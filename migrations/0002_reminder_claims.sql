@@ -0,0 +1,10 @@
+-- Аренда (lease) напоминаний экземпляром бота на время рассылки, чтобы несколько экземпляров не отправляли одно напоминание дважды.
+-- claimed_by - метка рассылки, захватившей строку; claim_expires_at - момент, после которого захват считается брошенным
+
+-- Напоминания организатора: захватывается задача целиком (вместе со всеми ее участниками)
+ALTER TABLE `task` ADD COLUMN `claimed_by` varchar(64) DEFAULT NULL, ADD COLUMN `claim_expires_at` datetime DEFAULT NULL,
+  ADD KEY `claimed_by` (`claimed_by`);
+
+-- Индивидуальные напоминания исполнителей
+ALTER TABLE `user_task` ADD COLUMN `claimed_by` varchar(64) DEFAULT NULL, ADD COLUMN `claim_expires_at` datetime DEFAULT NULL,
+  ADD KEY `claimed_by` (`claimed_by`);
@@ -0,0 +1,30 @@
+-- Очередь отправки напоминаний (outbox): одна строка на каждое напоминание каждому получателю.
+-- Наступившие напоминания организатора (по всем участникам задачи) и индивидуальные напоминания переносятся в очередь,
+-- после чего отправка, повторные попытки и отметки об отправке ведутся только по ней.
+
+-- Захват напоминаний переносится из task и user_task в очередь
+ALTER TABLE `task` DROP KEY `claimed_by`, DROP COLUMN `claimed_by`, DROP COLUMN `claim_expires_at`;
+ALTER TABLE `user_task` DROP KEY `claimed_by`, DROP COLUMN `claimed_by`, DROP COLUMN `claim_expires_at`;
+
+-- source: group - напоминание организатора для группы задач, user - индивидуальное напоминание исполнителя;
+-- due_at - срок напоминания; next_attempt_at - момент следующей попытки отправки
+CREATE TABLE `reminder_outbox` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `task_id` int(11) NOT NULL,
+  `user_id` int(11) NOT NULL,
+  `source` enum('group','user') NOT NULL,
+  `due_at` datetime NOT NULL,
+  `state` enum('pending','sent','failed') NOT NULL DEFAULT 'pending',
+  `attempts` int(10) unsigned NOT NULL DEFAULT 0,
+  `next_attempt_at` datetime NOT NULL,
+  `claimed_by` varchar(64) DEFAULT NULL,
+  `claim_expires_at` datetime DEFAULT NULL,
+  `sent_at` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `reminder` (`task_id`, `user_id`, `source`, `due_at`),
+  KEY `outbox_due` (`state`, `next_attempt_at`),
+  KEY `claimed_by` (`claimed_by`),
+  KEY `user_id` (`user_id`),
+  CONSTRAINT `reminder_outbox_ibfk_1` FOREIGN KEY (`task_id`) REFERENCES `task` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `reminder_outbox_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,44 @@
+-- Несколько напоминаний о задаче: списки смещений (за сколько минут до дедлайна) для группы задач и для исполнителя.
+-- Смещения разворачиваются в строки таблицы reminder (бывшая очередь отправки reminder_outbox) при записи задач и смещений,
+-- поэтому рассылка только просматривает диапазон индекса reminder_due.
+
+CREATE TABLE `task_group_offset` (
+  `task_group_id` int(11) NOT NULL,
+  `minutes` int(10) unsigned NOT NULL,
+  PRIMARY KEY (`task_group_id`, `minutes`),
+  CONSTRAINT `task_group_offset_ibfk_1` FOREIGN KEY (`task_group_id`) REFERENCES `task_group` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `check_offset_minutes` CHECK (`minutes` >= 1)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+INSERT INTO `task_group_offset` (`task_group_id`, `minutes`) SELECT `id`, `remind_in_minutes` FROM `task_group`;
+
+CREATE TABLE `user_task_offset` (
+  `user_id` int(11) NOT NULL,
+  `task_id` int(11) NOT NULL,
+  `minutes` int(10) unsigned NOT NULL,
+  PRIMARY KEY (`user_id`, `task_id`, `minutes`),
+  KEY `task_id` (`task_id`),
+  CONSTRAINT `user_task_offset_ibfk_1` FOREIGN KEY (`user_id`, `task_id`) REFERENCES `user_task` (`user_id`, `task_id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `check_user_offset_minutes` CHECK (`minutes` >= 1)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+INSERT INTO `user_task_offset` (`user_id`, `task_id`, `minutes`)
+  SELECT `user_id`, `task_id`, `again_remind_in_minutes` FROM `user_task` WHERE `again_remind_in_minutes` IS NOT NULL;
+
+RENAME TABLE `reminder_outbox` TO `reminder`;
+ALTER TABLE `reminder` DROP KEY `outbox_due`, ADD KEY `reminder_due` (`state`, `next_attempt_at`);
+
+-- Напоминания, еще не перенесенные в очередь отправки
+INSERT IGNORE INTO `reminder` (`task_id`, `user_id`, `source`, `due_at`, `next_attempt_at`)
+  SELECT `task`.`id`, `user_task`.`user_id`, 'group', `task`.`deadline` - INTERVAL `task_group`.`remind_in_minutes` MINUTE,
+    `task`.`deadline` - INTERVAL `task_group`.`remind_in_minutes` MINUTE
+  FROM `task` INNER JOIN `task_group` ON (`task`.`task_group_id` = `task_group`.`id`)
+    INNER JOIN `user_task` ON (`user_task`.`task_id` = `task`.`id`)
+  WHERE `task`.`reminder_sent` = false AND `task`.`deadline` > now();
+INSERT IGNORE INTO `reminder` (`task_id`, `user_id`, `source`, `due_at`, `next_attempt_at`)
+  SELECT `task_id`, `user_id`, 'user', `remind_at`, `remind_at` FROM `user_task`
+  WHERE `reminder_sent` = false AND `remind_at` IS NOT NULL;
+
+-- Отметки и сроки напоминаний теперь хранятся только в reminder. Столбец user_task.again_remind_in_minutes
+-- больше не используется, но оставлен: на нем ограничение CHECK, а синтаксис его удаления в MySQL и MariaDB различается
+ALTER TABLE `task` DROP KEY `task_group_reminder`, DROP COLUMN `reminder_sent`;
+ALTER TABLE `user_task` DROP KEY `reminder_due`, DROP COLUMN `reminder_sent`, DROP COLUMN `remind_at`;
+ALTER TABLE `task_group` DROP COLUMN `remind_in_minutes`;
@@ -0,0 +1,8 @@
+-- Дедлайн задачи копируется в строку напоминания: по нему наступившие напоминания захватываются в порядке срочности,
+-- а напоминания, дедлайн которых уже прошел, отбрасываются (state = 'expired') вместо отправки.
+-- При переносе дедлайна ожидающие напоминания задачи удаляются и разворачиваются заново, поэтому копия не расходится с task.deadline
+
+ALTER TABLE `reminder` ADD COLUMN `deadline` datetime DEFAULT NULL AFTER `due_at`,
+  MODIFY `state` enum('pending','sent','failed','expired') NOT NULL DEFAULT 'pending';
+UPDATE `reminder` INNER JOIN `task` ON (`reminder`.`task_id` = `task`.`id`) SET `reminder`.`deadline` = `task`.`deadline`;
+ALTER TABLE `reminder` MODIFY `deadline` datetime NOT NULL, ADD KEY `reminder_expiry` (`state`, `deadline`);
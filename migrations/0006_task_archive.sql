@@ -0,0 +1,30 @@
+-- Архив задач: задачи, дедлайн которых прошел больше срока хранения назад, переносятся фоновым заданием (archive.py)
+-- из task и user_task в task_archive и user_task_archive. Строки напоминаний таких задач удаляются каскадно,
+-- а число отправленных напоминаний сохраняется в user_task_archive. Так рабочие таблицы содержат только актуальные
+-- задачи, и выборки по ним не замедляются с накоплением прошедших мероприятий.
+-- Секционирование task по дедлайну не подходит: секционированные таблицы InnoDB не поддерживают внешние ключи
+
+-- Выборка задач для переноса в архив по диапазону дедлайна
+ALTER TABLE `task` ADD KEY `task_deadline` (`deadline`);
+
+CREATE TABLE `task_archive` (
+  `id` int(11) NOT NULL,
+  `name` varchar(48) NOT NULL,
+  `description` text DEFAULT NULL,
+  `deadline` datetime NOT NULL,
+  `task_group_id` int(11) NOT NULL,
+  `archived_at` datetime NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `task_group_history` (`task_group_id`, `deadline`),
+  CONSTRAINT `task_archive_ibfk_1` FOREIGN KEY (`task_group_id`) REFERENCES `task_group` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `user_task_archive` (
+  `user_id` int(11) NOT NULL,
+  `task_id` int(11) NOT NULL,
+  `reminders_sent` int(10) unsigned NOT NULL DEFAULT 0,
+  PRIMARY KEY (`task_id`, `user_id`),
+  KEY `user_id` (`user_id`),
+  CONSTRAINT `user_task_archive_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `user_task_archive_ibfk_2` FOREIGN KEY (`task_id`) REFERENCES `task_archive` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,16 @@
+-- Состояние доставки в чаты пользователей. Строка есть только у чатов, в которые последняя отправка не удалась:
+-- blocked - бот заблокирован пользователем (403), not_found - чат не найден (400), backoff - временная ошибка,
+-- следующая попытка не раньше retry_at (пауза растет вдвое с каждой неудачей, со случайным разбросом).
+-- Напоминания получателям с заблокированным или ненайденным чатом и получателям, не начинавшим диалог (tg_chatid = 0),
+-- не захватываются рассылкой, пока пользователь снова не напишет боту /start; строка удаляется после успешной отправки
+
+CREATE TABLE `chat_health` (
+  `user_id` int(11) NOT NULL,
+  `state` enum('blocked','not_found','backoff') NOT NULL,
+  `failures` int(10) unsigned NOT NULL DEFAULT 1,
+  `last_error` varchar(255) DEFAULT NULL,
+  `retry_at` datetime DEFAULT NULL,
+  `updated_at` datetime NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`user_id`),
+  CONSTRAINT `chat_health_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
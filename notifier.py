@@ -0,0 +1,490 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+from db_interact import *
+from delivery import AsyncDeliveryPipeline, DeliveryPipeline
+from dispatch_queue import DispatchQueue
+from metrics import registry
+from render import MessageRenderer, message_renderer
+from scheduler import ReminderScheduler
+
+# Период полной сверки расписания напоминаний с БД в секундах (на случай изменений в обход бота)
+SCHEDULE_RESYNC_INTERVAL = 15 * 60
+# Пауза перед первой повторной попыткой отправки неудавшегося напоминания в секундах (каждая следующая вдвое длиннее)
+RETRY_DELAY = 30
+# Наибольшее число попыток отправки одного напоминания
+MAX_ATTEMPTS = 5
+# Наибольшая пауза перед повторной попыткой отправки в чат после временных ошибок в секундах
+# (первая пауза равна RETRY_DELAY, каждая следующая вдвое длиннее)
+CHAT_BACKOFF_MAX = 6 * 3600
+# На сколько секунд экземпляр бота захватывает напоминания для рассылки; если он упадет,
+# по истечении этого срока напоминания захватит другой экземпляр
+CLAIM_LEASE_SECONDS = 5 * 60
+# Сколько напоминаний захватывается за раз
+CLAIM_BATCH_SIZE = 500
+# Напоминание, отправленное позже своего срока больше чем на столько секунд, считается опоздавшим
+LATE_AFTER_SECONDS = 60
+
+reminder_lag_seconds = registry.histogram(
+    "reminder_lag_seconds",
+    "Насколько позже срока напоминания оно было фактически отправлено",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+reminders_due_backlog = registry.gauge(
+    "reminders_due_backlog", "Число наступивших, но еще не отправленных напоминаний"
+)
+dispatch_seconds = registry.histogram("reminder_dispatch_duration_seconds", "Длительность одного цикла рассылки")
+reminders_dropped_total = registry.counter(
+    "reminders_dropped_total",
+    "Напоминания, отброшенные без отправки, потому что дедлайн прошел (в БД или в очереди на отправку)",
+    ("stage",),
+)
+reminders_late_total = registry.counter(
+    "reminders_late_total", f"Напоминания, отправленные позже своего срока больше чем на {LATE_AFTER_SECONDS} с"
+)
+chat_delivery_failures_total = registry.counter(
+    "chat_delivery_failures_total",
+    "Неудачные отправки сообщений по видам ошибки: blocked, not_found, rejected, transient",
+    ("kind",),
+)
+
+
+def get_message_text(reminder: dict) -> str:
+    """
+    Получить текст напоминания для конкретной задачи
+    :param_name reminder: строка из db_get_due_reminders с полями задачи task_id, name, description, deadline и keyname
+    """
+    return message_renderer.render_task(reminder)
+
+
+def classify_delivery_error(error: Exception | None) -> str:
+    """
+    Вид ошибки отправки сообщения:
+    blocked - бот заблокирован пользователем или удален из чата (403), not_found - чат не найден (400),
+    rejected - Telegram отклонил именно это сообщение (другие 4xx, кроме 429 Too Many Requests), повторная отправка не поможет,
+    transient - временная ошибка (сеть, 5xx, исчерпаны повторы после 429).
+    У TeleBot и AsyncTeleBot разные классы ApiTelegramException, поэтому проверяются только код и описание ошибки Telegram
+    """
+    error_code = getattr(error, "error_code", None)
+    if not isinstance(error_code, int) or not 400 <= error_code < 500 or error_code == 429:
+        return "transient"
+    if error_code == 403:
+        return "blocked"
+    if error_code == 400 and "chat not found" in str(getattr(error, "description", "")).lower():
+        return "not_found"
+    return "rejected"
+
+
+class ReminderDispatcher:
+    """
+    Рассылка напоминаний: спит до срока ближайшего напоминания из расписания, затем захватывает наступившие напоминания
+    (строки таблицы reminder), отправляет их через delivery и записывает результаты.
+    Захват позволяет запускать несколько экземпляров бота с одной БД
+    """
+
+    def __init__(
+        self,
+        db_pool: DBPool,
+        delivery: DeliveryPipeline,
+        scheduler: ReminderScheduler,
+        resync_interval: float = SCHEDULE_RESYNC_INTERVAL,
+        retry_delay: float = RETRY_DELAY,
+        lease_seconds: int = CLAIM_LEASE_SECONDS,
+        claim_batch_size: int = CLAIM_BATCH_SIZE,
+        max_attempts: int = MAX_ATTEMPTS,
+        chat_backoff_max: float = CHAT_BACKOFF_MAX,
+        renderer: MessageRenderer = message_renderer,
+        queue: DispatchQueue | None = None,
+    ):
+        """
+        :param_name db_pool: пул соединений с БД
+        :param_name delivery: конвейер отправки сообщений
+        :param_name scheduler: расписание напоминаний
+        :param_name resync_interval: период полной сверки расписания с БД в секундах
+        :param_name retry_delay: пауза перед первой повторной отправкой неудавшегося напоминания в секундах
+        :param_name lease_seconds: срок захвата напоминаний в секундах, должен превышать время рассылки одной пачки
+        :param_name claim_batch_size: сколько напоминаний захватывается за раз
+        :param_name max_attempts: наибольшее число попыток отправки одного напоминания
+        :param_name chat_backoff_max: наибольшая пауза перед повторной попыткой отправки в чат после временных ошибок в секундах
+        :param_name renderer: отрисовка текстов напоминаний
+        :param_name queue: порядок отправки сообщений (по умолчанию - по срочности с чередованием групп задач)
+        """
+        self.db_pool = db_pool
+        self.delivery = delivery
+        self.scheduler = scheduler
+        self.resync_interval = resync_interval
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.claim_batch_size = claim_batch_size
+        self.max_attempts = max_attempts
+        self.chat_backoff_max = chat_backoff_max
+        self.renderer = renderer
+        self.queue = queue or DispatchQueue()
+        self.worker_id = f"{socket.gethostname()[:30]}:{os.getpid()}"
+        # Момент последней полной загрузки расписания (time.monotonic())
+        self._resynced_at = 0.0
+        self.stats = {"ticks": 0, "due": 0, "sent": 0, "failed": 0, "expired": 0, "late": 0, "deferred": 0, "messages": 0}
+
+    def refresh_group_schedule(self, db_conn, task_group_id: int):
+        """
+        Обновить расписание напоминаний группы задач после изменения ее задач или сроков напоминания
+        (подписывается на db_interact.reminder_listeners)
+        :param_name task_group_id: id группы задач
+        """
+        self.scheduler.replace_group(task_group_id, db_get_reminder_schedule(db_conn, task_group_id))
+
+    def refresh_due_schedule(self, db_conn):
+        """
+        Обновить в расписании только напоминания, срок которых наступил, после рассылки: отправленные и отброшенные
+        удаляются, для повторных попыток берется новый срок из очереди отправки
+        """
+        ids, not_before = self.scheduler.due_ids(), self._not_before()
+        for start in range(0, len(ids), self.claim_batch_size):
+            chunk = ids[start : start + self.claim_batch_size]
+            self.scheduler.replace_ids(chunk, db_get_reminder_schedule(db_conn, reminder_ids=chunk), not_before)
+
+    def _not_before(self) -> datetime:
+        # Защита от холостых циклов, если наступившее напоминание не удалось захватить
+        # (его захватил другой экземпляр бота или чат получателя на паузе)
+        return datetime.now() + timedelta(seconds=self.retry_delay)
+
+    def _resync_due(self) -> bool:
+        return time.monotonic() - self._resynced_at >= self.resync_interval
+
+    def dispatch(self, db_conn) -> int:
+        """
+        Разослать напоминания, срок отправки которых наступил, пачками по claim_batch_size
+        :returns: число отправленных напоминаний
+        """
+        self._count_expired(db_expire_reminders(db_conn), "database")
+        n_sent = 0
+        while True:
+            claim_token = f"{self.worker_id}:{uuid.uuid4().hex[:16]}"
+            n_claimed = db_claim_due_reminders(db_conn, claim_token, self.lease_seconds, self.claim_batch_size)
+            if not n_claimed:
+                return n_sent
+            n_sent += self.dispatch_claimed(db_conn, claim_token)
+            if n_claimed < self.claim_batch_size:
+                return n_sent
+
+    def dispatch_claimed(self, db_conn, claim_token: str) -> int:
+        """
+        Разослать захваченные напоминания.
+        Все данные для рассылки получаются одним запросом; напоминания одному получателю объединяются в одно сообщение
+        (или несколько, если текст длиннее лимита Telegram); сообщения отправляются параллельно через delivery
+        в порядке срочности (см. DispatchQueue), результаты отправки всех вошедших в сообщения напоминаний
+        записываются одной транзакцией
+        :param_name claim_token: метка захвата
+        :returns: число отправленных напоминаний
+        """
+        self.stats["ticks"] += 1
+        started = time.perf_counter()
+        items, expired_ids = self._prepare(db_get_due_reminders(db_conn, claim_token))
+        if not items and not expired_ids:
+            # Захваченные напоминания успели отправить или удалить - только снимаем захват
+            db_reminders_ack(db_conn, claim_token, [], [], [], self.retry_delay, self.max_attempts)
+            return 0
+        results = self.delivery.send_batch(items) if items else []
+        sent_ids, retry_ids, failed_ids, chat_health = self._collect(results, expired_ids)
+        if any(chat_health):
+            # Состояние чатов записывается до снятия захвата, чтобы отложенные напоминания не были захвачены снова
+            db_update_chat_health(db_conn, *chat_health, self.retry_delay, self.chat_backoff_max)
+        db_reminders_ack(
+            db_conn, claim_token, sent_ids, retry_ids, failed_ids, self.retry_delay, self.max_attempts, expired_ids
+        )
+        return self._finish(items, sent_ids, retry_ids, failed_ids, expired_ids, started)
+
+    def _prepare(self, reminders: list[dict]) -> tuple[list[dict], list]:
+        """
+        Объединить захваченные напоминания в сообщения получателям и упорядочить сообщения по срочности
+        :param_name reminders: строки из db_get_due_reminders
+        :returns: (сообщения для delivery.send_batch, id напоминаний, дедлайн которых уже прошел)
+        """
+        now = datetime.now()
+        expired_ids = []
+        reminders_by_chat = {}
+        for reminder in reminders:
+            if reminder['deadline'] <= now:
+                # Напоминания с прошедшим дедлайном не попадают в текст сообщения; остальные напоминания получателю
+                # отправляются как обычно
+                expired_ids.append(reminder['reminder_id'])
+                continue
+            if not reminder['tg_chatid']:
+                # Пользователь еще не начинал диалог с ботом (сбросил id чата после захвата) - захват просто снимается,
+                # напоминание будет отправлено после /start
+                continue
+            reminders_by_chat.setdefault(reminder['tg_chatid'], []).append(reminder)
+        items = [
+            {'chat_id': chat_id, 'tg_nick': reminders[0]['tg_nick'], 'text': text, 'reminders': included}
+            for chat_id, reminders in reminders_by_chat.items()
+            for text, included in self.renderer.render_combined(reminders)
+        ]
+        items = self.queue.order(items, now)
+        for item in items:
+            # Сообщение, не отправленное до дедлайнов всех вошедших в него напоминаний (например, из-за лимитов Telegram),
+            # отправлять уже бесполезно
+            item['expires_at'] = self.queue.expires_at(item).timestamp()
+        self._count_expired(len(expired_ids), "queue")
+        reminders_due_backlog.set(sum(len(item['reminders']) for item in items))
+        return items, expired_ids
+
+    def _count_expired(self, n_expired: int, stage: str):
+        if n_expired:
+            self.stats["expired"] += n_expired
+            reminders_dropped_total.inc(n_expired, stage=stage)
+
+    def _collect(self, results: list[dict], expired_ids: list) -> tuple[list, list, list, tuple]:
+        """
+        Разобрать результаты отправки сообщений; id напоминаний, не отправленных до своего дедлайна, добавляются в expired_ids.
+        Напоминания в заблокированные и ненайденные чаты остаются ожидающими, не расходуя попыток: рассылка пропускает их,
+        пока пользователь снова не напишет боту /start (или до истечения дедлайна)
+        :returns: (id отправленных напоминаний, id напоминаний, отправку которых нужно повторить,
+        id напоминаний, которые не удастся отправить, изменения состояния чатов для db_update_chat_health:
+        (recovered_ids, unreachable, transient))
+        """
+        sent_ids = []
+        retry_ids = []
+        failed_ids = []
+        recovered = set()
+        unreachable = {}
+        transient = {}
+        for result in results:
+            reminder_ids = [reminder['reminder_id'] for reminder in result['reminders']]
+            user_id = result['reminders'][0]['user_id']
+            if result['ok']:
+                if result['reminders'][0].get('chat_failures') is not None:
+                    recovered.add(user_id)
+                sent_ids.extend(reminder_ids)
+                for reminder in result['reminders']:
+                    lag = max(0.0, result['sent_at'] - reminder['due_at'].timestamp())
+                    reminder_lag_seconds.observe(lag)
+                    if lag > LATE_AFTER_SECONDS:
+                        self.stats["late"] += 1
+                        reminders_late_total.inc()
+                continue
+            if result.get('expired'):
+                # Истекшими считаются только напоминания, дедлайн которых действительно прошел; захват остальных
+                # просто снимается, и они будут отправлены следующим сообщением
+                now = time.time()
+                reminder_ids = [
+                    reminder['reminder_id'] for reminder in result['reminders'] if reminder['deadline'].timestamp() <= now
+                ]
+                expired_ids.extend(reminder_ids)
+                self._count_expired(len(reminder_ids), "delivery")
+                continue
+            kind = classify_delivery_error(result['error'])
+            chat_delivery_failures_total.inc(kind=kind)
+            print(f"Не удалось отправить сообщение пользователю {result['tg_nick']} ({kind}): {str(result['error'])}")
+            if kind in ("blocked", "not_found"):
+                unreachable[user_id] = (kind, str(result['error']))
+                self.stats["deferred"] += len(reminder_ids)
+            elif kind == "rejected":
+                failed_ids.extend(reminder_ids)
+            else:
+                transient[user_id] = str(result['error'])
+                retry_ids.extend(reminder_ids)
+        recovered -= unreachable.keys() | transient.keys()
+        return sent_ids, retry_ids, failed_ids, (sorted(recovered), unreachable, transient)
+
+    def _finish(
+        self, items: list[dict], sent_ids: list, retry_ids: list, failed_ids: list, expired_ids: list, started: float
+    ) -> int:
+        """
+        Обновить счетчики и метрики после записи результатов рассылки
+        :returns: число отправленных напоминаний
+        """
+        n_sent = len(sent_ids)
+        n_due = n_sent + len(retry_ids) + len(failed_ids) + len(expired_ids)
+        self.stats["due"] += n_due
+        self.stats["sent"] += n_sent
+        self.stats["failed"] += len(retry_ids) + len(failed_ids)
+        self.stats["messages"] += len(items)
+        reminders_due_backlog.set(n_due - n_sent)
+        dispatch_seconds.observe(time.perf_counter() - started)
+        stats = self.delivery.stats()
+        print(
+            f"Разослано напоминаний: {n_sent} из {n_due} в {len(items)} сообщениях"
+            + (f" (отброшено с прошедшим дедлайном: {len(expired_ids)})" if expired_ids else "")
+            + ", "
+            f"{stats['last_batch_throughput']:.1f} сообщ./с"
+        )
+        return n_sent
+
+    def run(self):
+        """
+        Отправлять напоминания о задачах участникам, подписанным на них, пока не будет вызван stop().
+        Расписание загружается при запуске и обновляется при изменении задач и сроков напоминаний; после рассылки
+        из БД перечитываются только разосланные напоминания, а полностью расписание сверяется раз в resync_interval секунд.
+        Сроки напоминаний сравниваются с локальным временем, поэтому часовые пояса бота и БД должны совпадать.
+        """
+        with self.db_pool.connection() as db_conn:
+            self.scheduler.load(db_get_reminder_schedule(db_conn))
+        self._resynced_at = time.monotonic()
+        while not self.scheduler.stopped:
+            due = self.scheduler.wait_due(self.resync_interval)
+            if self.scheduler.stopped:
+                break
+            try:
+                with self.db_pool.connection() as db_conn:
+                    if due:
+                        self.dispatch(db_conn)
+                        self.refresh_due_schedule(db_conn)
+                    if not due or self._resync_due():
+                        self.scheduler.load(db_get_reminder_schedule(db_conn), self._not_before())
+                        self._resynced_at = time.monotonic()
+            except Exception as e:
+                print("Ошибка при рассылке напоминаний:", str(e))
+                time.sleep(self.retry_delay)
+
+    def stop(self):
+        """
+        Остановить рассылку
+        """
+        self.scheduler.stop()
+
+
+class AsyncReminderDispatcher(ReminderDispatcher):
+    """
+    Вариант ReminderDispatcher для режима asyncio: работает задачей в цикле событий бота,
+    обращается к БД через AsyncDBPool и отправляет сообщения через AsyncDeliveryPipeline
+    """
+
+    def __init__(self, db_pool: "db_async.AsyncDBPool", delivery: AsyncDeliveryPipeline, scheduler: ReminderScheduler, **kwargs):
+        """
+        :param_name db_pool: пул асинхронных соединений с БД
+        :param_name delivery: асинхронный конвейер отправки сообщений
+        :param_name scheduler: расписание напоминаний
+        (остальные параметры - как у ReminderDispatcher)
+        """
+        super().__init__(db_pool, delivery, scheduler, **kwargs)
+        # aiomysql загружается только в режиме asyncio
+        import db_async
+
+        self.db = db_async
+        self._loop = None
+        self._wakeup = None
+
+    def refresh_group_schedule(self, db_conn, task_group_id: int):
+        """
+        Обновить расписание напоминаний группы задач и разбудить рассылку.
+        Вызывается из потоков, в которых выполняются синхронные функции db_interact (см. reminder_listeners)
+        """
+        super().refresh_group_schedule(db_conn, task_group_id)
+        self._wake()
+
+    async def arefresh_group_schedule(self, db_conn, task_group_id: int):
+        """
+        Обновить расписание напоминаний группы задач и разбудить рассылку
+        (подписывается на db_async.reminder_listeners, вызывается в цикле событий с соединением aiomysql)
+        :param_name task_group_id: id группы задач
+        """
+        self.scheduler.replace_group(task_group_id, await self.db.adb_get_reminder_schedule(db_conn, task_group_id))
+        self._wake()
+
+    def _wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def wait_due(self, timeout: float) -> bool:
+        """
+        Ждать, пока не наступит срок ближайшего напоминания (см. ReminderScheduler.wait_due), не блокируя цикл событий
+        :returns: True, если срок напоминания наступил, False - если истекло время ожидания или вызван stop()
+        """
+        deadline = datetime.now() + timedelta(seconds=timeout)
+        while not self.scheduler.stopped:
+            # Событие сбрасывается до чтения расписания, чтобы не пропустить изменение, сделанное между ними
+            self._wakeup.clear()
+            now = datetime.now()
+            due_at = self.scheduler.next_due()
+            if due_at is not None and due_at <= now:
+                return True
+            if now >= deadline:
+                return False
+            wake_at = deadline if due_at is None else min(due_at, deadline)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), (wake_at - now).total_seconds())
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def refresh_due_schedule(self, db_conn):
+        """
+        Обновить в расписании только напоминания, срок которых наступил (см. ReminderDispatcher.refresh_due_schedule)
+        """
+        ids, not_before = self.scheduler.due_ids(), self._not_before()
+        for start in range(0, len(ids), self.claim_batch_size):
+            chunk = ids[start : start + self.claim_batch_size]
+            self.scheduler.replace_ids(chunk, await self.db.adb_get_reminder_schedule(db_conn, reminder_ids=chunk), not_before)
+
+    async def dispatch(self, db_conn) -> int:
+        """
+        Разослать напоминания, срок отправки которых наступил, пачками по claim_batch_size
+        :returns: число отправленных напоминаний
+        """
+        self._count_expired(await self.db.adb_expire_reminders(db_conn), "database")
+        n_sent = 0
+        while True:
+            claim_token = f"{self.worker_id}:{uuid.uuid4().hex[:16]}"
+            n_claimed = await self.db.adb_claim_due_reminders(db_conn, claim_token, self.lease_seconds, self.claim_batch_size)
+            if not n_claimed:
+                return n_sent
+            n_sent += await self.dispatch_claimed(db_conn, claim_token)
+            if n_claimed < self.claim_batch_size:
+                return n_sent
+
+    async def dispatch_claimed(self, db_conn, claim_token: str) -> int:
+        """
+        Разослать захваченные напоминания (см. ReminderDispatcher.dispatch_claimed)
+        :returns: число отправленных напоминаний
+        """
+        self.stats["ticks"] += 1
+        started = time.perf_counter()
+        items, expired_ids = self._prepare(await self.db.adb_get_due_reminders(db_conn, claim_token))
+        if not items and not expired_ids:
+            await self.db.adb_reminders_ack(db_conn, claim_token, [], [], [], self.retry_delay, self.max_attempts)
+            return 0
+        results = await self.delivery.send_batch(items) if items else []
+        sent_ids, retry_ids, failed_ids, chat_health = self._collect(results, expired_ids)
+        if any(chat_health):
+            await self.db.adb_update_chat_health(db_conn, *chat_health, self.retry_delay, self.chat_backoff_max)
+        await self.db.adb_reminders_ack(
+            db_conn, claim_token, sent_ids, retry_ids, failed_ids, self.retry_delay, self.max_attempts, expired_ids
+        )
+        return self._finish(items, sent_ids, retry_ids, failed_ids, expired_ids, started)
+
+    async def run(self):
+        """
+        Отправлять напоминания, пока не будет вызван stop() (см. ReminderDispatcher.run)
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        async with self.db_pool.connection() as db_conn:
+            self.scheduler.load(await self.db.adb_get_reminder_schedule(db_conn))
+        self._resynced_at = time.monotonic()
+        while not self.scheduler.stopped:
+            due = await self.wait_due(self.resync_interval)
+            if self.scheduler.stopped:
+                break
+            try:
+                async with self.db_pool.connection() as db_conn:
+                    if due:
+                        await self.dispatch(db_conn)
+                        await self.refresh_due_schedule(db_conn)
+                    if not due or self._resync_due():
+                        self.scheduler.load(await self.db.adb_get_reminder_schedule(db_conn), self._not_before())
+                        self._resynced_at = time.monotonic()
+            except Exception as e:
+                print("Ошибка при рассылке напоминаний:", str(e))
+                await asyncio.sleep(self.retry_delay)
+
+    def stop(self):
+        """
+        Остановить рассылку
+        """
+        super().stop()
+        self._wake()
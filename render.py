@@ -0,0 +1,118 @@
+from cache import TTLCache
+from metrics import registry
+
+# Максимальная длина текста сообщения в Telegram
+MESSAGE_LENGTH_LIMIT = 4096
+# Версия шаблонов; увеличивается при изменении текстов, чтобы не использовать тексты, отрисованные по старым шаблонам
+TEMPLATE_VERSION = 1
+DEFAULT_LANGUAGE = "ru"
+
+# Шаблоны напоминаний: single - напоминание об одной задаче, header и block - сводное напоминание о нескольких задачах.
+# Подстановки: name, keyname, deadline, description, count
+TEMPLATES = {
+    "ru": {
+        "single": "❗Приближается дедлайн задачи \"{name}\" по \"{keyname}\"❗\n\n📆 {deadline}\n\nОписание задачи: {description}",
+        "header": "❗Приближаются дедлайны задач ({count})❗",
+        "block": "📌 \"{name}\" по \"{keyname}\"\n📆 {deadline}\nОписание задачи: {description}",
+    },
+    "en": {
+        "single": "❗The deadline for \"{name}\" in \"{keyname}\" is approaching❗\n\n📆 {deadline}\n\nTask description: {description}",
+        "header": "❗Upcoming deadlines ({count})❗",
+        "block": "📌 \"{name}\" in \"{keyname}\"\n📆 {deadline}\nTask description: {description}",
+    },
+}
+
+# Поля задачи, от которых зависит текст; при изменении любого из них текст отрисовывается заново
+TASK_FIELDS = ("name", "keyname", "deadline", "description")
+
+
+class MessageRenderer:
+    """
+    Отрисовка текстов напоминаний по шаблонам TEMPLATES.
+    Текст задачи отрисовывается один раз и кэшируется по ключу (task_id, вид текста, язык, версия шаблонов),
+    поэтому для каждого следующего получателя той же задачи достаточно поиска в словаре.
+    Вместе с текстом хранятся поля задачи, по которым он отрисован: если строка задачи изменилась, текст отрисовывается заново
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: float = 3600):
+        """
+        :param_name max_size: максимальное число текстов в кэше
+        :param_name ttl: время жизни текста в кэше в секундах
+        """
+        # Шаблоны "компилируются" в связанные методы str.format
+        self.templates = {
+            language: {kind: template.format for kind, template in templates.items()}
+            for language, templates in TEMPLATES.items()
+        }
+        self.cache = TTLCache("messages", max_size=max_size, ttl=ttl)
+
+    def _templates(self, language: str) -> dict:
+        return self.templates.get(language) or self.templates[DEFAULT_LANGUAGE]
+
+    def render_task(self, reminder: dict, kind: str = "single", language: str = DEFAULT_LANGUAGE) -> str:
+        """
+        Текст о задаче
+        :param_name reminder: строка из db_get_due_reminders с полями task_id, name, keyname, deadline и description
+        :param_name kind: single - отдельное напоминание, block - часть сводного напоминания
+        :param_name language: язык шаблона
+        """
+        key = (reminder["task_id"], kind, language, TEMPLATE_VERSION)
+        fingerprint = tuple(reminder[field] for field in TASK_FIELDS)
+        found, value = self.cache.get(key)
+        if found and value[0] == fingerprint:
+            return value[1]
+        text = self._templates(language)[kind](**dict(zip(TASK_FIELDS, fingerprint)))
+        self.cache.put(key, (fingerprint, text))
+        return text
+
+    def render_batch(self, reminders: list[dict], kind: str = "single", language: str = DEFAULT_LANGUAGE) -> list[str]:
+        """
+        Тексты о задачах для списка напоминаний (в том же порядке)
+        """
+        return [self.render_task(reminder, kind, language) for reminder in reminders]
+
+    def render_combined(
+        self, reminders: list[dict], language: str = DEFAULT_LANGUAGE, limit: int = MESSAGE_LENGTH_LIMIT
+    ) -> list[tuple[str, list[dict]]]:
+        """
+        Объединить напоминания одному получателю в как можно меньшее число сообщений не длиннее limit
+        :param_name reminders: строки из db_get_due_reminders для одного чата
+        :returns: список пар (текст сообщения, напоминания, вошедшие в это сообщение)
+        """
+        if len(reminders) == 1:
+            return [(self.render_task(reminders[0], "single", language)[:limit], reminders)]
+        reminders = sorted(reminders, key=lambda reminder: reminder["deadline"])
+        header_template = self._templates(language)["header"]
+        # В заголовке каждой части - число задач в этой части; места оставляется на самый длинный заголовок
+        header_length = len(header_template(count=len(reminders)))
+        parts = []
+        blocks, included, length = [], [], header_length
+        for reminder, block in zip(reminders, self.render_batch(reminders, "block", language)):
+            block = block[: limit - header_length - 2]
+            if included and length + 2 + len(block) > limit:
+                parts.append((blocks, included))
+                blocks, included, length = [], [], header_length
+            blocks.append(block)
+            included.append(reminder)
+            length += 2 + len(block)
+        parts.append((blocks, included))
+        return [
+            ("\n\n".join([header_template(count=len(included))] + blocks), included)
+            for blocks, included in parts
+        ]
+
+    def invalidate(self):
+        """
+        Сбросить все отрисованные тексты (например, после изменения шаблонов)
+        """
+        self.cache.clear()
+
+
+message_renderer = MessageRenderer()
+
+registry.gauge(
+    "message_cache_hits", "Число текстов напоминаний, взятых из кэша", function=lambda: {(): message_renderer.cache.hits}
+)
+registry.gauge(
+    "message_cache_misses", "Число отрисованных текстов напоминаний", function=lambda: {(): message_renderer.cache.misses}
+)
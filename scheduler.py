@@ -0,0 +1,140 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+
+class ReminderScheduler:
+    """
+    Расписание предстоящих напоминаний в памяти процесса.
+    Хранит моменты отправки (due_at) в куче и позволяет потоку рассылки спать ровно до ближайшего из них.
+    Ключ напоминания - id строки таблицы reminder.
+    """
+
+    def __init__(self):
+        self._heap = []  # элементы (due_at, id напоминания)
+        self._entries = {}  # id напоминания -> (due_at, task_group_id)
+        self._cond = threading.Condition()
+        self.stopped = False
+
+    def _push(self, row: dict, not_before: datetime | None = None):
+        key = row["id"]
+        due_at = row["due_at"]
+        if not_before is not None and due_at < not_before:
+            due_at = not_before
+        self._entries[key] = (due_at, row["task_group_id"])
+        heapq.heappush(self._heap, (due_at, key))
+
+    def load(self, rows: list[dict], not_before: datetime | None = None):
+        """
+        Полностью заменить расписание
+        :param_name rows: строки из db_get_reminder_schedule
+        :param_name not_before: отложить до этого момента напоминания, срок которых уже наступил
+        """
+        with self._cond:
+            self._heap = []
+            self._entries = {}
+            for row in rows:
+                self._push(row, not_before)
+            self._cond.notify_all()
+
+    def replace_group(self, task_group_id: int, rows: list[dict]):
+        """
+        Заменить напоминания одной группы задач (после изменения задач или сроков напоминания)
+        :param_name task_group_id: id группы задач
+        :param_name rows: строки из db_get_reminder_schedule по этой группе
+        """
+        with self._cond:
+            self._entries = {
+                key: value
+                for key, value in self._entries.items()
+                if value[1] != task_group_id
+            }
+            for row in rows:
+                self._push(row)
+            self._rebuild_if_sparse()
+            self._cond.notify_all()
+
+    def replace_ids(self, ids: list, rows: list[dict], not_before: datetime | None = None):
+        """
+        Заменить отдельные напоминания (после попытки их отправки): напоминания из ids, которых нет в rows,
+        удаляются из расписания (отправлены, отброшены или ждут /start от получателя)
+        :param_name ids: id напоминаний
+        :param_name rows: строки из db_get_reminder_schedule по этим напоминаниям
+        :param_name not_before: отложить до этого момента напоминания, срок которых уже наступил
+        """
+        with self._cond:
+            for key in ids:
+                self._entries.pop(key, None)
+            for row in rows:
+                self._push(row, not_before)
+            self._rebuild_if_sparse()
+            self._cond.notify_all()
+
+    def due_ids(self, now: datetime | None = None) -> list:
+        """
+        id напоминаний, срок отправки которых наступил, в порядке срока отправки
+        :param_name now: текущий момент (по умолчанию datetime.now())
+        """
+        now = now or datetime.now()
+        with self._cond:
+            due = sorted((due_at, key) for key, (due_at, _) in self._entries.items() if due_at <= now)
+            return [key for _, key in due]
+
+    def _rebuild_if_sparse(self):
+        # Устаревшие элементы кучи удаляются лениво; если их накопилось слишком много - пересобираем кучу
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(due_at, key) for key, (due_at, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _next_due(self) -> datetime | None:
+        while self._heap:
+            due_at, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == due_at:
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due(self) -> datetime | None:
+        """
+        Момент ближайшего напоминания (None, если напоминаний нет)
+        """
+        with self._cond:
+            return self._next_due()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def wait_due(self, timeout: float | None = None) -> bool:
+        """
+        Ждать, пока не наступит срок ближайшего напоминания
+        :param_name timeout: максимальное время ожидания в секундах (None - без ограничения)
+        :returns: True, если срок напоминания наступил, False - если истекло время ожидания или вызван stop()
+        """
+        deadline = None if timeout is None else datetime.now() + timedelta(seconds=timeout)
+        with self._cond:
+            while not self.stopped:
+                now = datetime.now()
+                due_at = self._next_due()
+                if due_at is not None and due_at <= now:
+                    return True
+                if deadline is not None and now >= deadline:
+                    return False
+                wake_at = due_at
+                if deadline is not None and (wake_at is None or deadline < wake_at):
+                    wake_at = deadline
+                wait = None if wake_at is None else (wake_at - now).total_seconds()
+                self._cond.wait(wait)
+            return False
+
+    def stop(self):
+        """
+        Прервать ожидание в wait_due (при остановке рассылки)
+        """
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+
+reminder_scheduler = ReminderScheduler()
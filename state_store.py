@@ -0,0 +1,161 @@
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class StateStore(ABC):
+    """
+    Хранилище состояний диалогов с пользователями (шаг сценария и накопленные данные).
+    Запись удаляется через ttl секунд после последнего изменения; при превышении max_entries
+    вытесняются записи, которые дольше всего не изменялись
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 24 * 3600):
+        """
+        :param_name max_entries: максимальное число хранимых состояний
+        :param_name ttl: время жизни состояния в секундах
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _get(self, key: str) -> dict | None:
+        """
+        Прочитать состояние (вызывается под self._lock)
+        """
+
+    @abstractmethod
+    def _set(self, key: str, state: dict):
+        """
+        Записать состояние и продлить его время жизни (вызывается под self._lock)
+        """
+
+    @abstractmethod
+    def _delete(self, key: str):
+        """
+        Удалить состояние (вызывается под self._lock)
+        """
+
+    def get(self, key: str) -> dict | None:
+        """
+        Состояние пользователя (None, если его нет или оно устарело)
+        """
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, state: dict):
+        """
+        Записать состояние пользователя целиком
+        """
+        with self._lock:
+            self._set(key, state)
+
+    def delete(self, key: str):
+        """
+        Удалить состояние пользователя
+        """
+        with self._lock:
+            self._delete(key)
+
+    def update(self, key: str, **fields) -> dict:
+        """
+        Изменить отдельные поля состояния пользователя (если состояния нет - создать)
+        :returns: новое состояние
+        """
+        with self._lock:
+            state = dict(self._get(key) or {})
+            state.update(fields)
+            self._set(key, state)
+            return state
+
+
+class MemoryStateStore(StateStore):
+    """
+    Хранилище состояний в памяти процесса (теряется при перезапуске).
+    Хранятся и выдаются копии словарей состояний, поэтому изменить состояние можно только через set и update
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 24 * 3600):
+        super().__init__(max_entries, ttl)
+        self._data = OrderedDict()  # ключ -> (момент устаревания, состояние)
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return dict(entry[1])
+
+    def _set(self, key, state):
+        self._data[key] = (time.monotonic() + self.ttl, dict(state))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _delete(self, key):
+        self._data.pop(key, None)
+
+
+class SqliteStateStore(StateStore):
+    """
+    Хранилище состояний в локальном файле SQLite: незавершенные сценарии переживают перезапуск бота.
+    Устаревшие и лишние записи удаляются раз в CLEANUP_INTERVAL записей, поэтому между очистками
+    число записей может ненадолго превышать max_entries
+    """
+
+    CLEANUP_INTERVAL = 100
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl: float = 24 * 3600):
+        """
+        :param_name path: путь к файлу базы данных SQLite
+        """
+        super().__init__(max_entries, ttl)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_state (key TEXT PRIMARY KEY, state BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS user_state_expires ON user_state (expires_at)")
+        self._n_sets = 0
+
+    def _get(self, key):
+        row = self._conn.execute(
+            "SELECT state FROM user_state WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _set(self, key, state):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO user_state (key, state, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(state), now + self.ttl),
+        )
+        self._n_sets += 1
+        if self._n_sets % self.CLEANUP_INTERVAL == 0:
+            # Время от времени удаляем устаревшие записи и вытесняем лишние
+            self._conn.execute("DELETE FROM user_state WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM user_state WHERE key IN (SELECT key FROM user_state ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _delete(self, key):
+        self._conn.execute("DELETE FROM user_state WHERE key = ?", (key,))
+
+
+def create_state_store(backend: str = "memory", path: str = "./user_state.sqlite3", max_entries: int = 1000, ttl: float = 24 * 3600) -> StateStore:
+    """
+    Создать хранилище состояний диалогов
+    :param_name backend: memory - в памяти процесса, sqlite - в файле SQLite
+    :param_name path: путь к файлу SQLite (для backend = sqlite)
+    """
+    if backend == "memory":
+        return MemoryStateStore(max_entries, ttl)
+    if backend == "sqlite":
+        return SqliteStateStore(path, max_entries, ttl)
+    raise ValueError(f"Неизвестный тип хранилища состояний: {backend}")
@@ -0,0 +1,50 @@
+import importlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Организатор в тестовой конфигурации
+TEST_ADMIN = "test_admin"
+
+
+def import_bot_module(name: str = "commands"):
+    """
+    Импортировать модуль бота (commands или async_bot) с тестовой конфигурацией: модуль читает config.ini и dbconfig.ini
+    из текущего каталога при импорте, поэтому импорт выполняется во временном каталоге с копией конфигурации,
+    в которой задан тестовый токен. Соединения с БД при импорте не открываются
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    workdir = tempfile.mkdtemp(prefix="bot_test_")
+    with open(os.path.join(ROOT, "config.ini"), encoding="utf-8") as f:
+        config = f.read()
+    config = re.sub(r"(?m)^token=.*$", "token=123456:test", config)
+    config = re.sub(r"(?m)^admins=.*$", "admins=" + TEST_ADMIN, config)
+    with open(os.path.join(workdir, "config.ini"), "w", encoding="utf-8") as f:
+        f.write(config)
+    shutil.copy(os.path.join(ROOT, "dbconfig.ini"), os.path.join(workdir, "dbconfig.ini"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        return importlib.import_module(name)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class FakePool:
+    """
+    Пул соединений, выдающий одно заданное соединение (вместо DBPool)
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
@@ -0,0 +1,188 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import requests
+import telebot
+from telebot import asyncio_helper, types
+
+import db_interact
+from notifier import ReminderDispatcher, classify_delivery_error
+from scheduler import ReminderScheduler
+from tests.helpers import FakePool, import_bot_module
+
+
+def api_error(error_code: int, description: str, exception_class=telebot.apihelper.ApiTelegramException):
+    result_json = {"ok": False, "error_code": error_code, "description": description}
+    return exception_class("sendMessage", None, result_json)
+
+
+class ClassifyDeliveryErrorTest(unittest.TestCase):
+    CASES = [
+        (api_error(403, "Forbidden: bot was blocked by the user"), "blocked"),
+        (api_error(403, "Forbidden: user is deactivated"), "blocked"),
+        (api_error(400, "Bad Request: chat not found"), "not_found"),
+        (api_error(400, "Bad Request: message is too long"), "rejected"),
+        (api_error(404, "Not Found"), "rejected"),
+        (api_error(429, "Too Many Requests: retry after 5"), "transient"),
+        (api_error(500, "Internal Server Error"), "transient"),
+        (api_error(502, "Bad Gateway"), "transient"),
+        (requests.exceptions.ConnectionError("connection reset"), "transient"),
+        (None, "transient"),
+        # У AsyncTeleBot свой класс исключения
+        (api_error(403, "Forbidden: bot was blocked by the user", asyncio_helper.ApiTelegramException), "blocked"),
+        (api_error(400, "Bad Request: chat not found", asyncio_helper.ApiTelegramException), "not_found"),
+    ]
+
+    def test_classification(self):
+        for error, expected in self.CASES:
+            with self.subTest(error=str(error)):
+                self.assertEqual(classify_delivery_error(error), expected)
+
+
+class FakeDatabase:
+    """
+    Соединение pymysql с моделью таблиц user, chat_health и reminder в памяти. Запросы db_interact распознаются
+    по началу текста; условие захвата напоминаний повторяет CONDITION_RECIPIENT_UNREACHABLE
+    """
+
+    def __init__(self):
+        self.users = {}  # tg_nick -> {"id", "tg_chatid"}
+        self.chat_health = {}  # user_id -> состояние
+        self.reminders = []  # {"id", "user_id", "task_group_id", "claimed_by"}
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def reachable(self, user_id: int) -> bool:
+        user = next(user for user in self.users.values() if user["id"] == user_id)
+        return user["tg_chatid"] != 0 and self.chat_health.get(user_id) not in ("blocked", "not_found")
+
+    def pending(self, reminder) -> bool:
+        return reminder["claimed_by"] is None and self.reachable(reminder["user_id"])
+
+    def execute(self, query: str, params: list) -> tuple[int, list]:
+        if query.startswith("UPDATE user SET tg_chatid"):
+            user = self.users.get(params[1])
+            if user is None or user["tg_chatid"] == params[0]:
+                return 0, []
+            user["tg_chatid"] = params[0]
+            return 1, []
+        if query.startswith("DELETE chat_health"):
+            user = self.users.get(params[0])
+            return (1, []) if user and self.chat_health.pop(user["id"], None) else (0, [])
+        if query.startswith("INSERT INTO chat_health (user_id, state, last_error)"):
+            for i in range(0, len(params), 3):
+                self.chat_health[params[i]] = params[i + 1]
+            return len(params) // 3, []
+        if query.startswith("SELECT DISTINCT task.task_group_id"):
+            user = self.users[params[0]]
+            groups = sorted({reminder["task_group_id"] for reminder in self.reminders if reminder["user_id"] == user["id"]})
+            return len(groups), [{"task_group_id": group} for group in groups]
+        if query.startswith("SELECT reminder.id, task.task_group_id, GREATEST"):
+            rows = [
+                {"id": reminder["id"], "task_group_id": reminder["task_group_id"], "due_at": datetime.now()}
+                for reminder in self.reminders
+                if self.pending(reminder) and reminder["task_group_id"] in params[:1]
+            ]
+            return len(rows), rows
+        if query.startswith("UPDATE reminder SET claimed_by"):
+            assert db_interact.CONDITION_RECIPIENT_UNREACHABLE in query
+            claimed = [reminder for reminder in self.reminders if self.pending(reminder)][: params[2]]
+            for reminder in claimed:
+                reminder["claimed_by"] = params[0]
+            return len(claimed), []
+        return 0, []
+
+
+class FakeCursor:
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+        self.rows = []
+        self.lastrowid = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        n_rows, self.rows = self.db.execute(query, list(params or []))
+        return n_rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class ChatRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.commands = import_bot_module("commands")
+        self.db = FakeDatabase()
+        self.db.users["test_user"] = {"id": 1, "tg_chatid": 42}
+        self.db.reminders = [
+            {"id": 11, "user_id": 1, "task_group_id": 5, "claimed_by": None},
+            {"id": 12, "user_id": 1, "task_group_id": 5, "claimed_by": None},
+        ]
+        self.scheduler = ReminderScheduler()
+        self.dispatcher = ReminderDispatcher(FakePool(self.db), None, self.scheduler)
+        db_interact.reminder_listeners.append(self.dispatcher.refresh_group_schedule)
+        self.addCleanup(db_interact.reminder_listeners.remove, self.dispatcher.refresh_group_schedule)
+        patcher = mock.patch.object(self.commands, "db_pool", FakePool(self.db))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(self.commands.bot, "send_message")
+        self.send_message = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_message(self) -> types.Message:
+        return types.Message.de_json(
+            {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 42, "type": "private"},
+                "from": {"id": 42, "is_bot": False, "first_name": "user", "username": "test_user"},
+                "text": "/start",
+            }
+        )
+
+    def test_recovered_chat_reminders_claimable_again(self):
+        # Отправка вернула 403: чат помечается заблокированным, напоминания не захватываются и не входят в расписание
+        result = {
+            "ok": False,
+            "expired": False,
+            "error": api_error(403, "Forbidden: bot was blocked by the user"),
+            "tg_nick": "test_user",
+            "reminders": [{"reminder_id": 11, "user_id": 1}],
+        }
+        _, retry_ids, failed_ids, chat_health = self.dispatcher._collect([result], [])
+        self.assertEqual((retry_ids, failed_ids), ([], []))
+        db_interact.db_update_chat_health(self.db, *chat_health, 30, 3600)
+        self.assertEqual(self.db.chat_health, {1: "blocked"})
+        self.assertEqual(db_interact.db_claim_due_reminders(self.db, "w:1", 300, 10), 0)
+        self.dispatcher.refresh_group_schedule(self.db, 5)
+        self.assertEqual(len(self.scheduler), 0)
+
+        # Пользователь снова написал /start (id чата тот же): отметка снимается, напоминания возвращаются в расписание
+        self.commands.handle_start(self.start_message())
+        self.assertEqual(self.db.chat_health, {})
+        self.assertEqual(self.scheduler.due_ids(), [11, 12])
+        self.assertEqual(db_interact.db_claim_due_reminders(self.db, "w:2", 300, 10), 2)
+        self.send_message.assert_called_once()
+
+    def test_start_without_recovery_does_not_notify(self):
+        self.commands.handle_start(self.start_message())
+        self.assertEqual(len(self.scheduler), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest import mock
+
+from telebot import types
+
+from tests.helpers import TEST_ADMIN, FakePool, import_bot_module
+
+
+def message(text: str, username: str = TEST_ADMIN, chat_id: int = 42) -> types.Message:
+    return types.Message.de_json(
+        {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "user", "username": username},
+            "text": text,
+        }
+    )
+
+
+class TimeReceivedTest(unittest.TestCase):
+    def setUp(self):
+        self.commands = import_bot_module("commands")
+        self.commands.user_states.delete(TEST_ADMIN)
+        self.addCleanup(self.commands.user_states.delete, TEST_ADMIN)
+        patcher = mock.patch.object(self.commands.bot, "send_message")
+        self.send_message = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(self.commands, "save_event", return_value="saved")
+        self.save_event = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_expired_state(self):
+        self.commands.time_received(message("60"))
+        self.send_message.assert_called_once_with(42, self.commands.STATE_EXPIRED_TEXT)
+        self.save_event.assert_not_called()
+        self.assertEqual(self.commands.get_user_step(TEST_ADMIN), "AWAITING_COMMANDS")
+
+    def test_incomplete_state_cleared(self):
+        self.commands.user_states.set(TEST_ADMIN, {"step": "AWAITING_REMIND_TIME", "event_name": None})
+        self.commands.time_received(message("60"))
+        self.send_message.assert_called_once_with(42, self.commands.STATE_EXPIRED_TEXT)
+        self.assertIsNone(self.commands.user_states.get(TEST_ADMIN))
+
+    def test_saves_event(self):
+        tasks = [{"name": "task"}]
+        self.commands.user_states.set(
+            TEST_ADMIN, {"step": "AWAITING_REMIND_TIME", "event_name": "event", "data_list": tasks}
+        )
+        self.commands.time_received(message("1440, 60"))
+        self.save_event.assert_called_once_with("event", [1440, 60], tasks)
+        self.send_message.assert_called_once_with(42, "saved")
+        self.assertIsNone(self.commands.user_states.get(TEST_ADMIN))
+
+    def test_invalid_offsets_keep_state(self):
+        self.commands.user_states.set(TEST_ADMIN, {"step": "AWAITING_REMIND_TIME", "event_name": "event", "data_list": []})
+        self.commands.time_received(message("-5"))
+        self.save_event.assert_not_called()
+        self.assertEqual(self.commands.get_user_step(TEST_ADMIN), "AWAITING_REMIND_TIME")
+
+
+
+class ListEventsForUserTest(unittest.TestCase):
+    def setUp(self):
+        self.commands = import_bot_module("commands")
+        self.db_get_user_by_tg = self.patch(self.commands, "db_get_user_by_tg")
+        self.db_get_user_tasks = self.patch(self.commands, "db_get_user_tasks")
+        self.send_message = self.patch(self.commands.bot, "send_message")
+        self.patch(self.commands, "db_pool", FakePool(None))
+
+    def patch(self, target, name: str, *args):
+        patcher = mock.patch.object(target, name, *args)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_unknown_user(self):
+        # Пользователь еще не писал боту /start и не упоминался в таблицах мероприятий
+        self.db_get_user_by_tg.return_value = None
+        self.commands.list_events_for_user(message("/listme", username="stranger"))
+        self.db_get_user_tasks.assert_not_called()
+        self.send_message.assert_called_once_with(42, "Вы пока не подписаны ни на одно событие.")
+
+
+if __name__ == "__main__":
+    unittest.main()
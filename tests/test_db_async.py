@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+import db_async
+from notifier import AsyncReminderDispatcher
+from scheduler import ReminderScheduler
+
+
+class FakeCursor:
+    """
+    Курсор aiomysql: число измененных строк и результаты выборок задаются по началу текста запроса
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.conn.queries.append((query, params))
+        for prefix, (n_rows, rows) in self.conn.results.items():
+            if query.startswith(prefix):
+                self.rows = rows
+                return n_rows
+        self.rows = []
+        return 0
+
+    async def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, results: dict):
+        self.results = results
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    async def commit(self):
+        self.commits += 1
+
+
+class SetUserChatidTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.calls = []
+
+        async def listener(dbconn, task_group_id):
+            self.calls.append(task_group_id)
+
+        db_async.reminder_listeners.append(listener)
+        self.addCleanup(db_async.reminder_listeners.remove, listener)
+
+    async def test_recovered_chat_notifies_listeners(self):
+        # id чата не изменился, но отметка о заблокированном чате снята
+        conn = FakeConnection({"UPDATE user": (0, []), "DELETE chat_health": (1, []), "SELECT DISTINCT": (2, [{"task_group_id": 3}, {"task_group_id": 5}])})
+        self.assertFalse(await db_async.adb_set_user_chatid(conn, "test_user", 42))
+        self.assertEqual(self.calls, [3, 5])
+        self.assertEqual(conn.commits, 1)
+
+    async def test_unchanged_chat_does_not_notify(self):
+        conn = FakeConnection({"SELECT DISTINCT": (1, [{"task_group_id": 3}])})
+        await db_async.adb_set_user_chatid(conn, "test_user", 42)
+        self.assertEqual(self.calls, [])
+
+
+class DispatcherWakeupTest(unittest.IsolatedAsyncioTestCase):
+    async def test_set_user_chatid_wakes_dispatcher(self):
+        scheduler = ReminderScheduler()
+        dispatcher = AsyncReminderDispatcher(None, None, scheduler)
+        dispatcher._loop = asyncio.get_running_loop()
+        dispatcher._wakeup = asyncio.Event()
+        db_async.reminder_listeners.append(dispatcher.arefresh_group_schedule)
+        self.addCleanup(db_async.reminder_listeners.remove, dispatcher.arefresh_group_schedule)
+
+        waiter = asyncio.create_task(dispatcher.wait_due(60))
+        await asyncio.sleep(0.05)
+        self.assertFalse(waiter.done())
+        due_at = datetime.now() - timedelta(seconds=1)
+        conn = FakeConnection(
+            {
+                "UPDATE user": (1, []),
+                "DELETE chat_health": (1, []),
+                "SELECT DISTINCT": (1, [{"task_group_id": 7}]),
+                "SELECT reminder.id": (1, [{"id": 11, "task_group_id": 7, "due_at": due_at}]),
+            }
+        )
+        await db_async.adb_set_user_chatid(conn, "test_user", 42)
+        self.assertTrue(await asyncio.wait_for(waiter, 1))
+        self.assertEqual(scheduler.due_ids(), [11])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import threading
+import time
+import unittest
+
+import telebot
+
+from delivery import DeliveryPipeline, PerChatLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def api_error(error_code: int, description: str, retry_after: int | None = None) -> telebot.apihelper.ApiTelegramException:
+    result_json = {"ok": False, "error_code": error_code, "description": description}
+    if retry_after is not None:
+        result_json["parameters"] = {"retry_after": retry_after}
+    return telebot.apihelper.ApiTelegramException("sendMessage", None, result_json)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(10, capacity=2, clock=self.clock)
+
+    def test_burst_then_wait(self):
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertAlmostEqual(self.bucket.reserve(), 0.1)
+        # Следующий токен резервируется за уже занятым
+        self.assertAlmostEqual(self.bucket.reserve(), 0.2)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        self.clock.advance(0.25)
+        # За 0.25 с восполнилось 2.5 токена, один из них уже зарезервирован
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertAlmostEqual(self.bucket.reserve(), 0.05)
+
+    def test_burst_capped_by_capacity(self):
+        self.clock.advance(60)
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertAlmostEqual(self.bucket.reserve(), 0.1)
+
+    def test_block(self):
+        self.bucket.block(5)
+        self.assertAlmostEqual(self.bucket.reserve(), 5)
+        self.clock.advance(5)
+        self.assertEqual(self.bucket.reserve(), 0)
+
+
+class PerChatLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = PerChatLimiter(1.0, clock=self.clock)
+
+    def test_waits_per_chat(self):
+        self.assertEqual(self.limiter.reserve(1), 0)
+        self.assertEqual(self.limiter.reserve(1), 1.0)
+        self.assertEqual(self.limiter.reserve(1), 2.0)
+        # Другой чат не ждет
+        self.assertEqual(self.limiter.reserve(2), 0)
+
+    def test_slot_frees_over_time(self):
+        self.limiter.reserve(1)
+        self.clock.advance(0.4)
+        self.assertAlmostEqual(self.limiter.reserve(1), 0.6)
+        self.clock.advance(5)
+        self.assertEqual(self.limiter.reserve(1), 0)
+
+
+class FakeBot:
+    """
+    Бот, отвечающий 429 на первое сообщение в чат limited_chat
+    """
+
+    def __init__(self, limited_chat: int, retry_after: float):
+        self.limited_chat = limited_chat
+        self.retry_after = retry_after
+        self.limited = threading.Event()
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        if chat_id == self.limited_chat and not self.limited.is_set():
+            self.limited.set()
+            raise api_error(429, "Too Many Requests: retry after", self.retry_after)
+        self.sent.append((chat_id, time.monotonic()))
+
+
+class DeliveryPipelineTest(unittest.TestCase):
+    def test_rate_limit_pauses_all_chats(self):
+        bot = FakeBot(limited_chat=1, retry_after=0.3)
+        pipeline = DeliveryPipeline(bot, workers=1, global_rate=1000, per_chat_interval=0)
+        self.addCleanup(pipeline.shutdown)
+        results = {}
+        sender = threading.Thread(target=lambda: results.update(first=pipeline._send_one({"chat_id": 1, "text": "a"})))
+        sender.start()
+        self.assertTrue(bot.limited.wait(5))
+        started = time.monotonic()
+        second = pipeline._send_one({"chat_id": 2, "text": "b"})
+        waited = time.monotonic() - started
+        sender.join(5)
+        self.assertTrue(second["ok"])
+        self.assertTrue(results["first"]["ok"])
+        # Сообщение в другой чат ждало окончания паузы после 429
+        self.assertGreaterEqual(waited, 0.2)
+        self.assertEqual(pipeline.stats()["rate_limited"], 1)
+        self.assertEqual(pipeline.stats()["sent"], 2)
+
+    def test_client_error_not_retried(self):
+        class RejectingBot:
+            calls = 0
+
+            def send_message(self, chat_id, text):
+                RejectingBot.calls += 1
+                raise api_error(400, "Bad Request: message text is empty")
+
+        pipeline = DeliveryPipeline(RejectingBot(), workers=1, per_chat_interval=0)
+        self.addCleanup(pipeline.shutdown)
+        result = pipeline.send_batch([{"chat_id": 1, "text": ""}])[0]
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["error"].error_code, 400)
+        self.assertEqual(RejectingBot.calls, 1)
+
+    def test_expired_message_not_sent(self):
+        bot = FakeBot(limited_chat=None, retry_after=0)
+        pipeline = DeliveryPipeline(bot, workers=1, per_chat_interval=0)
+        self.addCleanup(pipeline.shutdown)
+        result = pipeline.send_batch([{"chat_id": 1, "text": "a", "expires_at": time.time() - 1}])[0]
+        self.assertTrue(result["expired"])
+        self.assertEqual(bot.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
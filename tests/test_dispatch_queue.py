@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime, timedelta
+
+from dispatch_queue import DispatchQueue
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def item(name: str, task_group_id: int, *deadline_seconds: float) -> dict:
+    reminders = [
+        {"task_group_id": task_group_id, "deadline": NOW + timedelta(seconds=seconds)} for seconds in deadline_seconds
+    ]
+    return {"name": name, "reminders": reminders}
+
+
+def names(items: list[dict]) -> list[str]:
+    return [item["name"] for item in items]
+
+
+class DispatchQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = DispatchQueue(fairness_window=300)
+
+    def test_deadline_order_across_windows(self):
+        items = [item("late", 1, 2000), item("soon", 1, 10), item("middle", 2, 700)]
+        self.assertEqual(names(self.queue.order(items, NOW)), ["soon", "middle", "late"])
+
+    def test_groups_interleave_inside_window(self):
+        # Большое мероприятие 1 и маленькое 2 с дедлайнами в одном окне: сообщения групп чередуются
+        items = [item(f"a{i}", 1, 10 + i) for i in range(4)] + [item("b0", 2, 50), item("b1", 2, 60)]
+        self.assertEqual(names(self.queue.order(items, NOW)), ["a0", "b0", "a1", "b1", "a2", "a3"])
+
+    def test_interleaving_does_not_cross_windows(self):
+        items = [item("a0", 1, 10), item("a1", 1, 20), item("b0", 2, 400)]
+        self.assertEqual(names(self.queue.order(items, NOW)), ["a0", "a1", "b0"])
+
+    def test_stable_order_on_ties(self):
+        items = [item(f"m{i}", 1, 100) for i in range(5)]
+        self.assertEqual(names(self.queue.order(items, NOW)), ["m0", "m1", "m2", "m3", "m4"])
+
+    def test_message_deadline_and_expiry(self):
+        message = item("m", 3, 600, 60, 3600)
+        self.assertEqual(DispatchQueue.deadline(message), NOW + timedelta(seconds=60))
+        self.assertEqual(DispatchQueue.expires_at(message), NOW + timedelta(seconds=3600))
+        # Срочность и группа сообщения определяются самым близким дедлайном
+        items = [item("other", 1, 100), message]
+        self.assertEqual(names(self.queue.order(items, NOW)), ["m", "other"])
+
+    def test_passed_deadline_is_most_urgent(self):
+        items = [item("later", 1, 100), item("passed", 2, -5)]
+        self.assertEqual(names(self.queue.order(items, NOW)), ["passed", "later"])
+
+
+if __name__ == "__main__":
+    unittest.main()
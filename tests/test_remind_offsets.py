@@ -0,0 +1,110 @@
+import unittest
+
+import db_interact
+from db_interact import _offsets_diff
+
+
+class OffsetsDiffTest(unittest.TestCase):
+    def test_unchanged(self):
+        self.assertEqual(_offsets_diff([60, 1440], [1440, 60]), ([], [], []))
+
+    def test_added(self):
+        # Наименьшее смещение не удалялось - разворачиваются только добавленные
+        self.assertEqual(_offsets_diff([60], [60, 120, 1440]), ([], [120, 1440], [120, 1440]))
+
+    def test_removed_keeps_smallest_offset_expanded(self):
+        # Удаленное напоминание за 60 минут могло быть последним перед дедлайном; его заменяет напоминание
+        # по новому наименьшему смещению, даже если срок последнего уже прошел
+        self.assertEqual(_offsets_diff([60, 1440], [1440]), ([60], [], [1440]))
+
+    def test_removed_and_added(self):
+        self.assertEqual(_offsets_diff([60, 1440], [30, 1440]), ([60], [30], [30]))
+        self.assertEqual(_offsets_diff([30, 60], [60, 120]), ([30], [120], [60, 120]))
+
+    def test_all_removed(self):
+        self.assertEqual(_offsets_diff([30, 60], []), ([30, 60], [], []))
+
+    def test_first_offsets(self):
+        self.assertEqual(_offsets_diff([], [60]), ([], [60], [60]))
+
+
+class FakeCursor:
+    def __init__(self, stored: list):
+        self.stored = stored
+        self.queries = []
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.queries.append((query, list(params or [])))
+        self.rows = [{"minutes": minutes} for minutes in self.stored] if query.startswith("SELECT minutes") else []
+        return 1
+
+    def fetchone(self):
+        return {"task_group_id": 5}
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, stored: list):
+        self.dbc = FakeCursor(stored)
+
+    def cursor(self):
+        return self.dbc
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SetRemindOffsetsTest(unittest.TestCase):
+    def setUp(self):
+        self.notified = []
+        listener = lambda dbconn, task_group_id: self.notified.append(task_group_id)
+        db_interact.reminder_listeners.append(listener)
+        self.addCleanup(db_interact.reminder_listeners.remove, listener)
+
+    def writes(self, conn: FakeConnection) -> list:
+        return [(query, params) for query, params in conn.dbc.queries if not query.startswith("SELECT")]
+
+    def test_unchanged_offsets_not_rewritten(self):
+        conn = FakeConnection([60, 1440])
+        self.assertTrue(db_interact.db_set_task_group_remind(conn, 5, [1440, 60, 60]))
+        self.assertEqual(self.writes(conn), [])
+        self.assertEqual(self.notified, [])
+
+    def test_removed_offset_keeps_claimed_reminders(self):
+        conn = FakeConnection([60, 1440])
+        db_interact.db_set_task_group_remind(conn, 5, [1440])
+        queries = self.writes(conn)
+        delete_reminders = next(query for query, _ in queries if query.startswith("DELETE reminder"))
+        self.assertIn("claimed_by IS NULL OR reminder.claim_expires_at < now()", delete_reminders)
+        self.assertEqual(queries[-1][1], [5, 1440])
+        self.assertEqual(self.notified, [5])
+
+    def test_participant_offsets_unchanged(self):
+        conn = FakeConnection([30])
+        self.assertTrue(db_interact.db_set_task_participant_remind(conn, 7, 3, [30]))
+        self.assertEqual(self.writes(conn), [])
+        self.assertEqual(self.notified, [])
+
+    def test_participant_offsets_cleared(self):
+        conn = FakeConnection([30, 60])
+        db_interact.db_set_task_participant_remind(conn, 7, 3, [])
+        queries = self.writes(conn)
+        self.assertEqual([params for _, params in queries], [[3, 7, 30, 60], [3, 7, 30, 60]])
+        self.assertFalse([query for query, _ in queries if query.startswith("INSERT")])
+        self.assertEqual(self.notified, [5])
+
+
+if __name__ == "__main__":
+    unittest.main()
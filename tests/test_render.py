@@ -0,0 +1,42 @@
+import re
+import unittest
+from datetime import datetime, timedelta
+
+from render import MessageRenderer
+
+
+def reminder(task_id: int, description: str = "Описание") -> dict:
+    return {
+        "task_id": task_id,
+        "name": f"task-{task_id}",
+        "keyname": "event",
+        "deadline": datetime(2030, 1, 1) + timedelta(hours=task_id),
+        "description": description,
+    }
+
+
+class RenderCombinedTest(unittest.TestCase):
+    def setUp(self):
+        self.renderer = MessageRenderer()
+
+    def test_single_message(self):
+        messages = self.renderer.render_combined([reminder(i) for i in range(3)])
+        self.assertEqual(len(messages), 1)
+        text, included = messages[0]
+        self.assertTrue(text.startswith("❗Приближаются дедлайны задач (3)❗"))
+        self.assertEqual([item["task_id"] for item in included], [0, 1, 2])
+
+    def test_split_parts_count_own_reminders(self):
+        reminders = [reminder(i, "x" * 300) for i in range(10)]
+        messages = self.renderer.render_combined(reminders, limit=1000)
+        self.assertGreater(len(messages), 1)
+        self.assertEqual(sum(len(included) for _, included in messages), len(reminders))
+        for text, included in messages:
+            self.assertLessEqual(len(text), 1000)
+            count = int(re.match(r"❗Приближаются дедлайны задач \((\d+)\)❗", text).group(1))
+            self.assertEqual(count, len(included))
+            self.assertEqual(text.count("📌"), len(included))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from scheduler import ReminderScheduler
+
+
+def row(reminder_id: int, task_group_id: int, due_at: datetime) -> dict:
+    return {"id": reminder_id, "task_group_id": task_group_id, "due_at": due_at}
+
+
+class ReminderSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = ReminderScheduler()
+        self.now = datetime.now()
+
+    def test_load_replaces_schedule(self):
+        self.scheduler.load([row(1, 1, self.now + timedelta(hours=1))])
+        self.scheduler.load([row(2, 1, self.now + timedelta(hours=2))])
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.next_due(), self.now + timedelta(hours=2))
+
+    def test_load_not_before(self):
+        not_before = self.now + timedelta(seconds=30)
+        self.scheduler.load([row(1, 1, self.now - timedelta(hours=1))], not_before)
+        self.assertEqual(self.scheduler.next_due(), not_before)
+
+    def test_replace_group_drops_stale_entries(self):
+        self.scheduler.load(
+            [
+                row(1, 1, self.now + timedelta(minutes=1)),
+                row(2, 1, self.now + timedelta(minutes=2)),
+                row(3, 2, self.now + timedelta(minutes=3)),
+            ]
+        )
+        self.scheduler.replace_group(1, [row(2, 1, self.now + timedelta(minutes=5))])
+        self.assertEqual(len(self.scheduler), 2)
+        # Устаревшие элементы кучи группы 1 (id 1 и прежний срок id 2) больше не определяют ближайший срок
+        self.assertEqual(self.scheduler.next_due(), self.now + timedelta(minutes=3))
+        self.scheduler.replace_group(2, [])
+        self.assertEqual(self.scheduler.next_due(), self.now + timedelta(minutes=5))
+        self.scheduler.replace_group(1, [])
+        self.assertIsNone(self.scheduler.next_due())
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_replace_group_rebuilds_sparse_heap(self):
+        for i in range(200):
+            self.scheduler.replace_group(1, [row(1, 1, self.now + timedelta(seconds=i))])
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertLessEqual(len(self.scheduler._heap), 2 * len(self.scheduler) + 64)
+        self.assertEqual(self.scheduler.next_due(), self.now + timedelta(seconds=199))
+
+    def test_replace_ids(self):
+        self.scheduler.load([row(1, 1, self.now - timedelta(minutes=2)), row(2, 1, self.now - timedelta(minutes=1))])
+        retry_at = self.now + timedelta(minutes=1)
+        # id 1 отправлено (нет в строках), id 2 - повторная попытка
+        self.scheduler.replace_ids([1, 2], [row(2, 1, retry_at)])
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.next_due(), retry_at)
+        self.assertEqual(self.scheduler.due_ids(self.now), [])
+
+    def test_due_ids_in_due_order_without_duplicates(self):
+        self.scheduler.load(
+            [
+                row(3, 1, self.now - timedelta(minutes=1)),
+                row(1, 1, self.now - timedelta(minutes=3)),
+                row(4, 2, self.now + timedelta(minutes=1)),
+                row(2, 2, self.now - timedelta(minutes=2)),
+            ]
+        )
+        # Повторная замена оставляет в куче несколько элементов с тем же id
+        self.scheduler.replace_group(1, [row(3, 1, self.now - timedelta(minutes=1)), row(1, 1, self.now - timedelta(minutes=3))])
+        self.scheduler.replace_ids([2], [row(2, 2, self.now - timedelta(minutes=2))])
+        self.assertEqual(self.scheduler.due_ids(self.now), [1, 2, 3])
+
+    def test_wait_due_returns_when_due(self):
+        self.scheduler.load([row(1, 1, self.now - timedelta(seconds=1))])
+        self.assertTrue(self.scheduler.wait_due(1))
+
+    def test_wait_due_times_out(self):
+        self.scheduler.load([row(1, 1, self.now + timedelta(hours=1))])
+        started = time.monotonic()
+        self.assertFalse(self.scheduler.wait_due(0.1))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_wait_due_wakes_early_for_earlier_entry(self):
+        self.scheduler.load([row(1, 1, self.now + timedelta(hours=1))])
+        result = {}
+
+        def wait():
+            started = time.monotonic()
+            result["due"] = self.scheduler.wait_due(10)
+            result["seconds"] = time.monotonic() - started
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.1)
+        self.scheduler.replace_group(2, [row(2, 2, datetime.now() + timedelta(seconds=0.2))])
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertTrue(result["due"])
+        self.assertLess(result["seconds"], 2)
+
+    def test_stop_interrupts_wait(self):
+        waiter = threading.Thread(target=self.scheduler.wait_due)
+        waiter.start()
+        time.sleep(0.05)
+        self.scheduler.stop()
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import time
+import unittest
+
+from state_store import MemoryStateStore, SqliteStateStore, StateStore, create_state_store
+
+
+class StateStoreContract:
+    """
+    Проверки, общие для всех хранилищ состояний; make_store создает хранилище с заданными параметрами
+    """
+
+    def make_store(self, max_entries: int = 1000, ttl: float = 3600) -> StateStore:
+        raise NotImplementedError
+
+    def test_set_get_delete(self):
+        store = self.make_store()
+        self.assertIsNone(store.get("user"))
+        store.set("user", {"step": "AWAITING_FILE"})
+        self.assertEqual(store.get("user"), {"step": "AWAITING_FILE"})
+        store.delete("user")
+        self.assertIsNone(store.get("user"))
+        store.delete("user")
+
+    def test_update_merges_and_creates(self):
+        store = self.make_store()
+        self.assertEqual(store.update("user", step="AWAITING_FILE"), {"step": "AWAITING_FILE"})
+        state = store.update("user", step="AWAITING_EVENT_NAME", file_id="f1")
+        self.assertEqual(state, {"step": "AWAITING_EVENT_NAME", "file_id": "f1"})
+        self.assertEqual(store.get("user"), state)
+
+    def test_returned_state_is_a_copy(self):
+        store = self.make_store()
+        state = {"step": "AWAITING_FILE"}
+        store.set("user", state)
+        state["step"] = "changed"
+        store.get("user")["step"] = "changed"
+        store.update("user", event_name="event")["step"] = "changed"
+        self.assertEqual(store.get("user"), {"step": "AWAITING_FILE", "event_name": "event"})
+
+    def test_ttl_expiry(self):
+        store = self.make_store(ttl=0.05)
+        store.set("user", {"step": "AWAITING_FILE"})
+        time.sleep(0.1)
+        self.assertIsNone(store.get("user"))
+        # Устаревшее состояние не используется как основа для update
+        self.assertEqual(store.update("user", event_name="event"), {"event_name": "event"})
+
+    def test_update_extends_ttl(self):
+        store = self.make_store(ttl=0.2)
+        store.set("user", {"step": "AWAITING_FILE"})
+        time.sleep(0.12)
+        store.update("user", file_id="f1")
+        time.sleep(0.12)
+        self.assertEqual(store.get("user"), {"step": "AWAITING_FILE", "file_id": "f1"})
+
+
+class MemoryStateStoreTest(StateStoreContract, unittest.TestCase):
+    def make_store(self, max_entries: int = 1000, ttl: float = 3600) -> StateStore:
+        return MemoryStateStore(max_entries, ttl)
+
+    def test_evicts_least_recently_changed(self):
+        store = self.make_store(max_entries=2)
+        store.set("a", {})
+        store.set("b", {})
+        store.update("a", step="x")
+        store.set("c", {})
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(store.get("a"), {"step": "x"})
+        self.assertEqual(store.get("c"), {})
+
+
+class SqliteStateStoreTest(StateStoreContract, unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def make_store(self, max_entries: int = 1000, ttl: float = 3600) -> StateStore:
+        store = SqliteStateStore(self.path, max_entries, ttl)
+        self.addCleanup(store._conn.close)
+        return store
+
+    def count_rows(self, store: SqliteStateStore) -> int:
+        return store._conn.execute("SELECT count(*) FROM user_state").fetchone()[0]
+
+    def test_state_survives_reopen(self):
+        self.make_store().set("user", {"step": "AWAITING_FILE", "data_list": [{"name": "task"}]})
+        self.assertEqual(self.make_store().get("user"), {"step": "AWAITING_FILE", "data_list": [{"name": "task"}]})
+
+    def test_cleanup_every_interval(self):
+        store = self.make_store(max_entries=5)
+        for i in range(store.CLEANUP_INTERVAL - 1):
+            store.set(str(i), {"n": i})
+        # До очистки лишние записи еще хранятся
+        self.assertEqual(self.count_rows(store), store.CLEANUP_INTERVAL - 1)
+        store.set("last", {"n": -1})
+        self.assertEqual(self.count_rows(store), 5)
+        # Остаются записи, измененные последними
+        self.assertEqual(store.get("last"), {"n": -1})
+        self.assertIsNone(store.get("0"))
+
+    def test_cleanup_removes_expired(self):
+        store = self.make_store(ttl=0.05)
+        store.set("old", {})
+        time.sleep(0.1)
+        store.ttl = 3600
+        for i in range(store.CLEANUP_INTERVAL):
+            store.set(str(i), {})
+        self.assertEqual(self.count_rows(store), store.CLEANUP_INTERVAL)
+
+
+class CreateStateStoreTest(unittest.TestCase):
+    def test_abstract_base(self):
+        with self.assertRaises(TypeError):
+            StateStore()
+
+    def test_backends(self):
+        self.assertIsInstance(create_state_store("memory"), MemoryStateStore)
+        with self.assertRaises(ValueError):
+            create_state_store("redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
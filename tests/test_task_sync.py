@@ -0,0 +1,159 @@
+import unittest
+from datetime import datetime
+
+import db_interact
+from db_interact import task_import_keys, task_sync_plan
+
+D1 = datetime(2030, 1, 1, 12, 0)
+D2 = datetime(2030, 1, 2, 12, 0)
+D3 = datetime(2030, 1, 3, 12, 0)
+
+
+def task(name: str, deadline: datetime, description: str = "", participants: tuple = ()) -> dict:
+    return {"name": name, "description": description, "deadline": deadline, "participants": list(participants)}
+
+
+def row(task_id: int, name: str, deadline: datetime, description: str = "") -> dict:
+    return {"id": task_id, "name": name, "description": description, "deadline": deadline}
+
+
+class TaskImportKeysTest(unittest.TestCase):
+    def test_duplicate_names_numbered_in_order(self):
+        self.assertEqual(task_import_keys(["a", "b", "a", "a"]), [("a", 0), ("b", 0), ("a", 1), ("a", 2)])
+
+
+class TaskSyncPlanTest(unittest.TestCase):
+    USER_IDS = {"alice": 1, "bobby": 2, "carol": 3}
+
+    def plan(self, tasks, rows, participants=None, archived=()):
+        return task_sync_plan(tasks, rows, participants or {}, set(archived), self.USER_IDS)
+
+    def test_unchanged(self):
+        plan = self.plan([task("a", D1, "x", ["alice"])], [row(10, "a", D1, "x")], {10: {1}})
+        self.assertEqual(plan["unchanged"], 1)
+        self.assertEqual((plan["new_tasks"], plan["changed"], plan["deleted_ids"]), ([], [], []))
+        self.assertEqual((plan["attach"], plan["detach"], plan["rescheduled_ids"]), ([], [], []))
+
+    def test_missing_description_equals_empty(self):
+        plan = self.plan([task("a", D1, "")], [row(10, "a", D1, None)])
+        self.assertEqual(plan["unchanged"], 1)
+
+    def test_changed_deadline_reschedules(self):
+        tasks = [task("a", D2, "x"), task("b", D1, "new text")]
+        plan = self.plan(tasks, [row(10, "a", D1, "x"), row(11, "b", D1, "old text")])
+        self.assertEqual(plan["changed"], [(tasks[0], 10, True), (tasks[1], 11, False)])
+        # Напоминания заново разворачиваются только при изменении дедлайна
+        self.assertEqual(plan["rescheduled_ids"], [10])
+        self.assertEqual(plan["unchanged"], 0)
+
+    def test_removed_rows_deleted(self):
+        plan = self.plan([task("b", D1)], [row(10, "a", D1), row(11, "b", D1), row(12, "c", D2)])
+        self.assertEqual(plan["deleted_ids"], [10, 12])
+        self.assertEqual(plan["unchanged"], 1)
+
+    def test_new_rows_inserted(self):
+        tasks = [task("a", D1), task("b", D2)]
+        plan = self.plan(tasks, [row(10, "a", D1)])
+        self.assertEqual(plan["new_tasks"], [tasks[1]])
+
+    def test_duplicate_names_matched_by_occurrence(self):
+        tasks = [task("a", D1), task("a", D3), task("a", D2)]
+        rows = [row(10, "a", D1), row(11, "a", D2)]
+        plan = self.plan(tasks, rows)
+        # Вторая строка "a" сопоставлена с задачей 11 (изменился дедлайн), третья - новая задача
+        self.assertEqual(plan["changed"], [(tasks[1], 11, True)])
+        self.assertEqual(plan["new_tasks"], [tasks[2]])
+        self.assertEqual(plan["deleted_ids"], [])
+        self.assertEqual(plan["unchanged"], 1)
+
+    def test_participants_attached_and_detached(self):
+        plan = self.plan([task("a", D1, participants=["Alice", "carol", "unknown"])], [row(10, "a", D1)], {10: {1, 2}})
+        self.assertEqual(plan["attach"], [(3, 10)])
+        self.assertEqual(plan["detach"], [(2, 10)])
+
+    def test_archived_rows_not_reinserted(self):
+        tasks = [task("a", D1), task("b", D2)]
+        plan = self.plan(tasks, [], archived=[("a", D1)])
+        self.assertEqual(plan["archived"], 1)
+        self.assertEqual(plan["new_tasks"], [tasks[1]])
+
+    def test_archived_row_does_not_shift_duplicate_names(self):
+        # Первая задача "a" перенесена в архив; в БД осталась только вторая
+        tasks = [task("a", D1), task("a", D2, "x")]
+        plan = self.plan(tasks, [row(11, "a", D2, "x")], archived=[("a", D1)])
+        self.assertEqual(plan["unchanged"], 1)
+        self.assertEqual(plan["archived"], 1)
+        self.assertEqual((plan["new_tasks"], plan["changed"], plan["deleted_ids"]), ([], [], []))
+
+
+class FakeCursor:
+    """
+    Курсор pymysql, возвращающий заданные строки для выборок db_sync_tasks и записывающий все запросы
+    """
+
+    def __init__(self, results: dict):
+        self.results = {"SELECT id FROM task_group": [{"id": 5}], **results}
+        self.queries = []
+        self.rows = []
+        self.lastrowid = 100
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.queries.append((query, list(params or [])))
+        self.rows = next((rows for prefix, rows in self.results.items() if query.startswith(prefix)), [])
+        return len(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, cursor: FakeCursor):
+        self._cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class DbSyncTasksTest(unittest.TestCase):
+    def test_changed_deadline_replaces_pending_reminders(self):
+        cursor = FakeCursor(
+            {
+                "SELECT id, name, description, deadline FROM task": [row(10, "a", D1, "x"), row(11, "b", D1)],
+                "SELECT name, deadline FROM task_archive": [],
+            }
+        )
+        conn = FakeConnection(cursor)
+        stats = db_interact.db_sync_tasks(conn, [task("a", D2, "x"), task("b", D1)], 5)
+        self.assertTrue(conn.committed)
+        self.assertEqual((stats["updated"], stats["unchanged"], stats["inserted"], stats["deleted"]), (1, 1, 0, 0))
+        queries = [(query, params) for query, params in cursor.queries if "reminder" in query]
+        self.assertEqual(queries[0], ("DELETE FROM reminder WHERE state = 'pending' AND task_id IN (%s)", [10]))
+        expanded = [params for query, params in queries if query.startswith("INSERT IGNORE INTO reminder")]
+        # Напоминания разворачиваются по смещениям группы и индивидуальным смещениям только для задачи 10
+        self.assertEqual(expanded, [[10], [10]])
+
+    def test_unchanged_import_does_not_touch_reminders(self):
+        cursor = FakeCursor({"SELECT id, name, description, deadline FROM task": [row(10, "a", D1, "x")]})
+        stats = db_interact.db_sync_tasks(FakeConnection(cursor), [task("a", D1, "x")], 5)
+        self.assertEqual(stats["unchanged"], 1)
+        self.assertFalse([query for query, _ in cursor.queries if "reminder" in query])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import http.client
+import json
+import threading
+import time
+import unittest
+
+import telebot
+
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "webhook-secret"
+
+
+def update_json(update_id: int, text: str) -> bytes:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "user", "username": "test_user"},
+        "text": text,
+    }
+    return json.dumps({"update_id": update_id, "message": message}).encode("utf-8")
+
+
+class WebhookServerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = telebot.TeleBot("123:abc", threaded=False)
+        self.received = []
+        self.handled = threading.Event()
+
+        @self.bot.message_handler(commands=["start"])
+        def handle_start(message):
+            self.received.append(message)
+            self.handled.set()
+
+        self.server = WebhookServer(self.bot, port=0, secret=SECRET, workers=1)
+        self.server.start()
+        self.port = self.server.httpd.server_address[1]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def post(self, body: bytes, headers: dict) -> int:
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            conn.putrequest("POST", "/webhook")
+            for name, value in headers.items():
+                conn.putheader(name, value)
+            conn.endheaders()
+            conn.send(body)
+            return conn.getresponse().status
+        finally:
+            conn.close()
+
+    def test_update_reaches_bot(self):
+        body = update_json(1, "/start")
+        status = self.post(body, {SECRET_HEADER: SECRET, "Content-Length": str(len(body))})
+        self.assertEqual(status, 200)
+        self.assertTrue(self.handled.wait(5))
+        self.assertEqual(self.received[0].text, "/start")
+        self.assertEqual(self.received[0].chat.id, 42)
+        self.assertEqual(self.server.stats["accepted"], 1)
+
+    def test_wrong_secret_rejected(self):
+        body = update_json(2, "/start")
+        status = self.post(body, {SECRET_HEADER: "wrong", "Content-Length": str(len(body))})
+        self.assertEqual(status, 403)
+        status = self.post(body, {"Content-Length": str(len(body))})
+        self.assertEqual(status, 403)
+        self.assertFalse(self.handled.wait(0.5))
+        self.assertEqual(self.server.stats["rejected"], 2)
+
+    def test_bad_content_length_rejected(self):
+        for length in ("abc", "-5", "0"):
+            status = self.post(b"", {SECRET_HEADER: SECRET, "Content-Length": length})
+            self.assertEqual(status, 400, length)
+        self.assertEqual(self.server.stats["rejected"], 3)
+        self.assertEqual(self.server.stats["accepted"], 0)
+
+
+
+class WebhookBackpressureTest(unittest.TestCase):
+    def setUp(self):
+        # Бот без собственного пула потоков: обработчик занимает рабочий поток сервера
+        self.bot = telebot.TeleBot("123:abc", threaded=False)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+        @self.bot.message_handler(commands=["start"])
+        def handle_start(message):
+            self.started.set()
+            self.release.wait(5)
+
+        self.server = WebhookServer(self.bot, port=0, secret=SECRET, workers=1, queue_size=1)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(self.release.set)
+        self.port = self.server.httpd.server_address[1]
+
+    post = WebhookServerTest.post
+
+    def test_busy_handlers_fill_queue(self):
+        statuses = []
+        for update_id in range(1, 4):
+            body = update_json(update_id, "/start")
+            statuses.append(self.post(body, {SECRET_HEADER: SECRET, "Content-Length": str(len(body))}))
+            if update_id == 1:
+                self.assertTrue(self.started.wait(5))
+        # Первое обновление обрабатывается, второе ждет в очереди, третье отклоняется до освобождения обработчика
+        self.assertEqual(statuses, [200, 200, 503])
+        self.release.set()
+        self.server.updates.join()
+        self.assertEqual(self.server.stats["processed"], 2)
+        self.assertEqual(self.server.stats["dropped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import hmac
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telebot
+
+# Максимальный размер тела запроса с обновлением от Telegram в байтах
+MAX_UPDATE_SIZE = 1024 * 1024
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Встроенный HTTP-сервер для приема обновлений от Telegram в режиме webhook.
+    Запрос проверяется по секретному токену, тело кладется в ограниченную очередь и сразу подтверждается;
+    обновления разбираются и передаются обработчикам бота пулом рабочих потоков.
+    При переполненной очереди сервер отвечает 503, и Telegram повторяет доставку позже.
+    TLS не поддерживается: сервер рассчитан на работу за обратным прокси или балансировщиком
+    """
+
+    def __init__(
+        self,
+        bot: telebot.TeleBot,
+        host: str = "127.0.0.1",
+        port: int = 8443,
+        secret: str = "",
+        path: str = "/webhook",
+        workers: int = 4,
+        queue_size: int = 1000,
+    ):
+        """
+        :param_name bot: бот, обработчикам которого передаются обновления; создается с threaded=False, иначе обработчики
+            уходят в пул потоков telebot и очередь сервера не ограничивает число обновлений в обработке
+        :param_name host: адрес, на котором принимаются запросы
+        :param_name port: порт, на котором принимаются запросы
+        :param_name secret: секретный токен, переданный Telegram в set_webhook (пустая строка - без проверки)
+        :param_name path: путь, на который Telegram отправляет обновления
+        :param_name workers: число потоков обработки обновлений
+        :param_name queue_size: максимальное число обновлений, ожидающих обработки
+        """
+        self.bot = bot
+        self.secret = secret
+        self.path = path
+        self.updates = queue.Queue(maxsize=queue_size)
+        self.stats = {"accepted": 0, "rejected": 0, "dropped": 0, "processed": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"webhook-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                token = self.headers.get(SECRET_HEADER, "")
+                if server.secret and not hmac.compare_digest(token, server.secret):
+                    server._count("rejected")
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    length = 0
+                if length <= 0 or length > MAX_UPDATE_SIZE:
+                    server._count("rejected")
+                    self._reply(400)
+                    return
+                body = self.rfile.read(length)
+                try:
+                    server.updates.put_nowait(body)
+                except queue.Full:
+                    server._count("dropped")
+                    self._reply(503)
+                    return
+                server._count("accepted")
+                self._reply(200)
+
+            def do_GET(self):
+                # Проверка работоспособности для балансировщика
+                self._reply(200 if self.path == "/healthz" else 404)
+
+            def _reply(self, code: int):
+                self.send_response(code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _work(self):
+        while True:
+            body = self.updates.get()
+            if body is None:
+                break
+            try:
+                update = telebot.types.Update.de_json(json.loads(body))
+                self.bot.process_new_updates([update])
+                self._count("processed")
+            except Exception as e:
+                self._count("errors")
+                print("Ошибка обработки обновления из webhook:", str(e))
+            finally:
+                self.updates.task_done()
+
+    def start(self):
+        """
+        Запустить потоки обработки и HTTP-сервер в фоновом потоке
+        """
+        for worker in self._workers:
+            worker.start()
+        threading.Thread(target=self.httpd.serve_forever, name="webhook-http", daemon=True).start()
+
+    def serve_forever(self):
+        """
+        Запустить потоки обработки и принимать запросы в текущем потоке
+        """
+        for worker in self._workers:
+            worker.start()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """
+        Остановить прием запросов и дождаться обработки принятых обновлений
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for _ in self._workers:
+            self.updates.put(None)
+        for worker in self._workers:
+            worker.join()